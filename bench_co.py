@@ -0,0 +1,290 @@
+# ***************************************************************************
+# *   Copyright (c) 2021 n1ob <niob@gmx.com>                                *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# ***************************************************************************
+# headless benchmark of the engines behind the tabs, no gui needed
+#   FreeCADCmd bench_co.py --sizes 100 1000 --save    store a baseline
+#   FreeCADCmd bench_co.py --sizes 100 1000           compare against it, exit code 1 on regressions
+# or with plain python if the FreeCAD lib directory is given by --fc-lib / on the PYTHONPATH
+#   python bench_co.py --core                           geometry core and kernels only, no FreeCAD at all
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Callable, Dict, List
+
+DOC = "Bench"
+SKETCH = "Sketch"
+SKETCH_EXT = "SketchExt"
+SPREAD = 1000.0
+# well inside the default tolerances, so the near-coincident / near-equal cases are found
+JITTER = 0.005
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_co.json')
+
+
+def _fc_import(fc_lib):
+    if fc_lib:
+        sys.path.append(fc_lib)
+    global App, Part, Sketcher
+    import FreeCAD as App
+    import Part
+    import Sketcher
+
+
+def _pt(rnd: random.Random, spread=SPREAD):
+    return App.Vector(rnd.uniform(-spread, spread), rnd.uniform(-spread, spread), 0)
+
+
+def _jit(rnd: random.Random, v):
+    return App.Vector(v.x + rnd.uniform(-JITTER, JITTER), v.y + rnd.uniform(-JITTER, JITTER), 0)
+
+
+# ! generators, each adds about n geometries to the sketch
+def gen_soup(doc, sk, rnd: random.Random, n: int):
+    sk.addGeometry([Part.LineSegment(_pt(rnd), _pt(rnd)) for _ in range(n)], False)
+
+
+def gen_grid(doc, sk, rnd: random.Random, n: int):
+    # polylines on a grid, endpoints of neighbours almost coincident, lengths almost equal,
+    # edges almost horizontal / vertical / parallel
+    k = max(2, int(math.sqrt(n / 2)))
+    step = 2 * SPREAD / k
+    geo = list()
+    for i in range(k):
+        for j in range(k):
+            p = App.Vector(-SPREAD + i * step, -SPREAD + j * step, 0)
+            geo.append(Part.LineSegment(_jit(rnd, p), _jit(rnd, p + App.Vector(step, 0, 0))))
+            geo.append(Part.LineSegment(_jit(rnd, p), _jit(rnd, p + App.Vector(0, step, 0))))
+    sk.addGeometry(geo, False)
+
+
+def gen_arcs(doc, sk, rnd: random.Random, n: int):
+    # circles and arcs with few distinct radii, arcs chained end to start
+    geo = list()
+    radii = [rnd.uniform(1, 50) for _ in range(max(1, n // 20))]
+    for i in range(n):
+        r = rnd.choice(radii) + rnd.uniform(-JITTER, JITTER)
+        if i % 2:
+            geo.append(Part.Circle(_pt(rnd), App.Vector(0, 0, 1), r))
+        else:
+            a = rnd.uniform(0, math.pi)
+            geo.append(Part.ArcOfCircle(Part.Circle(_pt(rnd), App.Vector(0, 0, 1), r), a, a + rnd.uniform(0.5, 3)))
+    sk.addGeometry(geo, False)
+
+
+def gen_extern(doc, sk, rnd: random.Random, n: int):
+    # half own lines, half linked from a second sketch
+    gen_soup(doc, sk, rnd, n // 2)
+    ext = doc.addObject('Sketcher::SketchObject', SKETCH_EXT)
+    gen_soup(doc, ext, rnd, n - n // 2)
+    doc.recompute()
+    for i in range(n - n // 2):
+        sk.addExternal(SKETCH_EXT, f'Edge{i + 1}')
+
+
+def gen_constrained(doc, sk, rnd: random.Random, n: int):
+    # a grid plus about one constraint per geometry, of the types the tabs care about
+    gen_grid(doc, sk, rnd, n)
+    cnt = sk.GeometryCount
+    con = list()
+    for i in range(cnt):
+        c = rnd.randrange(6)
+        if c == 0:
+            con.append(Sketcher.Constraint('Horizontal', i) if i % 2 == 0 else Sketcher.Constraint('Vertical', i))
+        elif c == 1:
+            con.append(Sketcher.Constraint('Coincident', i, 2, (i + 2) % cnt, 1))
+        elif c == 2:
+            con.append(Sketcher.Constraint('Equal', i, (i + 2) % cnt))
+        elif c == 3:
+            con.append(Sketcher.Constraint('Distance', i, sk.Geometry[i].length()))
+        elif c == 4:
+            geo = sk.Geometry[i]
+            con.append(Sketcher.Constraint('DistanceX', i, 1, i, 2, geo.EndPoint.x - geo.StartPoint.x))
+        else:
+            con.append(Sketcher.Constraint('Parallel', i, (i + 4) % cnt))
+    sk.addConstraint(con)
+
+
+GENERATORS: Dict[str, Callable] = {
+    'soup': gen_soup,
+    'grid': gen_grid,
+    'arcs': gen_arcs,
+    'extern': gen_extern,
+    'constrained': gen_constrained,
+}
+
+# ! engines, in this order as the later ones read the constraints
+ENGINES: Dict[str, Callable] = {
+    'snapshot': lambda c: c.snapshot,
+    'cs': lambda c: c.cs.constraints_update(),
+    'co': lambda c: c.co_points.tolerances,
+    'eq': lambda c: c.eq_edges.tolerances,
+    'pa': lambda c: c.pa_edges.tolerances,
+    'hv': lambda c: c.hv_edges.tolerances,
+    'xy': lambda c: c.xy_edges.edges,
+    'rd': lambda c: c.rd_circles.circles,
+}
+
+
+def sketch_make(gen: str, n: int, seed: int):
+    if DOC in App.listDocuments():
+        App.closeDocument(DOC)
+    doc = App.newDocument(DOC)
+    sk = doc.addObject('Sketcher::SketchObject', SKETCH)
+    GENERATORS[gen](doc, sk, random.Random(seed), n)
+    doc.recompute()
+    return sk
+
+
+def bench_one(c, repeat: int) -> Dict[str, dict]:
+    # median wall time of a cold run per engine, peak python memory from one more run under tracemalloc
+    times: Dict[str, List[float]] = {x: list() for x in ENGINES}
+    peaks: Dict[str, int] = dict()
+    for r in range(repeat + 1):
+        c.sketch = c.sketch
+        trace = r == repeat
+        for name, run in ENGINES.items():
+            if trace:
+                tracemalloc.start()
+            start = perf_counter()
+            run(c)
+            dt = perf_counter() - start
+            if trace:
+                peaks[name] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                times[name].append(dt)
+    return {x: {'ms': statistics.median(times[x]) * 1e3, 'kb': peaks[x] / 1024} for x in ENGINES}
+
+
+def bench(gens: List[str], sizes: List[int], repeat: int, seed: int) -> Dict[str, dict]:
+    from co_lib.co_impl import CoEd
+    res: Dict[str, dict] = dict()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for gen in gens:
+        for n in sizes:
+            sk = sketch_make(gen, n, seed)
+            c = CoEd(sk, base_dir)
+            for eng, val in bench_one(c, repeat).items():
+                key = f'{gen}/{n}/{eng}'
+                res[key] = val
+                print(f'{key:<28} {val["ms"]:>10.2f} ms {val["kb"]:>10.0f} kB', flush=True)
+    return res
+
+
+def _measure(run: Callable, repeat: int) -> dict:
+    times = list()
+    for _ in range(repeat):
+        start = perf_counter()
+        run()
+        times.append(perf_counter() - start)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'ms': statistics.median(times) * 1e3, 'kb': peak / 1024}
+
+
+def bench_core(sizes: List[int], repeat: int, seed: int) -> Dict[str, dict]:
+    # snapshot and kernels on core records, the compute path without FreeCAD
+    from co_lib.co_base.co_geo import Arc, Circle, Segment
+    from co_lib.co_base.co_kernel import bound_get, point_pairs, scalar_pairs
+    from co_lib.co_base.co_snapshot import GeoSnapshot
+    res: Dict[str, dict] = dict()
+    for n in sizes:
+        rnd = random.Random(seed)
+        recs = list()
+        for i in range(n):
+            x, y = rnd.uniform(-SPREAD, SPREAD), rnd.uniform(-SPREAD, SPREAD)
+            if i % 4 == 3:
+                recs.append((i, Circle(x, y, rnd.uniform(1, 50)), False, False))
+            elif i % 4 == 2:
+                a = rnd.uniform(0, math.pi)
+                recs.append((i, Arc.from_angles(x, y, rnd.uniform(1, 50), a, a + 1), False, False))
+            else:
+                recs.append((i, Segment(x, y, rnd.uniform(-SPREAD, SPREAD), rnd.uniform(-SPREAD, SPREAD)), False,
+                             False))
+        snap = GeoSnapshot.from_records(recs, [], 1)
+        xs = snap.sx + snap.ex
+        ys = snap.sy + snap.ey
+        bound = bound_get(0.1)
+        steps: Dict[str, Callable] = {
+            'snapshot': lambda: GeoSnapshot.from_records(recs, [], 1),
+            'point_pairs': lambda: point_pairs(xs, ys, bound),
+            'length_pairs': lambda: scalar_pairs(snap.length, bound),
+            'angle_pairs': lambda: scalar_pairs(snap.angle, bound, 180.0),
+        }
+        for name, run in steps.items():
+            key = f'core/{n}/{name}'
+            val = res[key] = _measure(run, repeat)
+            print(f'{key:<28} {val["ms"]:>10.2f} ms {val["kb"]:>10.0f} kB', flush=True)
+    return res
+
+
+def compare(res: Dict[str, dict], base: Dict[str, dict], tol: float, floor_ms: float) -> List[str]:
+    # slower or bigger by more than tol, times below floor_ms are noise
+    bad = list()
+    for key, val in res.items():
+        old = base.get(key)
+        if old is None:
+            continue
+        if (val['ms'] > floor_ms) and (val['ms'] > old['ms'] * (1 + tol)):
+            bad.append(f'{key}: {old["ms"]:.2f} -> {val["ms"]:.2f} ms')
+        if val['kb'] > max(old['kb'] * (1 + tol), 64):
+            bad.append(f'{key}: {old["kb"]:.0f} -> {val["kb"]:.0f} kB')
+    return bad
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description='coed engine benchmark')
+    ap.add_argument('--sizes', type=int, nargs='+', default=[100, 1000])
+    ap.add_argument('--gens', nargs='+', default=list(GENERATORS), choices=list(GENERATORS))
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--seed', type=int, default=4711)
+    ap.add_argument('--baseline', default=BASELINE)
+    ap.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    ap.add_argument('--tol', type=float, default=0.25, help='allowed slow down / growth, 0.25 = 25%%')
+    ap.add_argument('--floor', type=float, default=1.0, help='ms below which timings are not compared')
+    ap.add_argument('--fc-lib', default=None, help='FreeCAD lib directory for plain python')
+    ap.add_argument('--core', action='store_true', help='geometry core only, runs without FreeCAD')
+    # FreeCADCmd leaves its own arguments in argv
+    args, _ = ap.parse_known_args(argv)
+    if args.core:
+        res = bench_core(args.sizes, args.repeat, args.seed)
+    else:
+        _fc_import(args.fc_lib)
+        res = bench(args.gens, args.sizes, args.repeat, args.seed)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(res, f, indent=1, sort_keys=True)
+        print('baseline written', args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print('no baseline', args.baseline, 'run with --save first')
+        return 0
+    with open(args.baseline) as f:
+        bad = compare(res, json.load(f), args.tol, args.floor)
+    for x in bad:
+        print('REGRESSION', x)
+    print(len(bad), 'regressions')
+    return 1 if bad else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,91 @@
+# ***************************************************************************
+# *   Copyright (c) 2021 n1ob <niob@gmx.com>                                *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# ***************************************************************************
+from math import nan
+from typing import Iterable, List, Tuple
+
+import Sketcher
+
+from .co_cmn import GeoId
+from .co_geo import GeoType, GeoRecord, Point, Segment, Circle, Arc, Other, ConSpec
+from .co_logger import xp, xps, _go
+from .co_snapshot import GeoSnapshot
+
+# the FreeCAD side of the geometry core, sketch geometry in, constraints out
+
+
+def record_of(geo) -> GeoRecord:
+    # Part geometry to a core record
+    typ = geo.TypeId
+    if typ == GeoType.LINE_SEGMENT:
+        st, en = geo.StartPoint, geo.EndPoint
+        return Segment(st.x, st.y, en.x, en.y)
+    if typ == GeoType.ARC_OF_CIRCLE:
+        st, en, ce = geo.StartPoint, geo.EndPoint, geo.Center
+        return Arc(ce.x, ce.y, geo.Radius, geo.AngleXU, st.x, st.y, en.x, en.y,
+                   geo.LastParameter - geo.FirstParameter)
+    if typ == GeoType.CIRCLE:
+        ce = geo.Center
+        return Circle(ce.x, ce.y, geo.Radius, geo.AngleXU)
+    if typ == GeoType.POINT:
+        return Point(geo.X, geo.Y)
+    return _other_of(geo, typ)
+
+
+def _other_of(geo, typ: str) -> Other:
+    # no columns of its own, but the position feeds the change hash of the snapshot
+    size = sx = sy = ex = ey = cx = cy = nan
+    try:
+        size = geo.length()
+    except AttributeError:
+        xp('no length', typ, **_go)
+    try:
+        st, en = geo.value(geo.FirstParameter), geo.value(geo.LastParameter)
+        sx, sy, ex, ey = st.x, st.y, en.x, en.y
+    except AttributeError:
+        xp('no parameter range', typ, **_go)
+    ce = getattr(geo, 'Center', None)
+    if ce is not None:
+        cx, cy = ce.x, ce.y
+    return Other(typ, size, sx, sy, ex, ey, cx, cy)
+
+
+def snapshot_from_sketch(sketch, ext_edges: Iterable[Tuple[GeoId, object]],
+                         ext_vertices: Iterable[Tuple[GeoId, object]], rev: int) -> GeoSnapshot:
+    # ext_edges / ext_vertices as delivered by Lookup.extern_points('E') / ('V')
+    records = [(idx, record_of(geo), sketch.getConstruction(idx), False) for idx, geo in enumerate(sketch.Geometry)]
+    records += [(geo_id.idx, record_of(geo), True, True) for geo_id, geo in ext_edges]
+    verts: List[Tuple[int, int, float, float]] = list()
+    for geo_id, geo in ext_vertices:
+        if geo.TypeId in (GeoType.CIRCLE, GeoType.POINT):
+            # no start / end
+            continue
+        if geo_id.typ == 1:
+            pt = geo.StartPoint
+        elif geo_id.typ == 2:
+            pt = geo.EndPoint
+        else:
+            continue
+        verts.append((geo_id.idx, geo_id.typ, pt.x, pt.y))
+    return GeoSnapshot.from_records(records, verts, rev)
+
+
+def to_sketcher(specs: Iterable[ConSpec]) -> List[Sketcher.Constraint]:
+    return [Sketcher.Constraint(x.type_id, *x.args) for x in specs]
+
+
+xps(__name__)
+if __name__ == '__main__':
+    pass
@@ -14,9 +14,10 @@
 # *                                                                         *
 # ***************************************************************************
 import threading
+from collections import OrderedDict
 from contextlib import contextmanager
 from enum import Enum
-from typing import NamedTuple, List, Iterable, Callable
+from typing import NamedTuple, List, Iterable, Callable, Dict
 
 import FreeCAD as App
 from PySide2 import QtCore
@@ -25,6 +26,7 @@ from PySide2.QtGui import QCursor, QFont, QBrush
 from PySide2.QtWidgets import QApplication, QWidget, QLabel, QHBoxLayout, QTableWidgetItem
 
 from co_lib.co_base.co_config import CfgFonts, CfgColors
+from co_lib.co_base.co_geo import GeoType  # noqa: F401 moved to the geometry core, still imported from here
 from co_lib.co_base.co_logger import xps, _ti
 
 # ! PointPos lets us refer to different aspects of a piece of geometry.  sketcher::none refers
@@ -86,14 +88,6 @@ DIM_CS = [ConType.ANGLE.value, ConType.DIAMETER.value, ConType.DISTANCE.value, C
           ConType.SNELLSLAW.value, ConType.WEIGHT.value]
 
 
-
-class GeoType:
-    LINE_SEGMENT: str = 'Part::GeomLineSegment'
-    CIRCLE: str = 'Part::GeomCircle'
-    ARC_OF_CIRCLE: str = 'Part::GeomArcOfCircle'
-    POINT: str = 'Part::GeomPoint'
-
-
 class GeoTypeUi:
     VERTEX: str = 'Vertex'
     EDGE: str = 'Edge'
@@ -156,6 +150,73 @@ class Singleton:
         return cls._instance
 
 
+class LruCache:
+    # drops the least recently used entries beyond size
+    def __init__(self, size: int):
+        self.size = size
+        self.__data: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+    def get(self, key, default=None):
+        if key not in self.__data:
+            return default
+        self.__data.move_to_end(key)
+        return self.__data[key]
+
+    def put(self, key, val):
+        self.__data[key] = val
+        self.__data.move_to_end(key)
+        while len(self.__data) > self.size:
+            self.__data.popitem(last=False)
+
+    def clear(self):
+        self.__data.clear()
+
+
+class Record:
+    # slotted row record, view() gives a copy with some fields replaced, the
+    # other fields are copied once and can't be set on the view afterwards
+    __slots__ = ()
+    __views: Dict[type, type] = dict()
+
+    def view(self, **own):
+        cls = Record.__view_cls(self.__class__)
+        v = object.__new__(cls)
+        for k in cls.fields:
+            if k not in own:
+                object.__setattr__(v, k, getattr(self, k))
+        for k, val in own.items():
+            if k not in cls.fields:
+                raise AttributeError(f'{cls.__name__} has no field {k}')
+            object.__setattr__(v, k, val)
+        object.__setattr__(v, 'own', frozenset(own))
+        return v
+
+    @staticmethod
+    def __view_cls(cls: type) -> type:
+        if issubclass(cls, RecordView):
+            return cls
+        res = Record.__views.get(cls)
+        if res is None:
+            fields = tuple(x for c in reversed(cls.__mro__) for x in c.__dict__.get('__slots__', ()))
+            res = Record.__views[cls] = type(cls.__name__, (RecordView, cls),
+                                             {'__slots__': ('own',), '__module__': cls.__module__,
+                                              'fields': fields})
+        return res
+
+
+class RecordView:
+    # mixed into the classes Record.view() makes, own are the fields passed to view()
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        if name not in self.own:
+            raise AttributeError(f'{self.__class__.__name__} view: {name} is a copy of the source, not settable')
+        object.__setattr__(self, name, value)
+
+
 def get_class_that_defined_method(method):
     method_name = method.__name__
     if method.__self__:
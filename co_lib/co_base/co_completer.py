@@ -2,11 +2,11 @@ from __future__ import annotations
 
 import re
 import sys
-from typing import Union, List, Callable
+from typing import Union, List, Callable, Dict, Optional, Tuple
 
 import FreeCAD as App
 import Sketcher
-from PySide2.QtCore import Qt, QRect, QModelIndex, Slot, Signal
+from PySide2.QtCore import Qt, QRect, QModelIndex, Slot, Signal, QAbstractListModel, QTimer
 from PySide2.QtGui import QKeyEvent, QStandardItemModel, QStandardItem, QFocusEvent, QMouseEvent, QFont
 from PySide2.QtWidgets import QLineEdit, QCompleter, QWidget, QVBoxLayout, QApplication, QAbstractItemView, QTableWidget
 
@@ -14,6 +14,8 @@ from co_lib.co_base.co_cmn import DIM_CS, ConType
 from co_lib.co_base.co_config import CfgTransient, CfgFonts
 from co_lib.co_base.co_flag import Cs
 from co_lib.co_base.co_logger import xp_worker, xp, flow, _cp
+from co_lib.co_base.co_observer import object_revision, document_revision
+from co_lib.co_base.co_trie import PathIndex
 
 '''
 Referencing objects
@@ -80,32 +82,33 @@ class DocTreeModel:
                     self.root_node.add_child(x.clone())
         return lst
 
-    def collect_prop_nodes(self, obj) -> List[Node]:
+    @staticmethod
+    def collect_prop_nodes(obj) -> List[Node]:
         lst: List[Node] = list()
         for name in obj.PropertiesList:
             prop_typ = obj.getTypeIdOfProperty(name)
             if prop_typ == 'Sketcher::PropertyConstraintList':
-                lst.extend(self.constraint_list(obj, name))
+                lst.extend(DocTreeModel.constraint_list(obj, name))
             elif prop_typ == 'App::PropertyPlacement':
-                lst.append(self.placement(name))
+                lst.append(DocTreeModel.placement(name))
             elif prop_typ == 'App::PropertyBool':
                 lst.append(Node(name))
             elif prop_typ == 'App::PropertyBoolList':
-                lst.extend(self.bool_lst(obj, name))
+                lst.extend(DocTreeModel.bool_lst(obj, name))
             elif prop_typ == 'App::PropertyFloat':
                 lst.append(Node(name))
             elif prop_typ == 'App::PropertyFloatList':
-                lst.extend(self.float_lst(obj, name))
+                lst.extend(DocTreeModel.float_lst(obj, name))
             elif prop_typ == 'App::PropertyInteger':
                 lst.append(Node(name))
             elif prop_typ == 'App::PropertyIntegerList':
-                lst.extend(self.int_lst(obj, name))
+                lst.extend(DocTreeModel.int_lst(obj, name))
             elif prop_typ == 'App::PropertyVector':
-                lst.append(self.vector(name))
+                lst.append(DocTreeModel.vector(name))
             elif prop_typ == 'App::PropertyVectorList':
-                lst.extend(self.vector_lst(obj, name))
+                lst.extend(DocTreeModel.vector_lst(obj, name))
             elif prop_typ == 'App::PropertyVectorDistance':
-                lst.append(self.vector(name))
+                lst.append(DocTreeModel.vector(name))
             elif prop_typ == 'Part::PropertyPartShape':
                 lst.append(Node(name))
             elif prop_typ == 'Part::PropertyGeometryList':
@@ -297,9 +300,204 @@ class Root:
             self.sort_int(x)
 
 
+class CompletionModel(QStandardItemModel):
+    # shared by all expression editors, documents and objects are filled on first use
+    # and refilled when the observer counted a change since
+    PathRole = Qt.UserRole + 1
+    LoadRole = Qt.UserRole + 2
+    RevRole = Qt.UserRole + 3
+
+    def __init__(self):
+        super(CompletionModel, self).__init__()
+        self.root_item = QStandardItem('')
+        self.root_item.setData('', CompletionModel.PathRole)
+        self.appendRow(self.root_item)
+        # flat index over the paths of all filled items
+        self.paths = PathIndex()
+        self.__doc_items: Dict[str, QStandardItem] = dict()
+        self.__alias_items: List[QStandardItem] = list()
+        self.__alias_key: Optional[Tuple] = None
+
+    @flow
+    def expand(self, prefix: str):
+        # make sure every level on the path to the prefix is filled
+        self.__root_update()
+        self.__expand(self.root_item, PathCompleter.split(prefix)[1:-1])
+
+    def __expand(self, item: QStandardItem, segs: List[str]):
+        if not segs:
+            return
+        seg = segs[0].lower()
+        for row in range(item.rowCount()):
+            child = item.child(row)
+            if child.text().lower() == seg:
+                self.__load(child)
+                self.__expand(child, segs[1:])
+
+    def __root_update(self):
+        docs = App.listDocuments()
+        changed = False
+        for name in [x for x in self.__doc_items if x not in docs]:
+            it = self.__doc_items.pop(name)
+            self.__index(it, False)
+            self.root_item.removeRow(it.row())
+            changed = True
+        for name in docs:
+            if name not in self.__doc_items:
+                it = CompletionModel.__item(name, '', ('doc', name))
+                self.root_item.appendRow(it)
+                self.__index(it, True)
+                self.__doc_items[name] = it
+                changed = True
+        key = CompletionModel.__active_key()
+        if (key is None) or (key != self.__alias_key):
+            xp('active changed', key, **_cp)
+            for it in self.__alias_items:
+                self.__index(it, False)
+                self.root_item.removeRow(it.row())
+            self.__alias_items = CompletionModel.__alias_items_get()
+            for it in self.__alias_items:
+                self.root_item.appendRow(it)
+                self.__index(it, True)
+            self.__alias_key = key
+            changed = True
+        if changed:
+            CompletionModel.__sort(self.root_item)
+
+    @staticmethod
+    def __active_key() -> Optional[Tuple]:
+        doc = App.ActiveDocument
+        if doc is None:
+            return ()
+        obj = doc.ActiveObject
+        key = (doc.Name, document_revision(doc),
+               obj.Name if obj else None, object_revision(obj) if obj else 0)
+        return None if None in (key[1], key[3]) else key
+
+    @staticmethod
+    def __alias_items_get() -> List[QStandardItem]:
+        # objects of the active document and properties of the active object are reachable without prefix
+        doc = App.ActiveDocument
+        if doc is None:
+            return list()
+        res = CompletionModel.__obj_items(doc, '', '.')
+        if doc.ActiveObject:
+            for n in DocTreeModel.collect_prop_nodes(doc.ActiveObject):
+                res.append(CompletionModel.__node_item(n, ''))
+        return res
+
+    @staticmethod
+    def __obj_items(doc, path: str, sep: str) -> List[QStandardItem]:
+        res = list()
+        for obj in doc.Objects:
+            load = ('obj', doc.Name, obj.Name)
+            res.append(CompletionModel.__item(obj.Name, path, load, sep))
+            if obj.Label:
+                res.append(CompletionModel.__item(f'<<{obj.Label}>>', path, load, sep))
+        return res
+
+    def __load(self, item: QStandardItem):
+        load = item.data(CompletionModel.LoadRole)
+        if not load:
+            return
+        if load[1] not in App.listDocuments():
+            return
+        doc = App.getDocument(load[1])
+        obj = None
+        if load[0] == 'doc':
+            rev = document_revision(doc)
+        else:
+            obj = doc.getObject(load[2])
+            if obj is None:
+                return
+            rev = object_revision(obj)
+        if (rev is not None) and (rev == item.data(CompletionModel.RevRole)):
+            return
+        xp('load', load, 'rev', rev, **_cp)
+        for row in range(item.rowCount()):
+            self.__index(item.child(row), False)
+        item.removeRows(0, item.rowCount())
+        path = item.data(CompletionModel.PathRole)
+        if obj is None:
+            lst = CompletionModel.__obj_items(doc, path, '#')
+        else:
+            lst = [CompletionModel.__node_item(n, path) for n in DocTreeModel.collect_prop_nodes(obj)]
+        for x in lst:
+            item.appendRow(x)
+            self.__index(x, True)
+        CompletionModel.__sort(item)
+        item.setData(rev, CompletionModel.RevRole)
+
+    def __index(self, item: QStandardItem, add: bool):
+        path = item.data(CompletionModel.PathRole)
+        if add:
+            self.paths.add(path)
+        else:
+            self.paths.remove(path)
+        for row in range(item.rowCount()):
+            self.__index(item.child(row), add)
+
+    @staticmethod
+    def __item(text: str, path: str, load=None, sep='.') -> QStandardItem:
+        item = QStandardItem(text)
+        item.setData(f'{path}{sep}{text}' if path else text, CompletionModel.PathRole)
+        if load:
+            item.setData(load, CompletionModel.LoadRole)
+        return item
+
+    @staticmethod
+    def __node_item(n: Node, path: str) -> QStandardItem:
+        item = CompletionModel.__item(n.data, path)
+        for x in n.children:
+            item.appendRow(CompletionModel.__node_item(x, item.data(CompletionModel.PathRole)))
+        return item
+
+    @staticmethod
+    def __sort(item: QStandardItem):
+        # case insensitive, as announced to the completer
+        rows = [item.takeRow(0) for _ in range(item.rowCount())]
+        rows.sort(key=lambda r: r[0].text().lower())
+        for r in rows:
+            item.appendRow(r)
+
+
+__completion_model: Optional[CompletionModel] = None
+
+
+# need a single instance, created on first use as it needs the application
+def completion_model_get() -> CompletionModel:
+    global __completion_model
+    if __completion_model is None:
+        __completion_model = CompletionModel()
+    return __completion_model
+
+
+class FlatPathModel(QAbstractListModel):
+    # the matches of one editor, all the popup has to show
+
+    def __init__(self, parent=None):
+        super(FlatPathModel, self).__init__(parent)
+        self.paths: List[str] = list()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if index.isValid() and (role in (Qt.DisplayRole, Qt.EditRole, CompletionModel.PathRole)):
+            return self.paths[index.row()]
+        return None
+
+    def paths_set(self, paths: List[str]):
+        self.beginResetModel()
+        self.paths = paths
+        self.endResetModel()
+
+
 class LineEdit(QLineEdit):
+    # ms without typing before the expression is validated
+    EVAL_DELAY = 250
 
-    def __init__(self, item, root: Node, parent):
+    def __init__(self, item, root: Optional[Node], parent):
         super(LineEdit, self).__init__()
         self.parent = parent
         self.item = item
@@ -322,11 +520,38 @@ class LineEdit(QLineEdit):
         self.exp_eval_passed = True
         self.exp_save = None
         self.exp_save_passed = True
+        self.eval_seq = 0
+        self.eval_tim = QTimer(self)
+        self.eval_tim.setSingleShot(True)
+        self.eval_tim.setInterval(LineEdit.EVAL_DELAY)
+        self.eval_tim.timeout.connect(self.on_eval_timer)
         self.textEdited.connect(self.on_txt_edited)
 
     @flow
     def on_txt_edited(self, txt):
-        self.exp_eval_passed = self.exp_eval(txt)
+        # restarting the timer cancels the pending validation
+        self.eval_seq += 1
+        self.eval_tim.start()
+
+    @flow
+    def on_eval_timer(self):
+        self.eval_now()
+
+    @flow
+    def eval_now(self):
+        self.eval_tim.stop()
+        seq = self.eval_seq
+        res = self.exp_eval(self.text())
+        if seq != self.eval_seq:
+            xp('text changed while validating, result dropped', **_cp)
+            return
+        self.exp_eval_passed = res
+
+    @flow
+    def eval_flush(self):
+        # a pending validation has to be done before its result is used
+        if self.eval_tim.isActive():
+            self.eval_now()
 
     @flow
     def on_ret_pressed(self):
@@ -377,6 +602,7 @@ class LineEdit(QLineEdit):
                 return
             if event.key() in [Qt.Key_Enter, Qt.Key_Return]:
                 xp('Qt.Key_Enter, Qt.Key_Return', **_cp)
+                self.eval_flush()
                 if self.exp_eval_passed:
                     xp('eval_passed', **_cp)
                     self.on_ret_pressed()
@@ -393,6 +619,7 @@ class LineEdit(QLineEdit):
                 return
             if event.key() in [Qt.Key_Escape]:
                 xp('Qt.Key_Escape', **_cp)
+                self.eval_tim.stop()
                 self.setText(self.backup)
                 self.parent: QWidget
                 self.parent.setFocus()
@@ -432,8 +659,9 @@ class LineEdit(QLineEdit):
     @flow
     def show_completions(self, completion_prefix):
         xp('completion_prefix', completion_prefix, **_cp)
+        self.c.expand(completion_prefix)
         self.c.setCompletionPrefix(completion_prefix)
-        if self.c.currentCompletion():
+        if self.c.has_match():
             # self.c.popup().setCurrentIndex(self.c.completionModel().index(0, 0))
             p: QAbstractItemView = self.c.popup()
             cr: QRect = self.cursorRect()
@@ -484,7 +712,7 @@ class TableLineEdit(LineEdit):
     ret_pressed = Signal(object, object)
     txt_edited = Signal(object, object, str)
 
-    def __init__(self, item, comp_root: Node, driving: bool, parent):
+    def __init__(self, item, comp_root: Optional[Node], driving: bool, parent):
         super().__init__(item, comp_root, parent)
         cfg_f = CfgFonts()
         f: QFont = cfg_f.font_get(cfg_f.FONT_TABLE)
@@ -523,16 +751,25 @@ class TableLineEdit(LineEdit):
 
 class PathCompleter(QCompleter):
 
-    PathRole = Qt.UserRole + 1
+    PathRole = CompletionModel.PathRole
+    LIMIT = 200
 
-    def __init__(self, root):
+    def __init__(self, root: Optional[Node] = None):
         super(PathCompleter, self).__init__()
-        self.create_model(root)
+        # a private tree if given, else matches from the index of the shared document model
+        self.flat: Optional[FlatPathModel] = None
         self.setCaseSensitivity(Qt.CaseInsensitive)
-        self.setCompletionMode(QCompleter.PopupCompletion)
-        # self.completer.setFilterMode(Qt.MatchContains)
-        self.setFilterMode(Qt.MatchStartsWith)
-        self.setModelSorting(QCompleter.CaseInsensitivelySortedModel)
+        if root is None:
+            self.flat = FlatPathModel(self)
+            self.setModel(self.flat)
+            # already filtered by the index
+            self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        else:
+            self.create_model(root)
+            self.setCompletionMode(QCompleter.PopupCompletion)
+            # self.completer.setFilterMode(Qt.MatchContains)
+            self.setFilterMode(Qt.MatchStartsWith)
+            self.setModelSorting(QCompleter.CaseInsensitivelySortedModel)
         self.setMaxVisibleItems(12)
         # x: QAbstractItemView = self.popup()
 
@@ -562,13 +799,34 @@ class PathCompleter(QCompleter):
             self.add_items(item, x, data)
 
     @flow
-    def splitPath(self, path: str):
-        xp('path in:', path, 'prefix:', self.completionPrefix(), 'comp:', self.currentCompletion(), **_cp)
+    def expand(self, prefix: str):
+        if self.flat is None:
+            return
+        model = completion_model_get()
+        model.expand(prefix)
+        res = model.paths.substring(prefix.lstrip('.'), PathCompleter.LIMIT)
+        xp('matches', len(res), 'of', len(model.paths), **_cp)
+        self.flat.paths_set(res)
+
+    def has_match(self) -> bool:
+        if self.flat is None:
+            return bool(self.currentCompletion())
+        return bool(self.flat.rowCount())
+
+    @staticmethod
+    def split(path: str) -> List[str]:
         if not path.startswith('.'):
             path = '.' + path
-        xp('path out', re.split('#|\.', path), **_cp)
         return re.split('#|\.', path)
 
+    @flow
+    def splitPath(self, path: str):
+        xp('path in:', path, 'prefix:', self.completionPrefix(), 'comp:', self.currentCompletion(), **_cp)
+        if self.flat is not None:
+            return [path]
+        xp('path out', PathCompleter.split(path), **_cp)
+        return PathCompleter.split(path)
+
     @flow
     def pathFromIndex(self, idx):
         idx: QModelIndex
@@ -641,6 +899,6 @@ if __name__ == "__main__":
     hwind = MainApp()
     hwind.show()
     app.exec_()
-    xp_worker.keep_running = False
+    xp_worker.shutdown()
     sys.exit()
 
@@ -294,6 +294,12 @@ class CfgBasics(CfgBase):
                 return self.data[key]
             if key == self.SHOW_ONLY_VALID:
                 return CfgBasics.__SHOW_ONLY_VALID_DEFAULT
+            if key == self.LOG_POLICY:
+                return CfgBasics.__LOG_POLICY_DEFAULT
+            if key == self.LOG_ROTATE_MB:
+                return CfgBasics.__LOG_ROTATE_MB_DEFAULT
+            if key == self.LOG_ROTATE_KEEP:
+                return CfgBasics.__LOG_ROTATE_KEEP_DEFAULT
             return None
         raise ValueError(key)
 
@@ -331,9 +337,15 @@ class CfgBasics(CfgBase):
 
     LOG_DIR: str = 'log_dir'
     SHOW_ONLY_VALID: str = 'only_valid'
-    __NAMES: Set[str] = {LOG_DIR, SHOW_ONLY_VALID}
+    LOG_POLICY: str = 'log_policy'
+    LOG_ROTATE_MB: str = 'log_rotate_mb'
+    LOG_ROTATE_KEEP: str = 'log_rotate_keep'
+    __NAMES: Set[str] = {LOG_DIR, SHOW_ONLY_VALID, LOG_POLICY, LOG_ROTATE_MB, LOG_ROTATE_KEEP}
 
     __SHOW_ONLY_VALID_DEFAULT = False
+    __LOG_POLICY_DEFAULT = 'drop_oldest'
+    __LOG_ROTATE_MB_DEFAULT = 4
+    __LOG_ROTATE_KEEP_DEFAULT = 2
     __LOG_NAME_DEFAULT = 'coed.log'
 
 
@@ -17,13 +17,19 @@ import functools
 from enum import Flag, auto
 from typing import NamedTuple
 
-from .co_logger import _fl, xp, xps
+from .co_logger import _fl, xp, xps, xp_on
 
 
 def dirty(_func=None, *, flag=None):
     def decorator_dirty(func):
+        if not xp_on(_fl):
+            # resolved at import like flow, the flag calls are the hottest of a refresh
+            return func
+
         @functools.wraps(func)
         def wrapper_dirty(*args, **kwargs):
+            if not xp_on(_fl):
+                return func(*args, **kwargs)
             nam = func.__name__.ljust(8)
             arg = [str(a) for a in args]
             obj = func(*args, **kwargs)
@@ -83,6 +89,7 @@ class Dirty(Flag):
     CONSTRAINTS = auto()
     EQ_EDGES = auto()
     RD_CIRCLES = auto()
+    GEOMETRY = auto()
 
 
 class Cs(Flag):
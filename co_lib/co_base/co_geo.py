@@ -0,0 +1,132 @@
+# ***************************************************************************
+# *   Copyright (c) 2021 n1ob <niob@gmx.com>                                *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# ***************************************************************************
+from math import cos, hypot, nan, pi, sin
+from typing import NamedTuple, Union
+
+from .co_logger import xps
+
+# geometry core without FreeCAD, the snapshot and the kernels work on these records,
+# co_adapter converts from / to the sketcher
+
+
+class GeoType:
+    LINE_SEGMENT: str = 'Part::GeomLineSegment'
+    CIRCLE: str = 'Part::GeomCircle'
+    ARC_OF_CIRCLE: str = 'Part::GeomArcOfCircle'
+    POINT: str = 'Part::GeomPoint'
+
+
+class Point(NamedTuple):
+    x: float
+    y: float
+
+    @property
+    def type_id(self) -> str:
+        return GeoType.POINT
+
+    def length(self) -> float:
+        return nan
+
+
+class Segment(NamedTuple):
+    sx: float
+    sy: float
+    ex: float
+    ey: float
+
+    @property
+    def type_id(self) -> str:
+        return GeoType.LINE_SEGMENT
+
+    def length(self) -> float:
+        return hypot(self.ex - self.sx, self.ey - self.sy)
+
+
+class Circle(NamedTuple):
+    cx: float
+    cy: float
+    radius: float
+    xu: float = 0.0
+
+    @property
+    def type_id(self) -> str:
+        return GeoType.CIRCLE
+
+    def length(self) -> float:
+        return 2 * pi * self.radius
+
+
+class Arc(NamedTuple):
+    # counter clockwise from start to end, span the angle in between
+    cx: float
+    cy: float
+    radius: float
+    xu: float
+    sx: float
+    sy: float
+    ex: float
+    ey: float
+    span: float
+
+    @property
+    def type_id(self) -> str:
+        return GeoType.ARC_OF_CIRCLE
+
+    def length(self) -> float:
+        return self.radius * self.span
+
+    @classmethod
+    def from_angles(cls, cx: float, cy: float, radius: float, start: float, end: float, xu: float = 0.0) -> 'Arc':
+        a, b = start + xu, end + xu
+        return cls(cx, cy, radius, xu, cx + radius * cos(a), cy + radius * sin(a), cx + radius * cos(b),
+                   cy + radius * sin(b), end - start)
+
+
+class Other(NamedTuple):
+    # types the tabs don't handle, only listed, start / end and center
+    # where the curve has them so a moved geometry is still told apart
+    typ: str
+    size: float = nan
+    sx: float = nan
+    sy: float = nan
+    ex: float = nan
+    ey: float = nan
+    cx: float = nan
+    cy: float = nan
+
+    @property
+    def type_id(self) -> str:
+        return self.typ
+
+    def length(self) -> float:
+        return self.size
+
+
+GeoRecord = Union[Point, Segment, Circle, Arc, Other]
+
+
+class ConSpec(NamedTuple):
+    # a constraint to create, arguments as Sketcher.Constraint takes them
+    type_id: str
+    args: tuple
+
+    def __str__(self) -> str:
+        return f'{self.type_id}{self.args}'
+
+
+xps(__name__)
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,294 @@
+# ***************************************************************************
+# *   Copyright (c) 2021 n1ob <niob@gmx.com>                                *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# ***************************************************************************
+from array import array
+from bisect import bisect_right
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .co_logger import xps
+from .co_span import timed
+from .co_spatial import PointGrid
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_USE_NP = np is not None
+BOUND_HEADROOM = 2.0
+
+
+def use_numpy(enable: bool) -> bool:
+    # switch between the numpy kernel and the pure python fallback, returns the previous state
+    global _USE_NP
+    prev = _USE_NP
+    _USE_NP = enable and (np is not None)
+    return prev
+
+
+class PairTable:
+    # compact pair list in row layout, row r holds
+    # index[offsets[r]:offsets[r + 1]] and value[...] sorted ascending by value
+    def __init__(self, size: int, offsets: array, index: array, value: array, bound: float) -> None:
+        self.size: int = size
+        self.offsets: array = offsets
+        self.index: array = index
+        self.value: array = value
+        self.bound: float = bound
+        self.__order: Optional[array] = None
+        self.__sorted: Optional[array] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __str__(self) -> str:
+        return f'PairTable rows {self.size} pairs {len(self.index)} bound {self.bound}'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def row(self, r: int, bound: Optional[float] = None) -> Iterator[Tuple[int, float]]:
+        lo = self.offsets[r]
+        hi = self.offsets[r + 1]
+        if bound is not None:
+            hi = bisect_right(self.value, bound, lo, hi)
+        for n in range(lo, hi):
+            yield self.index[n], self.value[n]
+
+    def count(self, r: int, bound: float) -> int:
+        lo = self.offsets[r]
+        return bisect_right(self.value, bound, lo, self.offsets[r + 1]) - lo
+
+    def rows_between(self, lo: float, hi: float) -> Set[int]:
+        # rows holding a value in (lo, hi], i.e. the rows a tolerance change from lo to hi touches
+        if self.__order is None:
+            self.__sort_values()
+        a = bisect_right(self.__sorted, lo)
+        b = bisect_right(self.__sorted, hi)
+        return {self.__row_of(e) for e in self.__order[a:b]}
+
+    def __row_of(self, e: int) -> int:
+        return bisect_right(self.offsets, e) - 1
+
+    def __sort_values(self) -> None:
+        # all values in one ascending sequence, built on the first re-query only
+        if _USE_NP:
+            order = np.argsort(np.frombuffer(self.value, dtype=np.float64), kind='stable')
+            self.__order = array('q', order.astype(np.int64).tobytes())
+        else:
+            self.__order = array('q', sorted(range(len(self.value)), key=self.value.__getitem__))
+        self.__sorted = array('d', [self.value[e] for e in self.__order])
+
+
+def bound_get(tol: float) -> float:
+    # candidates are collected with headroom, so raising the tolerance a bit needs no rebuild
+    return max(tol * BOUND_HEADROOM, PointGrid.MIN_CELL)
+
+
+def _table_from_lists(size: int, rows: List[List[Tuple[float, int]]], bound: float) -> PairTable:
+    offsets = array('q', [0])
+    index = array('q')
+    value = array('d')
+    for row in rows:
+        row.sort()
+        for d, j in row:
+            index.append(j)
+            value.append(d)
+        offsets.append(len(index))
+    return PairTable(size, offsets, index, value, bound)
+
+
+def _table_from_np(size: int, i, j, d, bound: float) -> PairTable:
+    # mirror the pairs, then order by row and value
+    i, j = np.concatenate((i, j)), np.concatenate((j, i))
+    d = np.concatenate((d, d))
+    order = np.lexsort((d, i))
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(i, minlength=size), out=offsets[1:])
+    return PairTable(size,
+                     array('q', offsets.astype(np.int64).tobytes()),
+                     array('q', j[order].astype(np.int64).tobytes()),
+                     array('d', d[order].astype(np.float64).tobytes()),
+                     bound)
+
+
+def _np_point_pairs(xs: Sequence[float], ys: Sequence[float], bound: float):
+    # sweep over the points sorted by x, step k compares every point with its k-th successor
+    x = np.asarray(xs, dtype=np.float64)
+    y = np.asarray(ys, dtype=np.float64)
+    order = np.argsort(x, kind='stable')
+    x = x[order]
+    y = y[order]
+    res_i = list()
+    res_j = list()
+    res_d = list()
+    for k in range(1, len(x)):
+        dx = x[k:] - x[:-k]
+        live = dx <= bound
+        if not live.any():
+            break
+        a = np.nonzero(live)[0]
+        d = np.hypot(dx[a], y[a + k] - y[a])
+        hit = d <= bound
+        a = a[hit]
+        res_i.append(order[a])
+        res_j.append(order[a + k])
+        res_d.append(d[hit])
+    if not res_i:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float64)
+    return np.concatenate(res_i), np.concatenate(res_j), np.concatenate(res_d)
+
+
+@timed('kernel.point_pairs')
+def point_pairs(xs: Sequence[float], ys: Sequence[float], bound: float) -> PairTable:
+    size = len(xs)
+    if _USE_NP:
+        i, j, d = _np_point_pairs(xs, ys, bound)
+        return _table_from_np(size, i, j, d, bound)
+    grid = PointGrid(bound)
+    for n in range(size):
+        grid.insert(n, xs[n], ys[n])
+    rows: List[List[Tuple[float, int]]] = [list() for _ in range(size)]
+    for i, j, d in grid.pairs(bound):
+        rows[i].append((d, j))
+        rows[j].append((d, i))
+    return _table_from_lists(size, rows, bound)
+
+
+def _wrap_count(v, bound: float, period: Optional[float]) -> int:
+    # values near the start of the period are repeated behind its end
+    if period is None:
+        return 0
+    return bisect_right(v, bound)
+
+
+def _np_scalar_pairs(vals: Sequence[float], bound: float, period: Optional[float]):
+    # sweep over the sorted values, step k compares every value with its k-th successor
+    v = np.asarray(vals, dtype=np.float64)
+    size = len(v)
+    order = np.argsort(v, kind='stable')
+    v = v[order]
+    m = _wrap_count(v, bound, period)
+    if m:
+        v = np.concatenate((v, v[:m] + period))
+        order = np.concatenate((order, order[:m]))
+    res_i = list()
+    res_j = list()
+    res_d = list()
+    for k in range(1, len(v)):
+        d = v[k:] - v[:-k]
+        live = d <= bound
+        if not live.any():
+            break
+        a = np.nonzero(live)[0]
+        # the first value of a pair always lies inside the period
+        a = a[a < size]
+        b = a + k
+        wrap = b >= size
+        if wrap.any():
+            # a wrapped pair only counts if the direct way round is the longer one
+            keep = ~wrap | ((v[a] - v[b - size]) > period / 2)
+            keep &= order[a] != order[b]
+            a = a[keep]
+            b = b[keep]
+        res_i.append(order[a])
+        res_j.append(order[b])
+        res_d.append(v[b] - v[a])
+    if not res_i:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float64)
+    return np.concatenate(res_i), np.concatenate(res_j), np.concatenate(res_d)
+
+
+@timed('kernel.scalar_pairs')
+def scalar_pairs(vals: Sequence[float], bound: float, period: Optional[float] = None) -> PairTable:
+    # all pairs with |a - b| <= bound, with a period the difference is taken the short way round
+    size = len(vals)
+    reach = bound if period is None else min(bound, period / 2)
+    if _USE_NP:
+        i, j, d = _np_scalar_pairs(vals, reach, period)
+        return _table_from_np(size, i, j, d, bound)
+    order = sorted(range(size), key=vals.__getitem__)
+    v = array('d', [vals[n] for n in order])
+    m = _wrap_count(v, reach, period)
+    for n in range(m):
+        v.append(v[n] + period)
+        order.append(order[n])
+    rows: List[List[Tuple[float, int]]] = [list() for _ in range(size)]
+    for a in range(size):
+        va = v[a]
+        i = order[a]
+        b = a + 1
+        while b < len(v) and v[b] - va <= reach:
+            j = order[b]
+            if b >= size and (j == i or va - v[b - size] <= period / 2):
+                b += 1
+                continue
+            d = v[b] - va
+            rows[i].append((d, j))
+            rows[j].append((d, i))
+            b += 1
+    return _table_from_lists(size, rows, bound)
+
+
+class DisjointSet:
+    # union find over hashable keys, path halving and union by size
+    def __init__(self) -> None:
+        self.__parent: Dict[Hashable, Hashable] = dict()
+        self.__size: Dict[Hashable, int] = dict()
+
+    def __len__(self) -> int:
+        return len(self.__parent)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__parent
+
+    def __str__(self) -> str:
+        return f'DisjointSet keys {len(self.__parent)}'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def find(self, key: Hashable) -> Hashable:
+        parent = self.__parent
+        if key not in parent:
+            return key
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, a: Hashable, b: Hashable) -> None:
+        for key in (a, b):
+            if key not in self.__parent:
+                self.__parent[key] = key
+                self.__size[key] = 1
+        ra = self.find(a)
+        rb = self.find(b)
+        if ra == rb:
+            return
+        if self.__size[ra] < self.__size[rb]:
+            ra, rb = rb, ra
+        self.__parent[rb] = ra
+        self.__size[ra] += self.__size.pop(rb)
+
+    def connected(self, a: Hashable, b: Hashable) -> bool:
+        if (a not in self.__parent) or (b not in self.__parent):
+            return False
+        return self.find(a) == self.find(b)
+
+
+xps(__name__)
+if __name__ == '__main__':
+    pass
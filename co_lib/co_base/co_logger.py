@@ -13,15 +13,17 @@
 # *   GNU Library General Public License for more details.                  *
 # *                                                                         *
 # ***************************************************************************
+import atexit
 import functools
+import os
 import pathlib
-import queue
 import sys
 import threading
 import traceback
+from collections import deque
 from datetime import datetime
 from time import perf_counter
-from typing import Set, List, AnyStr
+from typing import Set, AnyStr, Dict, Optional
 
 
 def stack_tracer():
@@ -96,6 +98,10 @@ class Profile:
 
 class XpConf:
     topics: Set[str] = set()
+    # log queue and file, see XpWorker.conf_set
+    policy: str = 'drop_oldest'
+    rotate_size: int = 4 * 1024 * 1024
+    rotate_keep: int = 2
 
     def __init__(self, topic='', prepend=None, std_err=False, separator=None, append=None, thread_info=False):
         self.std_err = std_err
@@ -125,7 +131,32 @@ class XpConf:
         return d
 
 
+# topic -> written or not, resolved once per topic and dropped when the topics or the switch change
+_TOPIC_ON: Dict[str, bool] = dict()
+
+
+def xp_on(kwargs: Optional[dict] = None) -> bool:
+    # lets callers skip building messages nobody reads
+    topic = '' if kwargs is None else kwargs.get('topic', '')
+    try:
+        return _TOPIC_ON[topic]
+    except KeyError:
+        res = _TOPIC_ON[topic] = GLB_LOG and not XpConf.topics.isdisjoint(topic.split('.'))
+        return res
+
+
+def xp_log(enable: bool):
+    global GLB_LOG
+    GLB_LOG = enable
+    _TOPIC_ON.clear()
+
+
 def xp(*args, **kwargs):
+    if not xp_on(kwargs):
+        return
+    if (len(args) == 1) and callable(args[0]):
+        # deferred message, xp(lambda: f'...') is only built for an enabled topic
+        args = (args[0](),)
     if kwargs.pop('thread_info', 0):
         kwargs['thread_name'] = threading.current_thread().name
         kwargs['thread_ident'] = threading.current_thread().ident
@@ -138,92 +169,210 @@ def xp(*args, **kwargs):
     if GLB_HEADER:
         GLB_HEADER = False
         _xp_header()
-    xp_worker.queue.put((args, kwargs))
+    xp_worker.put((args, kwargs))
 
 
 class XpWorker:
-    def __init__(self):
-        self.queue = queue.Queue()
-        self.thread_event = threading.Event()
-        self.thread = threading.Thread(target=self._xp, args=(self.thread_event,), daemon=False)
+    # records wait in a bounded ring, the thread writes them in batches
+    QUEUE_SIZE = 20000
+    BATCH_SIZE = 1000
+    # what a full ring does with a new record
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    BLOCK = 'block'
+    POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+    def __init__(self, size: int = QUEUE_SIZE):
+        self.size = size
+        self.policy = XpConf.policy
+        self.rotate_size = XpConf.rotate_size
+        self.rotate_keep = XpConf.rotate_keep
+        self.buf: deque = deque()
+        self.cond = threading.Condition()
+        # records taken but not written yet, dropped since the last batch
+        self.pending = 0
+        self.dropped = 0
+        self.closed = False
         self.log_path = ''
-        self.keep_running = True
+        self.thread_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
         self.run()
 
     def log_path_set(self, val: str):
         self.log_path = val
+        if not self.thread.is_alive():
+            # shut down by a closed gui, opened again
+            self.run()
         self.thread_event.set()
 
+    def conf_set(self, policy: Optional[str] = None, rotate_size: Optional[int] = None,
+                 rotate_keep: Optional[int] = None):
+        # rotate_size 0 never rotates, rotate_keep 0 starts the file over instead
+        if (policy is not None) and (policy not in XpWorker.POLICIES):
+            raise ValueError(policy)
+        with self.cond:
+            if policy is not None:
+                self.policy = XpConf.policy = policy
+            if rotate_size is not None:
+                self.rotate_size = XpConf.rotate_size = max(rotate_size, 0)
+            if rotate_keep is not None:
+                self.rotate_keep = XpConf.rotate_keep = max(rotate_keep, 0)
+            # producers blocked under the old policy re-check
+            self.cond.notify_all()
+
+    def put(self, rec: tuple):
+        with self.cond:
+            if len(self.buf) >= self.size:
+                if self.policy == XpWorker.BLOCK:
+                    # backpressure, only while there is a thread to drain the ring
+                    while (len(self.buf) >= self.size) and self.thread_event.is_set() and not self.closed:
+                        self.cond.wait()
+                if len(self.buf) >= self.size:
+                    self.dropped += 1
+                    if self.policy != XpWorker.DROP_OLDEST:
+                        return
+                    self.buf.popleft()
+                    self.pending -= 1
+            self.buf.append(rec)
+            self.pending += 1
+            self.cond.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        # wait until everything put so far is written
+        with self.cond:
+            if not self.thread_event.is_set():
+                return False
+            return self.cond.wait_for(lambda: self.pending == 0, timeout)
+
+    def shutdown(self, timeout: float = 5.0):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        # a thread still waiting for its path leaves without writing
+        self.thread_event.set()
+        if self.thread.is_alive() and (self.thread is not threading.current_thread()):
+            self.thread.join(timeout)
+
+    @staticmethod
+    def _line(args, kwargs) -> str:
+        add_ind: int = kwargs.pop('add_indent', 0)
+        prepend: str = kwargs.pop('prepend', '   ')
+        append: str = kwargs.pop('append', None)
+        prepre: str = kwargs.pop('prepre', '')
+        glb_ind: int = kwargs.pop('glb_ind', '')
+        thread_name: str = kwargs.pop('thread_name', '')
+        thread_ident: str = kwargs.pop('thread_ident', '')
+        thread_idx: str = kwargs.pop('thread_idx', 0)
+        th = ''
+        if len(thread_name):
+            th = f'({thread_name}:{thread_ident})'
+        _pre = prepend.ljust(3)
+        flow_dir: int = kwargs.pop('flow', -1)
+        indent = glb_ind
+        # args = ['xx ' '{}' ' xx'.format(i) for i in args]
+        args = list(args)
+        ai = ''
+        if add_ind > 0:
+            ai = ' ' * add_ind
+        if flow_dir == -1:
+            args[0] = f'{thread_idx:2}| {ai}{args[0]}'
+        elif flow_dir == 0:
+            args[0] = f'{thread_idx:2}|   {args[0]}'
+        elif flow_dir == 1:
+            args[0] = f'{thread_idx:2}|-> {args[0]}'
+        if indent > 0:
+            args.insert(0, ' ' * (indent - 1))
+        if prepend is not None:
+            args.insert(0, _pre)
+        if prepre is not None:
+            args.insert(0, prepre)
+        if append is not None:
+            args.append(append)
+        if len(th):
+            args.append(th)
+        # topics are filtered by xp already
+        try:
+            return ' '.join(f'{x}' for x in args) + '\n'
+        except ReferenceError as err:
+            return f'ReferenceError{err}\n'
+
+    def _rotate(self, file):
+        # coed.log -> coed.log.1 -> coed.log.2, the oldest falls off
+        file.close()
+        for i in range(self.rotate_keep - 1, 0, -1):
+            src = f'{self.log_path}.{i}'
+            if os.path.exists(src):
+                os.replace(src, f'{self.log_path}.{i + 1}')
+        if self.rotate_keep > 0:
+            os.replace(self.log_path, f'{self.log_path}.1')
+            return open(self.log_path, 'a')
+        # nothing kept, truncate
+        return open(self.log_path, 'w')
+
+    def _halt(self):
+        # no writer, nothing is waited for, a later log_path_set starts over
+        with self.cond:
+            self.closed = True
+            self.buf.clear()
+            self.pending = 0
+            self.thread_event.clear()
+            self.cond.notify_all()
+
     def _xp(self, ev: threading.Event):
         ev.wait()
-        with open(self.log_path, 'a', 1) as file:
-            while not self.queue.empty() or self.keep_running:
-                args, kwargs = self.queue.get()
-                global GLB_LOG
-                add_ind: int = kwargs.pop('add_indent', 0)
-                prepend: str = kwargs.pop('prepend', '   ')
-                append: str = kwargs.pop('append', None)
-                topic: str = kwargs.pop('topic', '')
-                prepre: str = kwargs.pop('prepre', '')
-                glb_ind: int = kwargs.pop('glb_ind', '')
-                thread_name: str = kwargs.pop('thread_name', '')
-                thread_ident: str = kwargs.pop('thread_ident', '')
-                thread_idx: str = kwargs.pop('thread_idx', 0)
-                th = ''
-                if len(thread_name):
-                    th = f'({thread_name}:{thread_ident})'
-                _pre = prepend.ljust(3)
-                _topic: List[str] = topic.split('.')
-                flow_dir: int = kwargs.pop('flow', -1)
-                indent = glb_ind
-                # args = ['xx ' '{}' ' xx'.format(i) for i in args]
-                args = list(args)
-                ai = ''
-                if add_ind > 0:
-                    ai = ' ' * add_ind
-                if flow_dir == -1:
-                    args[0] = f'{thread_idx:2}| {ai}{args[0]}'
-                elif flow_dir == 0:
-                    args[0] = f'{thread_idx:2}|   {args[0]}'
-                elif flow_dir == 1:
-                    args[0] = f'{thread_idx:2}|-> {args[0]}'
-                if indent > 0:
-                    args.insert(0, ' ' * (indent - 1))
-                if prepend is not None:
-                    args.insert(0, _pre)
-                if prepre is not None:
-                    args.insert(0, prepre)
-                if append is not None:
-                    args.append(append)
-                if len(th):
-                    args.append(th)
-                # print(*args, **kwargs, sep='-')
-                # if topic in XpConf.topics:
-                try:
-                    if not XpConf.topics.isdisjoint(_topic):
-                        # print(*args, **kwargs)
-                        if GLB_LOG:
-                            file.write(' '.join(f'{x}' for x in args))
-                            file.write('\n')
-                except ReferenceError as err:
-                    file.write('ReferenceError')
-                    file.write(str(err))
-                    file.write('\n')
-                self.queue.task_done()
+        file = None
+        if self.log_path:
+            try:
+                file = open(self.log_path, 'a')
+            except OSError as err:
+                # the log itself is gone, once per thread on stderr
+                print(f'coed: no log file {self.log_path}: {err}', file=sys.stderr)
+        if file is None:
+            self._halt()
+            return
+        while True:
+            with self.cond:
+                while not self.buf and not self.closed:
+                    self.cond.wait()
+                n = min(len(self.buf), XpWorker.BATCH_SIZE)
+                batch = [self.buf.popleft() for _ in range(n)]
+                dropped, self.dropped = self.dropped, 0
+                done = self.closed and not self.buf
+                # room for producers held back by a full ring
+                self.cond.notify_all()
+            lines = [self._line(args, kwargs) for args, kwargs in batch]
+            if dropped:
+                lines.append(f'--- {dropped} records dropped, log queue full ---\n')
+            if GLB_LOG and lines:
+                file.write(''.join(lines))
+                file.flush()
+                if (self.rotate_size > 0) and (file.tell() > self.rotate_size):
+                    file = self._rotate(file)
+            with self.cond:
+                self.pending -= n
+                self.cond.notify_all()
+            if done:
+                break
+        file.close()
 
     def run(self):
+        with self.cond:
+            self.closed = False
+        self.thread_event.clear()
+        self.thread = threading.Thread(target=self._xp, args=(self.thread_event,), daemon=True)
         self.thread.start()
 
 
 def flow(_func=None, *, off=False, short=False):
     def decorator_flow(func):
+        if off or not xp_on(_flow):
+            # resolved at import, a disabled flow leaves the function as it is
+            return func
+
         @functools.wraps(func)
         def wrapper_flow(*args, **kwargs):
-            global GLB_LOG
             _flow['flow'] = -1
-            if off or not GLB_LOG:
-                obj = func(*args, **kwargs)
-            elif short or GLB_SHORT:
+            if short or GLB_SHORT:
                 ind_inc(threading.current_thread().ident, 2)
                 if hasattr(func, '__qualname__'):
                     nam = func.__qualname__.split('.')
@@ -258,6 +407,8 @@ def flow(_func=None, *, off=False, short=False):
 
 
 def xps(*args: object, **kwargs: object) -> None:
+    if not xp_on(kwargs):
+        return
     xp(f"---{' '.join(f'{x}' for x in args)}----------------------------------------", **kwargs)
 
 
@@ -284,6 +435,7 @@ def sep(*args):
 
 def _xp_topic(*args):
     [XpConf.topics.add(x) for x in args]
+    _TOPIC_ON.clear()
 
 
 _IND = dict()
@@ -333,6 +485,8 @@ def ind_dec(ident, dec):
 
 __perf_start = perf_counter()
 xp_worker = XpWorker()
+# written out on interpreter exit, the thread is a daemon
+atexit.register(xp_worker.shutdown)
 # __perf_start: float = perf_counter()
 # xp_worker: XpWorker = XpWorker()
 # ! shorter form for flow
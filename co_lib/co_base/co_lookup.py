@@ -13,7 +13,7 @@
 # *   GNU Library General Public License for more details.                  *
 # *                                                                         *
 # ***************************************************************************
-from typing import NewType, overload, List, Tuple, Set, Dict
+from typing import NewType, overload, List, Tuple, Set, Dict, Optional
 
 import FreeCAD as App
 import Part
@@ -22,30 +22,109 @@ import Sketcher
 from .co_cmn import GeoPt, fmt_vec, ConType, GeoType, GeoTypeUi, GeoId
 from .co_flag import Cs, ConsTrans
 from .co_logger import flow, xps, xp, _go
+from .co_observer import object_revision
+from .co_snapshot import GeoSnapshot
+
+
+class ExternResolver:
+    # geometry and vertex index of linked sketches, read once per (sketch, revision),
+    # without a tracked revision entries live until the next invalidate()
+    def __init__(self) -> None:
+        self.__gen: int = 0
+        self.__cache: Dict[str, Tuple[object, List, Dict[int, Tuple[int, int]]]] = dict()
+
+    def __str__(self) -> str:
+        return f'ExternResolver gen {self.__gen} sketches {len(self.__cache)}'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def invalidate(self) -> None:
+        self.__gen += 1
+
+    def __entry(self, ex_sk) -> Tuple[object, List, Dict[int, Tuple[int, int]]]:
+        rev = object_revision(ex_sk)
+        key = ('gen', self.__gen) if rev is None else ('rev', rev)
+        ent = self.__cache.get(ex_sk.FullName)
+        if (ent is None) or (ent[0] != key):
+            xp('extern read', ex_sk.FullName, key, **_go)
+            ent = (key, ex_sk.Geometry, dict())
+            self.__cache[ex_sk.FullName] = ent
+        return ent
+
+    def geometry(self, ex_sk, idx: int):
+        return self.__entry(ex_sk)[1][idx]
+
+    def vertex(self, ex_sk, no: int) -> Tuple[int, int]:
+        vert = self.__entry(ex_sk)[2]
+        if no not in vert:
+            vert[no] = ex_sk.getGeoVertexIndex(no)
+        return vert[no]
 
 
 class Lookup:
 
     Idx = NewType('Idx', int)
 
-    def __init__(self, obj) -> None:
+    def __init__(self, obj, snap: Optional[GeoSnapshot] = None, ext: Optional[ExternResolver] = None) -> None:
         self.sketch: Sketcher.SketchObject = obj
-        self.vert_idx_to_geo_id: Dict[int, Tuple[int, int]] = self.vert_geo_idx(self.sketch)
-        self.geo_id_to_vert_idx: Dict[Tuple[int, int], int] = self.geo_vert_idx(self.sketch)
-        self.geo_idx_to_vertices: Dict[int, List[str]] = self.geo_vert_str(self.geo_id_to_vert_idx)
+        self.snap: Optional[GeoSnapshot] = snap
+        self.ext: ExternResolver = ExternResolver() if ext is None else ext
+        self.__ext_names: Optional[Dict[int, Tuple[Sketcher.Sketch, str]]] = None
+        self.__ext_points: Dict[str, list] = dict()
+        # constraint records by cs_idx (first, first_pos, ...), read from the sketch if not set
+        self.cons: Optional[Dict[int, object]] = None
+        self.__vert_geo: Optional[Dict[int, Tuple[int, int]]] = None
+        self.__geo_vert: Optional[Dict[Tuple[int, int], int]] = None
+        self.__geo_str: Optional[Dict[int, List[str]]] = None
+
+    @property
+    def vert_idx_to_geo_id(self) -> Dict[int, Tuple[int, int]]:
+        if self.__vert_geo is None:
+            self.__vertex_index()
+        return self.__vert_geo
+
+    @property
+    def geo_id_to_vert_idx(self) -> Dict[Tuple[int, int], int]:
+        if self.__geo_vert is None:
+            self.__vertex_index()
+        return self.__geo_vert
+
+    @property
+    def geo_idx_to_vertices(self) -> Dict[int, List[str]]:
+        if self.__geo_str is None:
+            self.__vertex_index()
+        return self.__geo_str
+
+    @flow
+    def __vertex_index(self) -> None:
+        # all vertex mappings in a single walk over getGeoVertexIndex
+        idx = 0
+        vert_geo: Dict[int, Tuple[int, int]] = dict()
+        geo_vert: Dict[Tuple[int, int], int] = dict()
+        geo_str: Dict[int, List[str]] = dict()
+        while True:
+            geo, pos = self.sketch.getGeoVertexIndex(idx)
+            if (geo == -2000) and (pos == 0):
+                break
+            vert_geo[idx] = (geo, pos)
+            geo_vert[(geo, pos)] = idx
+            geo_str.setdefault(geo, list()).append(f'{GeoTypeUi.VERTEX}{idx + 1}')
+            idx += 1
+        self.__vert_geo, self.__geo_vert, self.__geo_str = vert_geo, geo_vert, geo_str
 
     def ui_name_to_geo_id_pt(self, typ, ex_sk: Sketcher.Sketch, ui_name) -> Tuple[GeoId, object]:
         # ui_name -> [sk.GeoId, Point]
         g_typ, no = self.deconstruct_ui_name(ui_name)
         if g_typ == 'Edge':
-            geo = ex_sk.Geometry[no-1]
+            geo = self.ext.geometry(ex_sk, no - 1)
             if typ == 'E':
                 ret = [(GeoId(no - 1, -1), geo)]
             else:
                 ret = [(GeoId(no-1, 1), geo), (GeoId(no-1, 2), geo)]
         elif g_typ == 'Vertex':
-            geo, pos = ex_sk.getGeoVertexIndex(no-1)
-            g = ex_sk.Geometry[geo]
+            geo, pos = self.ext.vertex(ex_sk, no - 1)
+            g = self.ext.geometry(ex_sk, geo)
             if typ == 'E':
                 ret = []
             else:
@@ -56,15 +135,19 @@ class Lookup:
 
     def geo_idx_to_ex_ui_name(self) -> Dict[int, Tuple[Sketcher.Sketch, str]]:
         # local_geo_idx: (ext_ui_name, ext_sketch)
-        geo_idx = -3
-        res = dict()
-        for sk, ex in self.sketch.ExternalGeometry:
-            for name in ex:
-                res[geo_idx] = (sk, name)
-                geo_idx -= 1
-        return res
+        if self.__ext_names is None:
+            geo_idx = -3
+            res = dict()
+            for sk, ex in self.sketch.ExternalGeometry:
+                for name in ex:
+                    res[geo_idx] = (sk, name)
+                    geo_idx -= 1
+            self.__ext_names = res
+        return self.__ext_names
 
     def extern_points(self, typ):
+        if typ in self.__ext_points:
+            return self.__ext_points[typ]
         res = list()
         dic = self.geo_idx_to_ex_ui_name()
         for idx, sketch_name in dic.items():
@@ -72,6 +155,7 @@ class Lookup:
             for geo in geos:
                 geo_id, g = geo
                 res.append((GeoId(idx, geo_id.typ), g))
+        self.__ext_points[typ] = res
         return res
 
     def geo_idx_to_geo_ids(self, sketch) -> Dict[int, List[GeoId]]:
@@ -174,7 +258,7 @@ class Lookup:
                 if geo_idx <= -3:
                     res_set.add(f'{GeoTypeUi.EXTERNAL_EDGE_ABR}{((geo_idx + 2) * -1)}')
                     return res_set, {f'{GeoTypeUi.EXTERNAL_EDGE}{((geo_idx + 2) * -1)} geo_idx: {geo_idx}'}
-                type_id = self.sketch.Geometry[geo_idx].TypeId
+                type_id = self._type_id(geo_idx)
                 if (type_id == GeoType.LINE_SEGMENT) or (type_id == GeoType.CIRCLE) or (type_id == GeoType.ARC_OF_CIRCLE):
                     res_set.add(f'{GeoTypeUi.EDGE}{geo_idx + 1}')
                     return res_set, self._geo_info(geo_idx)
@@ -194,33 +278,33 @@ class Lookup:
                 item: ConsTrans = args[0]
                 s: str = ''
                 set_: Set[str] = set()
-                cs: Sketcher.Constraint = self.sketch.Constraints[item.co_idx]
+                first, first_pos, second, second_pos, third, third_pos = self._cons_refs(item.co_idx)
                 if (Cs.F | Cs.FP) in item.sub_type:
-                    s1, s2 = self.lookup_ui_names(GeoPt(cs.First, cs.FirstPos))
+                    s1, s2 = self.lookup_ui_names(GeoPt(first, first_pos))
                     set_.add(s1)
                     s += f'{s2} '
                 elif Cs.F in item.sub_type:
-                    s1, s2 = self.lookup_ui_names(cs.First)
+                    s1, s2 = self.lookup_ui_names(first)
                     set_ = set_.union(s1)
                     s += f'{s2} '
                 else:
                     raise ValueError('no first available')
 
                 if (Cs.S | Cs.SP) in item.sub_type:
-                    s1, s2 = self.lookup_ui_names(GeoPt(cs.Second, cs.SecondPos))
+                    s1, s2 = self.lookup_ui_names(GeoPt(second, second_pos))
                     set_.add(s1)
                     s += f'{s2} '
                 elif Cs.S in item.sub_type:
-                    s1, s2 = self.lookup_ui_names(cs.Second)
+                    s1, s2 = self.lookup_ui_names(second)
                     set_ = set_.union(s1)
                     s += f'{s2} '
 
                 if (Cs.T | Cs.TP) in item.sub_type:
-                    s1, s2 = self.lookup_ui_names(GeoPt(cs.Third, cs.ThirdPos))
+                    s1, s2 = self.lookup_ui_names(GeoPt(third, third_pos))
                     set_.add(s1)
                     s += f'{s2} '
                 elif Cs.T in item.sub_type:
-                    s1, s2 = self.lookup_ui_names(cs.Third)
+                    s1, s2 = self.lookup_ui_names(third)
                     set_ = set_.union(s1)
                     s += f'{s2} '
                 return set_, s
@@ -229,7 +313,21 @@ class Lookup:
         else:
             raise TypeError(len(args))
 
+    def _cons_refs(self, co_idx: int) -> Tuple[int, int, int, int, int, int]:
+        if self.cons is not None:
+            c = self.cons[co_idx]
+            return c.first, c.first_pos, c.second, c.second_pos, c.third, c.third_pos
+        c: Sketcher.Constraint = self.sketch.Constraints[co_idx]
+        return c.First, c.FirstPos, c.Second, c.SecondPos, c.Third, c.ThirdPos
+
+    def _type_id(self, idx) -> str:
+        if self.snap is not None:
+            return self.snap.type_id[self.snap.row(idx)]
+        return self.sketch.Geometry[idx].TypeId
+
     def _geo_info(self, idx) -> str:
+        if self.snap is not None:
+            return self._snap_info(idx)
         geo = self.sketch.Geometry[idx]
         if geo.TypeId == GeoType.LINE_SEGMENT:
             geo: Part.LineSegment
@@ -246,6 +344,18 @@ class Lookup:
             geo: Part.Point
             return f'geo_idx: {idx} TypeId: {geo.TypeId} Item: {geo}'
 
+    def _snap_info(self, idx) -> str:
+        sn = self.snap
+        r = sn.row(idx)
+        typ = sn.type_id[r]
+        if typ == GeoType.LINE_SEGMENT:
+            return f'{GeoTypeUi.EDGE}{idx + 1} geo_idx: {idx} start: ({sn.sx[r]:.1f}, {sn.sy[r]:.1f}, 0.0) ' \
+                   f'end: ({sn.ex[r]:.1f}, {sn.ey[r]:.1f}, 0.0)'
+        if (typ == GeoType.CIRCLE) or (typ == GeoType.ARC_OF_CIRCLE):
+            return f'geo_idx: {idx} TypeId: {typ} Center: ({sn.cx[r]:.1f}, {sn.cy[r]:.1f}, 0.0) Radius: {sn.radius[r]}'
+        if typ == GeoType.POINT:
+            return f'geo_idx: {idx} TypeId: {typ} Item: ({sn.sx[r]:.1f}, {sn.sy[r]:.1f}, 0.0)'
+
     @staticmethod
     def translate_geo_idx(idx: int, gui=True) -> str:
         n = 1 if gui else 0
@@ -276,10 +386,14 @@ class Lookup:
 
     @flow
     def open_vertices(self) -> List[str]:
-        geo_vert_set = {(idx, 1) for idx, geo in enumerate(self.sketch.Geometry)
-                        if (geo.TypeId == GeoType.LINE_SEGMENT) or (geo.TypeId == GeoType.ARC_OF_CIRCLE)}
-        geo_vert_set.update({(idx, 2) for idx, geo in enumerate(self.sketch.Geometry)
-                             if (geo.TypeId == GeoType.LINE_SEGMENT) or (geo.TypeId == GeoType.ARC_OF_CIRCLE)})
+        if self.snap is not None:
+            edges = [self.snap.geo_idx[r] for r in self.snap.rows_of(GeoType.LINE_SEGMENT, GeoType.ARC_OF_CIRCLE,
+                                                                     extern=False)]
+        else:
+            edges = [idx for idx, geo in enumerate(self.sketch.Geometry)
+                     if (geo.TypeId == GeoType.LINE_SEGMENT) or (geo.TypeId == GeoType.ARC_OF_CIRCLE)]
+        geo_vert_set = {(idx, 1) for idx in edges}
+        geo_vert_set.update({(idx, 2) for idx in edges})
         xp('geo_vert_set', geo_vert_set)
         co_list: List[Sketcher.Constraint] = self.sketch.Constraints
         cs_id_set = {(item.First, item.FirstPos) for item in co_list if ConType(item.Type) == ConType.COINCIDENT}
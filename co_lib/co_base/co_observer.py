@@ -14,6 +14,7 @@
 # *                                                                         *
 # ***************************************************************************
 from contextlib import contextmanager
+from typing import Dict, FrozenSet, NamedTuple, Optional, Set
 
 import FreeCAD as App
 import FreeCADGui as Gui
@@ -39,6 +40,66 @@ class EventProvider(QObject):
 __evo = EventProvider()
 
 
+class SketchDelta(NamedTuple):
+    # what changed between two revisions of the sketch
+    geo: FrozenSet[int]  # changed, added or removed geometry indices
+    count: bool  # number of geometries changed, indices might have shifted
+    cons: bool  # any constraint, name, value or expression changed
+    topo: bool  # constraint types or referenced geometries changed
+
+
+# per object change counter, only maintained while the app observer is registered
+__obj_rev: Dict[str, int] = dict()
+__obj_rev_on: bool = False
+# per document counter of created, deleted or relabeled objects
+__doc_rev: Dict[str, int] = dict()
+# counts any change in any document
+__app_rev: int = 0
+
+
+def object_revision(obj) -> Optional[int]:
+    # None if changes are not tracked
+    if not __obj_rev_on:
+        return None
+    return __obj_rev.get(obj.FullName, 0)
+
+
+def object_revision_bump(obj) -> None:
+    name = obj.FullName
+    __obj_rev[name] = __obj_rev.get(name, 0) + 1
+
+
+def document_revision(doc) -> Optional[int]:
+    # None if changes are not tracked
+    if not __obj_rev_on:
+        return None
+    return __doc_rev.get(doc.Name, 0)
+
+
+def document_revision_bump(doc) -> None:
+    name = doc.Name
+    __doc_rev[name] = __doc_rev.get(name, 0) + 1
+
+
+def app_revision() -> Optional[int]:
+    # None if changes are not tracked
+    if not __obj_rev_on:
+        return None
+    return __app_rev
+
+
+def app_revision_bump() -> None:
+    global __app_rev
+    __app_rev += 1
+
+
+def hash_delta(old: Dict[int, int], new: Dict[int, int]) -> Set[int]:
+    # keys whose per item hash differs, missing on one side counts as changed
+    if old == new:
+        return set()
+    return {k for k in old.keys() | new.keys() if old.get(k) != new.get(k)}
+
+
 # need a single instance
 def observer_event_provider_get() -> EventProvider:
     return __evo
@@ -58,9 +119,11 @@ class AppDocumentObserver(object):
 
     def slotCreatedDocument(self, doc):
         xp(f'{next(AppDocumentObserver.seq):>3}', 'AppDocumentObserver slotCreatedDocument', doc, **_ob_a)
+        app_revision_bump()
 
     def slotDeletedDocument(self, doc):
         xp(f'{next(AppDocumentObserver.seq):>3}', 'AppDocumentObserver slotDeletedDocument', doc, **_ob_a)
+        app_revision_bump()
 
     def slotRelabelDocument(self, doc):
         xp(f'{next(AppDocumentObserver.seq):>3}', 'AppDocumentObserver slotRelabelDocument', doc, **_ob_a)
@@ -131,13 +194,21 @@ class AppDocumentObserver(object):
 
     def slotCreatedObject(self, obj):
         xp(f'{next(AppDocumentObserver.seq):>3}', 'AppDocumentObserver slotCreatedObject', obj, **_ob_a)
+        document_revision_bump(obj.Document)
+        app_revision_bump()
 
     def slotDeletedObject(self, obj):
         xp(f'{next(AppDocumentObserver.seq):>3}', 'AppDocumentObserver slotDeletedObject', obj, **_ob_a)
+        document_revision_bump(obj.Document)
+        app_revision_bump()
 
     def slotChangedObject(self, obj, prop):
         xp(f'{next(AppDocumentObserver.seq):>3}', 'AppDocumentObserver slotChangedObject', obj, prop, **_ob_a)
         # log_some_stuff(obj, prop)
+        object_revision_bump(obj)
+        app_revision_bump()
+        if prop == 'Label':
+            document_revision_bump(obj.Document)
 
     def slotBeforeChangeObject(self, obj, prop):
         xp(f'{next(AppDocumentObserver.seq):>3}', 'AppDocumentObserver slotBeforeChangeObject', obj, prop, **_ob_a)
@@ -321,11 +392,17 @@ def unregister_gui_document_observer():
 
 
 def register_app_document_observer():
+    global __obj_rev_on
     App.addDocumentObserver(__app_document_observer)
+    __obj_rev_on = True
 
 
 def unregister_app_document_observer():
+    global __obj_rev_on
     App.removeDocumentObserver(__app_document_observer)
+    __obj_rev_on = False
+    __obj_rev.clear()
+    __doc_rev.clear()
 
 
 def register():
@@ -0,0 +1,123 @@
+# ***************************************************************************
+# *   Copyright (c) 2021 n1ob <niob@gmx.com>                                *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# ***************************************************************************
+from array import array
+from math import atan2, degrees, isnan, nan
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .co_geo import GeoType, GeoRecord, Other
+from .co_logger import xp, xps, _go
+
+
+class GeoSnapshot:
+    # read only copy of the sketch geometry, one row per geometry in struct of
+    # arrays layout, internal rows in sketch order followed by the extern edges,
+    # filled from core records so it is built without FreeCAD as well
+    def __init__(self, rev: int) -> None:
+        self.rev: int = rev
+        self.geo_idx: array = array('q')
+        self.type_id: List[str] = list()
+        self.construct: array = array('b')
+        self.extern: array = array('b')
+        # start / end for lines and arcs, the location for points, start / end / center
+        # of other types only feed the hashes
+        self.sx: array = array('d')
+        self.sy: array = array('d')
+        self.ex: array = array('d')
+        self.ey: array = array('d')
+        # center, radius and x axis angle for circles and arcs
+        self.cx: array = array('d')
+        self.cy: array = array('d')
+        self.radius: array = array('d')
+        self.angle_xu: array = array('d')
+        # edge length and line direction in degrees [0, 180]
+        self.length: array = array('d')
+        self.angle: array = array('d')
+        self.rows: Dict[int, int] = dict()
+        # extern points usable as coincident partners (geo_idx, pos, x, y)
+        self.ext_vertices: List[Tuple[int, int, float, float]] = list()
+        self.__hashes: Optional[Dict[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.geo_idx)
+
+    def __str__(self) -> str:
+        return f'GeoSnapshot rev {self.rev} rows {len(self.geo_idx)} ext_vertices {len(self.ext_vertices)}'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def row(self, geo_idx: int) -> int:
+        return self.rows[geo_idx]
+
+    def rows_of(self, *type_ids: str, internal: bool = True, extern: bool = True) -> List[int]:
+        # rows of the given types, all types if none given
+        return [r for r, t in enumerate(self.type_id)
+                if ((not type_ids) or (t in type_ids)) and (extern if self.extern[r] else internal)]
+
+    def hashes(self) -> Dict[int, int]:
+        # per geometry hash keyed by geo_idx, nan mapped to None as its hash is not stable
+        if self.__hashes is None:
+            cols = (self.sx, self.sy, self.ex, self.ey, self.cx, self.cy, self.radius, self.angle_xu, self.length)
+            self.__hashes = {idx: hash((self.type_id[r], self.construct[r],
+                                        tuple(None if isnan(c[r]) else c[r] for c in cols)))
+                             for r, idx in enumerate(self.geo_idx)}
+        return self.__hashes
+
+    def type_of(self, geo_idx: int) -> Optional[str]:
+        r = self.rows.get(geo_idx)
+        return None if r is None else self.type_id[r]
+
+    def _append(self, idx: int, geo: GeoRecord, construct: bool, extern: bool) -> None:
+        typ = geo.type_id
+        sx = sy = ex = ey = cx = cy = rad = xu = angle = nan
+        if typ in (GeoType.LINE_SEGMENT, GeoType.ARC_OF_CIRCLE):
+            sx, sy, ex, ey = geo.sx, geo.sy, geo.ex, geo.ey
+        if typ == GeoType.LINE_SEGMENT:
+            angle = degrees(atan2(ey - sy, ex - sx))
+            if angle < 0:
+                angle += 180
+        elif typ in (GeoType.CIRCLE, GeoType.ARC_OF_CIRCLE):
+            cx, cy, rad, xu = geo.cx, geo.cy, geo.radius, geo.xu
+        elif typ == GeoType.POINT:
+            sx, sy = geo.x, geo.y
+        elif isinstance(geo, Other):
+            sx, sy, ex, ey, cx, cy = geo.sx, geo.sy, geo.ex, geo.ey, geo.cx, geo.cy
+        length = geo.length()
+        self.rows[idx] = len(self.geo_idx)
+        self.geo_idx.append(idx)
+        self.type_id.append(typ)
+        self.construct.append(construct)
+        self.extern.append(extern)
+        for arr, val in ((self.sx, sx), (self.sy, sy), (self.ex, ex), (self.ey, ey), (self.cx, cx),
+                         (self.cy, cy), (self.radius, rad), (self.angle_xu, xu), (self.length, length),
+                         (self.angle, angle)):
+            arr.append(val)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[int, GeoRecord, bool, bool]],
+                     ext_vertices: Iterable[Tuple[int, int, float, float]], rev: int) -> 'GeoSnapshot':
+        # records as (geo_idx, record, construct, extern), internal ones first, see co_adapter for a sketch
+        snap = cls(rev)
+        for idx, geo, construct, extern in records:
+            snap._append(idx, geo, construct, extern)
+        snap.ext_vertices.extend(ext_vertices)
+        xp(snap, **_go)
+        return snap
+
+
+xps(__name__)
+if __name__ == '__main__':
+    pass
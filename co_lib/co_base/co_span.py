@@ -0,0 +1,129 @@
+# ***************************************************************************
+# *   Copyright (c) 2021 n1ob <niob@gmx.com>                                *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# ***************************************************************************
+import functools
+import json
+from time import perf_counter
+from typing import Dict, List
+
+from .co_logger import xps
+
+# timings of named spans, off unless switched on, kept in memory as log2 histograms
+SPAN_ON = False
+# bucket i counts durations in [2^i, 2^(i+1)) microseconds, the last one all above
+SPAN_BUCKETS = 24
+
+# name -> [count, total, min, max, buckets]
+_SPANS: Dict[str, list] = dict()
+
+
+def span_enable(enable: bool) -> bool:
+    global SPAN_ON
+    prev = SPAN_ON
+    SPAN_ON = enable
+    return prev
+
+
+def span_add(name: str, sec: float):
+    rec = _SPANS.get(name)
+    if rec is None:
+        rec = _SPANS[name] = [0, 0.0, sec, sec, [0] * SPAN_BUCKETS]
+    rec[0] += 1
+    rec[1] += sec
+    if sec < rec[2]:
+        rec[2] = sec
+    if sec > rec[3]:
+        rec[3] = sec
+    rec[4][min(max(int(sec * 1e6), 1).bit_length() - 1, SPAN_BUCKETS - 1)] += 1
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        span_add(self.name, perf_counter() - self.start)
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    # with span('co.kernel'): ..., a shared do nothing context while switched off
+    return _Span(name) if SPAN_ON else _NO_SPAN
+
+
+def timed(name: str):
+    # decorator form of span, checked per call so it follows the switch
+    def decorator_timed(func):
+        @functools.wraps(func)
+        def wrapper_timed(*args, **kwargs):
+            if not SPAN_ON:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                span_add(name, perf_counter() - start)
+        return wrapper_timed
+    return decorator_timed
+
+
+def span_reset():
+    _SPANS.clear()
+
+
+def span_stats() -> Dict[str, dict]:
+    res: Dict[str, dict] = dict()
+    for name, (cnt, total, lo, hi, buckets) in sorted(_SPANS.items()):
+        res[name] = {'count': cnt, 'total_ms': total * 1e3, 'mean_ms': total * 1e3 / cnt, 'min_ms': lo * 1e3,
+                     'max_ms': hi * 1e3, 'hist_us_log2': list(buckets)}
+    return res
+
+
+def span_table() -> str:
+    lines: List[str] = [f'{"span":<24} {"count":>7} {"total ms":>10} {"mean ms":>9} {"min ms":>9} {"max ms":>9}']
+    for name, st in span_stats().items():
+        lines.append(f'{name:<24} {st["count"]:>7} {st["total_ms"]:>10.2f} {st["mean_ms"]:>9.3f} '
+                     f'{st["min_ms"]:>9.3f} {st["max_ms"]:>9.3f}')
+    return '\n'.join(lines)
+
+
+def span_dump(path: str) -> str:
+    with open(path, 'w') as file:
+        json.dump(span_stats(), file, indent=1)
+    return path
+
+
+xps(__name__)
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,187 @@
+# ***************************************************************************
+# *   Copyright (c) 2021 n1ob <niob@gmx.com>                                *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# ***************************************************************************
+import math
+from bisect import bisect_right
+from typing import Dict, Hashable, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from .co_logger import xps
+
+Cell = Tuple[int, int]
+
+
+class PointGrid:
+    # uniform grid hash over 2d points, answers radius queries by looking
+    # only at the 3x3 block of cells around a point, so the radius of a
+    # query must not exceed the cell size the grid was built with
+    MIN_CELL = 1e-6
+
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size: float = max(cell_size, PointGrid.MIN_CELL)
+        self.__cells: Dict[Cell, List[Hashable]] = dict()
+        self.__points: Dict[Hashable, Tuple[float, float]] = dict()
+
+    def __len__(self) -> int:
+        return len(self.__points)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__points
+
+    def __str__(self) -> str:
+        return f'PointGrid cell {self.cell_size} points {len(self.__points)} cells {len(self.__cells)}'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def _cell(self, x: float, y: float) -> Cell:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def point(self, key: Hashable) -> Tuple[float, float]:
+        return self.__points[key]
+
+    def insert(self, key: Hashable, x: float, y: float) -> None:
+        if key in self.__points:
+            self.remove(key)
+        self.__points[key] = (x, y)
+        self.__cells.setdefault(self._cell(x, y), list()).append(key)
+
+    def remove(self, key: Hashable) -> None:
+        x, y = self.__points.pop(key)
+        cell = self._cell(x, y)
+        bucket = self.__cells[cell]
+        bucket.remove(key)
+        if not bucket:
+            del self.__cells[cell]
+
+    def neighbors(self, key: Hashable, radius: float) -> Iterator[Tuple[Hashable, float]]:
+        if radius > self.cell_size:
+            raise ValueError(f'radius {radius} exceeds cell size {self.cell_size}')
+        x, y = self.__points[key]
+        cx, cy = self._cell(x, y)
+        for i in (cx - 1, cx, cx + 1):
+            for j in (cy - 1, cy, cy + 1):
+                for other in self.__cells.get((i, j), ()):
+                    if other == key:
+                        continue
+                    ox, oy = self.__points[other]
+                    dist = math.hypot(ox - x, oy - y)
+                    if dist <= radius:
+                        yield other, dist
+
+    def pairs(self, radius: float) -> Iterator[Tuple[Hashable, Hashable, float]]:
+        # every pair once, visiting only half of the neighbouring cells
+        if radius > self.cell_size:
+            raise ValueError(f'radius {radius} exceeds cell size {self.cell_size}')
+        pts = self.__points
+        for (cx, cy), bucket in self.__cells.items():
+            for n, key in enumerate(bucket):
+                x, y = pts[key]
+                for other in bucket[n + 1:]:
+                    ox, oy = pts[other]
+                    dist = math.hypot(ox - x, oy - y)
+                    if dist <= radius:
+                        yield key, other, dist
+                for i, j in ((cx + 1, cy - 1), (cx + 1, cy), (cx + 1, cy + 1), (cx, cy + 1)):
+                    for other in self.__cells.get((i, j), ()):
+                        ox, oy = pts[other]
+                        dist = math.hypot(ox - x, oy - y)
+                        if dist <= radius:
+                            yield key, other, dist
+
+
+class NeighborIndex:
+    # every point with its neighbors within radius sorted by distance, kept up
+    # to date by insert / remove / move, the work done is proportional to the
+    # points touched and not to the size of the index
+    def __init__(self, radius: float) -> None:
+        self.radius: float = max(radius, PointGrid.MIN_CELL)
+        self.__grid: PointGrid = PointGrid(self.radius)
+        self.__dist: Dict[Hashable, List[float]] = dict()
+        self.__keys: Dict[Hashable, List[Hashable]] = dict()
+
+    def __len__(self) -> int:
+        return len(self.__grid)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__grid
+
+    def __str__(self) -> str:
+        return f'NeighborIndex radius {self.radius} {self.__grid}'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def load(self, keys: Sequence[Hashable], xs: Sequence[float], ys: Sequence[float],
+             rows: Iterable[Iterable[Tuple[int, float]]]) -> None:
+        # bulk load from already known pairs, rows[r] lists (other row, distance) sorted by distance
+        for r, nbs in enumerate(rows):
+            key = keys[r]
+            self.__grid.insert(key, xs[r], ys[r])
+            dist = self.__dist[key] = list()
+            other = self.__keys[key] = list()
+            for j, d in nbs:
+                dist.append(d)
+                other.append(keys[j])
+
+    def neighbors(self, key: Hashable) -> Iterator[Tuple[Hashable, float]]:
+        return zip(self.__keys[key], self.__dist[key])
+
+    def point(self, key: Hashable) -> Tuple[float, float]:
+        return self.__grid.point(key)
+
+    def __link(self, key: Hashable, other: Hashable, d: float) -> None:
+        dist = self.__dist[key]
+        n = bisect_right(dist, d)
+        dist.insert(n, d)
+        self.__keys[key].insert(n, other)
+
+    def __unlink(self, key: Hashable, other: Hashable) -> None:
+        n = self.__keys[key].index(other)
+        del self.__keys[key][n]
+        del self.__dist[key][n]
+
+    def insert(self, key: Hashable, x: float, y: float) -> Set[Hashable]:
+        # returns the keys whose neighbor list changed
+        if key in self.__grid:
+            return self.move(key, x, y)
+        self.__grid.insert(key, x, y)
+        self.__dist[key] = list()
+        self.__keys[key] = list()
+        touched = {key}
+        for other, d in self.__grid.neighbors(key, self.radius):
+            self.__link(key, other, d)
+            self.__link(other, key, d)
+            touched.add(other)
+        return touched
+
+    def remove(self, key: Hashable) -> Set[Hashable]:
+        # returns the former neighbors
+        touched = set(self.__keys.pop(key))
+        del self.__dist[key]
+        for other in touched:
+            self.__unlink(other, key)
+        self.__grid.remove(key)
+        return touched
+
+    def move(self, key: Hashable, x: float, y: float) -> Set[Hashable]:
+        if self.__grid.point(key) == (x, y):
+            return set()
+        touched = self.remove(key)
+        return touched | self.insert(key, x, y)
+
+
+xps(__name__)
+if __name__ == '__main__':
+    pass
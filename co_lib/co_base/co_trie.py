@@ -0,0 +1,143 @@
+# ***************************************************************************
+# *   Copyright (c) 2021 n1ob <niob@gmx.com>                                *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# ***************************************************************************
+import re
+from typing import Dict, List, Set
+
+from .co_logger import xps
+
+
+class TrieNode:
+    __slots__ = ('kids', 'vals')
+
+    def __init__(self) -> None:
+        self.kids: Dict[str, TrieNode] = dict()
+        # value -> number of times it was added under this key
+        self.vals: Dict[str, int] = dict()
+
+
+class PrefixTrie:
+    # case insensitive keys, a key can carry several values, a prefix query
+    # only visits the subtree below the prefix
+    def __init__(self) -> None:
+        self.__root = TrieNode()
+        self.__len = 0
+
+    def __len__(self) -> int:
+        return self.__len
+
+    def add(self, key: str, val: str) -> None:
+        n = self.__root
+        for ch in key.lower():
+            nxt = n.kids.get(ch)
+            if nxt is None:
+                nxt = n.kids[ch] = TrieNode()
+            n = nxt
+        n.vals[val] = n.vals.get(val, 0) + 1
+        self.__len += 1
+
+    def remove(self, key: str, val: str) -> bool:
+        path = [self.__root]
+        key = key.lower()
+        for ch in key:
+            n = path[-1].kids.get(ch)
+            if n is None:
+                return False
+            path.append(n)
+        n = path[-1]
+        cnt = n.vals.get(val, 0)
+        if not cnt:
+            return False
+        if cnt > 1:
+            n.vals[val] = cnt - 1
+        else:
+            del n.vals[val]
+        self.__len -= 1
+        # prune the empty tail
+        for i in range(len(key), 0, -1):
+            n = path[i]
+            if n.vals or n.kids:
+                break
+            del path[i - 1].kids[key[i - 1]]
+        return True
+
+    def find(self, prefix: str, limit: int = 0) -> List[str]:
+        n = self.__root
+        for ch in prefix.lower():
+            n = n.kids.get(ch)
+            if n is None:
+                return list()
+        # depth first in key order, so a limit keeps the first matches in sorted order
+        res: List[str] = list()
+        seen: Set[str] = set()
+        stack = [n]
+        while stack:
+            n = stack.pop()
+            for v in sorted(n.vals, key=str.lower):
+                if v not in seen:
+                    seen.add(v)
+                    res.append(v)
+                    if limit and (len(res) >= limit):
+                        return res
+            stack.extend(n.kids[ch] for ch in sorted(n.kids, reverse=True))
+        return res
+
+
+class PathIndex:
+    # completion paths like Doc#Obj.Prop or <<Label>>.Prop, by prefix of the
+    # whole path and by prefix of any later segment, i.e. a substring match
+    # anchored at a segment start
+    __SEG = re.compile(r'[.#\[]|<<')
+
+    def __init__(self) -> None:
+        self.__full = PrefixTrie()
+        self.__seg = PrefixTrie()
+
+    def __len__(self) -> int:
+        return len(self.__full)
+
+    @staticmethod
+    def starts(path: str) -> List[int]:
+        return [m.end() for m in PathIndex.__SEG.finditer(path) if 0 < m.end() < len(path)]
+
+    def add(self, path: str) -> None:
+        self.__full.add(path, path)
+        for i in PathIndex.starts(path):
+            self.__seg.add(path[i:], path)
+
+    def remove(self, path: str) -> None:
+        if self.__full.remove(path, path):
+            for i in PathIndex.starts(path):
+                self.__seg.remove(path[i:], path)
+
+    def prefix(self, q: str, limit: int = 0) -> List[str]:
+        return sorted(self.__full.find(q, limit), key=str.lower)
+
+    def substring(self, q: str, limit: int = 0) -> List[str]:
+        # prefix hits first, then paths with a matching segment
+        res = self.prefix(q, limit)
+        if limit and (len(res) >= limit):
+            return res
+        seen = set(res)
+        # segment hits come in segment order, all are needed to cut them by path
+        more = sorted((x for x in self.__seg.find(q) if x not in seen), key=str.lower)
+        if limit:
+            more = more[:limit - len(res)]
+        return res + more
+
+
+xps(__name__)
+if __name__ == '__main__':
+    pass
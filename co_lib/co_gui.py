@@ -140,7 +140,7 @@ class CoEdGui(QWidget):
         cfg.set(cfg.GEOMETRY, self.saveGeometry())
         Cfg().save()
         unregister()  # Uninstall the resident function
-        xp_worker.keep_running = False
+        xp_worker.shutdown()
         if self.exit:
             exit(0)
 
@@ -206,7 +206,7 @@ class CoEdGui(QWidget):
         if doc.TypeId == 'App::Document':
             doc: App.Document
             if doc.ActiveObject.TypeId == ObjType.SKETCH_OBJECT:
-                self.base.flags.all()
+                self.base.changes_classify()
                 self.up_cur_table()
 
     @flow
@@ -13,7 +13,7 @@
 # *   GNU Library General Public License for more details.                  *
 # *                                                                         *
 # ***************************************************************************
-from typing import List
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 from xml.dom.minidom import Element, Document
 
 import FreeCAD as App
@@ -26,12 +26,25 @@ from .co_base.co_cmn import fmt_vec, GeoType, ObjType
 from .co_base.co_config import Cfg
 from .co_base.co_flag import Dirty, Flags, ConsTrans
 from .co_base.co_logger import xp, flow, xps, _ob_s, _go
-from .co_base.co_lookup import Lookup
-from .co_base.co_observer import observer_event_provider_get
+from .co_base.co_span import timed
+from .co_base.co_lookup import Lookup, ExternResolver
+from .co_base.co_observer import observer_event_provider_get, SketchDelta, hash_delta
+from .co_base.co_adapter import snapshot_from_sketch
+from .co_base.co_snapshot import GeoSnapshot
 from .co_tabs import co_pa, co_rd, co_xy, co_hv, co_eq, co_cs, co_co
 
 
 class CoEd:
+    # tab caches depending on a geometry type, extern geometry is read by most tabs
+    __GEO_DIRTY = {
+        GeoType.LINE_SEGMENT: Dirty.HV_EDGES | Dirty.PA_EDGES | Dirty.XY_EDGES | Dirty.EQ_EDGES | Dirty.COIN_POINTS,
+        GeoType.ARC_OF_CIRCLE: Dirty.COIN_POINTS | Dirty.RD_CIRCLES,
+        GeoType.CIRCLE: Dirty.RD_CIRCLES,
+    }
+    __GEO_ALL = (Dirty.HV_EDGES | Dirty.PA_EDGES | Dirty.XY_EDGES | Dirty.EQ_EDGES | Dirty.COIN_POINTS |
+                 Dirty.RD_CIRCLES)
+    # snapshot revisions remembered for incremental updates
+    GEO_LOG = 64
 
     @flow
     def __init__(self, sk, base_dir=None, parent=None):
@@ -39,6 +52,13 @@ class CoEd:
         self.__init = False
         self.flags: Flags = Flags(Dirty)
         self.flags.all()
+        self.__snapshot: Optional[GeoSnapshot] = None
+        self.__snap_rev: int = 0
+        self.__geo_log: Dict[int, FrozenSet[int]] = dict()
+        self.__lookup: Optional[Lookup] = None
+        self.__ext: ExternResolver = ExternResolver()
+        self.__cons_sig: Optional[List[Tuple[int, int]]] = None
+        self.delta: Optional[SketchDelta] = None
         self.sketch: Sketcher.SketchObject = sk
         self.base_dir = base_dir
         if base_dir is not None:
@@ -64,8 +84,115 @@ class CoEd:
     @sketch.setter
     def sketch(self, value):
         self.__sketch: Sketcher.SketchObject = value
+        self.__snapshot = None
+        self.__lookup = None
+        self.__cons_sig = None
+        self.delta = None
         self.flags.all()
 
+    @property
+    def snapshot(self) -> GeoSnapshot:
+        # taken again only after the geometry was flagged as changed
+        if (self.__snapshot is None) or self.flags.has(Dirty.GEOMETRY):
+            self.__snapshot_take()
+        return self.__snapshot
+
+    @timed('snapshot')
+    def __snapshot_take(self) -> Optional[GeoSnapshot]:
+        # returns the replaced snapshot, the geometry part of the delta is recorded
+        old = self.__snapshot
+        # linked sketches are read again only if they changed, or always without change tracking
+        self.__ext.invalidate()
+        lo = Lookup(self.sketch, ext=self.__ext)
+        snap = snapshot_from_sketch(self.sketch, lo.extern_points('E'), lo.extern_points('V'), self.__snap_rev + 1)
+        self.flags.reset(Dirty.GEOMETRY)
+        if old is None:
+            self.delta = None
+            self.__geo_log.clear()
+        else:
+            geo = hash_delta(old.hashes(), snap.hashes())
+            self.delta = SketchDelta(frozenset(geo), len(old) != len(snap), False, False)
+            if not geo:
+                # unchanged, keep the revision so incremental users stay in step
+                return old
+            self.__geo_log[snap.rev] = self.delta.geo
+            if len(self.__geo_log) > self.GEO_LOG:
+                del self.__geo_log[next(iter(self.__geo_log))]
+        self.__snap_rev = snap.rev
+        self.__snapshot = snap
+        # the lookup used for the extern geometry is kept for this revision
+        lo.snap = snap
+        self.__lookup = lo
+        return old
+
+    @property
+    def lookup(self) -> Lookup:
+        # shared until the geometry changes, constraint refs follow the cs engine
+        snap = self.snapshot
+        if (self.__lookup is None) or (self.__lookup.snap is not snap):
+            self.__lookup = Lookup(self.sketch, snap, self.__ext)
+        self.__lookup.cons = self.cs.by_idx()
+        return self.__lookup
+
+    def geo_changes(self, rev: int) -> Optional[Set[int]]:
+        # geometry indices changed after snapshot revision rev, None if no longer known
+        if rev == self.__snap_rev:
+            return set()
+        if (rev > self.__snap_rev) or ((rev + 1) not in self.__geo_log):
+            return None
+        res = set()
+        for r in range(rev + 1, self.__snap_rev + 1):
+            res |= self.__geo_log[r]
+        return res
+
+    def __cons_sig_take(self) -> Optional[List[Tuple[int, int]]]:
+        # per constraint (topology, full) hash, the expressions as last item
+        old = self.__cons_sig
+        sig = list()
+        for c in self.sketch.Constraints:
+            topo = hash((c.Type, c.First, c.FirstPos, c.Second, c.SecondPos, c.Third, c.ThirdPos))
+            sig.append((topo, hash((topo, c.Name, c.Value, c.Driving, c.IsActive))))
+        exp = hash(tuple(tuple(x) for x in self.sketch.ExpressionEngine))
+        sig.append((0, exp))
+        self.__cons_sig = sig
+        return old
+
+    @flow
+    def changes_classify(self) -> SketchDelta:
+        # compare against the last seen revision and invalidate only what is affected
+        old_snap = self.__snapshot_take()
+        old_sig = self.__cons_sig_take()
+        snap, sig = self.__snapshot, self.__cons_sig
+        dirty = Dirty.NONE
+        if old_snap is None:
+            geo = frozenset(snap.geo_idx)
+            count = True
+            dirty |= self.__GEO_ALL
+        else:
+            geo = self.delta.geo
+            count = self.delta.count
+            for idx in geo:
+                typ_old, typ_new = old_snap.type_of(idx), snap.type_of(idx)
+                if (idx < 0) or (typ_old != typ_new):
+                    # extern or replaced, names and other tabs might be affected
+                    dirty |= self.__GEO_ALL | Dirty.CONSTRAINTS
+                    break
+                dirty |= self.__GEO_DIRTY.get(typ_new, Dirty.NONE)
+        if (old_sig is None) or (len(old_sig) != len(sig)):
+            cons = topo = True
+        else:
+            cons = old_sig != sig
+            topo = cons and any(a[0] != b[0] for a, b in zip(old_sig, sig))
+        if cons:
+            dirty |= Dirty.CONSTRAINTS
+        if topo:
+            # constraints feed the existing x/y markers of the xy engine
+            dirty |= Dirty.XY_EDGES
+        self.delta = SketchDelta(geo, count, cons, topo)
+        xp('changes_classify', self.delta, dirty, **_ob_s)
+        self.flags.set(dirty)
+        return self.delta
+
     @flow
     @Slot(object)
     def on_in_edit(self, obj):
@@ -84,25 +211,25 @@ class CoEd:
     @flow
     @Slot(object)
     def on_obj_recomputed(self, obj):
-        xp(f'on_obj_recomputed obj:', str(obj), **_ob_s)
+        xp('on_obj_recomputed obj:', obj, **_ob_s)
         if not self.sketch.isValid():
-            xp(f'Status: {self.sketch.getStatusString()}')
+            xp(lambda: f'Status: {self.sketch.getStatusString()}')
             # self.impl.sketch.autoRemoveRedundants(True)
             # self.impl.sketch.autoconstraint()
 
     @flow
     @Slot(object, str)
     def on_open_transact(self, doc, name):
-        xp(f'NOP on_open_transact doc: {doc} name: {name}', **_ob_s)
+        xp('NOP on_open_transact doc:', doc, 'name:', name, **_ob_s)
 
     @flow
     @Slot(object, str)
     def on_commit_transact(self, doc, name):
-        xp(f'on_commit_transact doc: {doc} name: {name}', **_ob_s)
+        xp('on_commit_transact doc:', doc, 'name:', name, **_ob_s)
         if 'coed' in name:
             xp('ignore own', **_ob_s)
         else:
-            self.flags.all()
+            self.changes_classify()
 
     def geo_xml_get2(self) -> str:
         # for xml display in ui
@@ -151,7 +278,7 @@ class CoEd:
         from xml.dom import minidom
         doc: Document = minidom.Document()
         try:
-            lo = Lookup(self.sketch)
+            lo = self.lookup
             obj = self.sketch
             root: Element = doc.createElement(obj.TypeId)
             if obj.TypeId == ObjType.SKETCH_OBJECT:
@@ -221,7 +348,6 @@ class CoEd:
 
                 leaf_cons: Element = doc.createElement('constraints_get_list')
                 co_list = self.cs.constraints
-                lo = Lookup(sk)
                 for idx, item in enumerate(co_list):
                     s1, s2 = lo.lookup_ui_names(ConsTrans(item.cs_idx, item.type_id, item.sub_type, item.fmt))
                     leaf_item: Element = doc.createElement('item')
@@ -414,7 +540,7 @@ class CoEd:
     def analyse_sketch(self):
         ob = list()
         ob.append(self.sketch)
-        lo = Lookup(self.sketch)
+        lo = self.lookup
         for obj in ob:
             xps('obj.TypeId:', obj.TypeId, **_go)
             if obj.TypeId == ObjType.SKETCH_OBJECT:
@@ -463,7 +589,6 @@ class CoEd:
 
                 xps('constraints_get_list', **_go)
                 co_list = self.cs.constraints
-                lo = Lookup(sk)
                 for idx, item in enumerate(co_list):
                     xp(f"idx: '{idx}' type_id: '{item.type_id}' sub_type: '{item.sub_type}' item: {item}", **_go)
                     # ct = ConType(item.type_id)
@@ -507,7 +632,6 @@ class CoEd:
                 xps('sub_shapes', **_go)
                 self.sub_shapes(obj.Shape)
                 xps('open_vertices')
-                lo = Lookup(self.sketch)
                 ls = lo.open_vertices()
                 xp(ls)
         xps(**_go)
@@ -26,6 +26,7 @@ from ..co_base import co_logger
 from ..co_base.co_cmn import contrast_color, lumi, split_rgb, complement_color
 from ..co_base.co_config import CfgFonts, CfgBasics, CfgColors, Cfg
 from ..co_base.co_logger import xp, flow, _ly, _cf
+from ..co_base.co_span import span_enable, span_reset, span_table, span_dump
 from ..co_base.co_style import XMLHighlighter
 
 _QL = QBoxLayout
@@ -46,6 +47,10 @@ class CfgGui:
             self.cfg_log_path = self.cfg_basic.log_path_default_get()
         else:
             self.cfg_log_path = str(Path(self.cfg_log_dir, self.cfg_basic.log_name_get()))
+        pol = self.cfg_basic.get(CfgBasics.LOG_POLICY)
+        co_logger.xp_worker.conf_set(pol if pol in co_logger.XpWorker.POLICIES else None,
+                                     self.cfg_basic.get(CfgBasics.LOG_ROTATE_MB) * 1024 * 1024,
+                                     self.cfg_basic.get(CfgBasics.LOG_ROTATE_KEEP))
         co_logger.xp_worker.log_path_set(self.cfg_log_path)
         self.base.cfg_only_valid = self.cfg_basic.get(CfgBasics.SHOW_ONLY_VALID)
 
@@ -76,6 +81,16 @@ class CfgGui:
         self.cfg_lbl_log = QLabel('Log Dir')
         self.cfg_log_ln_edt = QLineEdit()
         self.cfg_btn_log_file_dlg = QPushButton('...')
+        self.cfg_lbl_log_pol = QLabel('Log Queue Full')
+        self.cfg_log_pol_cmb = QComboBox()
+        self.cfg_lbl_log_rot = QLabel('Rotate MB')
+        self.cfg_log_rot_spn = QSpinBox()
+        self.cfg_lbl_log_keep = QLabel('Keep')
+        self.cfg_log_keep_spn = QSpinBox()
+        self.cfg_chk_box_spn = QCheckBox()
+        self.cfg_btn_spn_show = QPushButton('Timings')
+        self.cfg_btn_spn_dump = QPushButton('Dump')
+        self.cfg_btn_spn_reset = QPushButton('Reset')
         self.tab_cfg.setLayout(self.cfg_lay_get())
 
     @flow
@@ -103,9 +118,24 @@ class CfgGui:
         else:
             self.cfg_log_ln_edt.setText(self.cfg_log_dir)
         self.cfg_log_ln_edt.editingFinished.connect(self.on_log_edt_finish)
+        self.cfg_log_pol_cmb.addItems(co_logger.XpWorker.POLICIES)
+        self.cfg_log_pol_cmb.setCurrentText(co_logger.xp_worker.policy)
+        self.cfg_log_pol_cmb.currentTextChanged.connect(self.on_log_pol_cmb_chg)
+        # 0 MB never rotates, keep 0 starts the file over
+        self.cfg_log_rot_spn.setRange(0, 1024)
+        self.cfg_log_rot_spn.setValue(co_logger.xp_worker.rotate_size // (1024 * 1024))
+        self.cfg_log_rot_spn.valueChanged.connect(self.on_log_rot_spn_chg)
+        self.cfg_log_keep_spn.setRange(0, 20)
+        self.cfg_log_keep_spn.setValue(co_logger.xp_worker.rotate_keep)
+        self.cfg_log_keep_spn.valueChanged.connect(self.on_log_keep_spn_chg)
         self.cfg_chk_box_sel.setText('show only possible')
         self.cfg_chk_box_sel.setChecked(self.base.cfg_only_valid)
         self.cfg_chk_box_sel.stateChanged.connect(self.on_chk_box_sel_chg)
+        self.cfg_chk_box_spn.setText('record timings')
+        self.cfg_chk_box_spn.stateChanged.connect(self.on_chk_box_spn_chg)
+        self.cfg_btn_spn_show.clicked.connect(self.on_btn_clk_spn_show)
+        self.cfg_btn_spn_dump.clicked.connect(self.on_btn_clk_spn_dump)
+        self.cfg_btn_spn_reset.clicked.connect(self.on_btn_clk_spn_reset)
 
         self.cfg_ln_edt_col_1.setInputMask('\#HHHHHH;_')
         self.cfg_ln_edt_col_2.setInputMask('\#HHHHHH;_')
@@ -155,10 +185,14 @@ class CfgGui:
                [QHBoxLayout(), self.cfg_ln_edt_col_1, self.cfg_ln_edt_col_2, self.cfg_ln_edt_col_3],
                [QHBoxLayout(), self.cfg_ln_edt_col_4, self.cfg_ln_edt_col_5, self.cfg_ln_edt_col_6],
                [QHBoxLayout(), self.cfg_lbl_log, self.cfg_log_ln_edt, self.cfg_btn_log_file_dlg],
+               [QHBoxLayout(), self.cfg_lbl_log_pol, self.cfg_log_pol_cmb, _QL.addStretch, self.cfg_lbl_log_rot,
+                self.cfg_log_rot_spn, (_QL.addSpacing, 20), self.cfg_lbl_log_keep, self.cfg_log_keep_spn],
                [QHBoxLayout(), self.cfg_filter_cmb, _QL.addStretch, self.cfg_btn_tbl, (_QL.addSpacing, 20), self.cfg_btn_geo],
                [QHBoxLayout(), self.cfg_font_box, _QL.addStretch, self.cfg_font_size],
                (_QL.addSpacing, 10), self.cfg_txt_edt, (_QL.addSpacing, 10),
-               [QHBoxLayout(), self.cfg_chk_box_sel, _QL.addStretch, self.cfg_btn_load, (_QL.addSpacing, 20), self.cfg_btn_save]]
+               [QHBoxLayout(), self.cfg_chk_box_sel, _QL.addStretch, self.cfg_btn_load, (_QL.addSpacing, 20), self.cfg_btn_save],
+               [QHBoxLayout(), self.cfg_chk_box_spn, _QL.addStretch, self.cfg_btn_spn_show, (_QL.addSpacing, 20),
+                self.cfg_btn_spn_dump, (_QL.addSpacing, 20), self.cfg_btn_spn_reset]]
         return self.base.lay_get(lis)
 
     @flow
@@ -168,6 +202,56 @@ class CfgGui:
         self.base.cfg_only_valid = state
         self.cfg_basic.set(CfgBasics.SHOW_ONLY_VALID, self.base.cfg_only_valid)
 
+    @flow
+    @Slot(str)
+    def on_log_pol_cmb_chg(self, txt: str):
+        xp('on_log_pol_cmb_chg', txt, **_cf)
+        co_logger.xp_worker.conf_set(policy=txt)
+        self.cfg_basic.set(CfgBasics.LOG_POLICY, txt)
+
+    @flow
+    @Slot(int)
+    def on_log_rot_spn_chg(self, val: int):
+        xp('on_log_rot_spn_chg', val, **_cf)
+        co_logger.xp_worker.conf_set(rotate_size=val * 1024 * 1024)
+        self.cfg_basic.set(CfgBasics.LOG_ROTATE_MB, val)
+
+    @flow
+    @Slot(int)
+    def on_log_keep_spn_chg(self, val: int):
+        xp('on_log_keep_spn_chg', val, **_cf)
+        co_logger.xp_worker.conf_set(rotate_keep=val)
+        self.cfg_basic.set(CfgBasics.LOG_ROTATE_KEEP, val)
+
+    @flow
+    @Slot(int)
+    def on_chk_box_spn_chg(self, state: int):
+        xp('on_chk_box_spn_chg', state, **_cf)
+        span_enable(bool(state))
+
+    @flow
+    def on_btn_clk_spn_show(self):
+        # shown in place of the geometry xml
+        self.cfg_txt_edt.setPlainText(span_table())
+
+    @flow
+    def on_btn_clk_spn_dump(self):
+        pth = str(Path(self.cfg_log_path).with_name('coed_timings.json'))
+        try:
+            span_dump(pth)
+        except OSError as err:
+            # e.g. a log dir that is gone or read only
+            xp('timings dump failed', pth, err, **_cf)
+            self.cfg_txt_edt.setPlainText(f'{span_table()}\n\ndump to {pth} failed: {err}')
+            return
+        xp('timings dumped', pth, **_cf)
+        self.cfg_txt_edt.setPlainText(f'{span_table()}\n\n{pth}')
+
+    @flow
+    def on_btn_clk_spn_reset(self):
+        span_reset()
+        self.cfg_txt_edt.setPlainText(span_table())
+
     @flow
     @Slot(str)
     def on_color_changed(self, cid: str):
@@ -13,21 +13,24 @@
 # *   GNU Library General Public License for more details.                  *
 # *                                                                         *
 # ***************************************************************************
-from operator import attrgetter
-from typing import List, NamedTuple, Tuple, Set
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple, Set
 
 import FreeCAD as App
 import Sketcher
 from PySide2.QtCore import Signal, QObject, Slot
 
 from co_lib.co_base.co_config import CfgTransient
-from co_lib.co_base.co_lookup import Lookup
 from co_lib.co_base.co_observer import observer_event_provider_get
-from . import co_cs
 from .. import co_impl
-from ..co_base.co_cmn import ConType, GeoType, ObjType
+from ..co_base.co_adapter import to_sketcher
+from ..co_base.co_cmn import ConType, GeoType, ObjType, Record
+from ..co_base.co_geo import ConSpec
 from ..co_base.co_flag import Dirty
-from ..co_base.co_logger import flow, xp, xps, _co, _ev
+from ..co_base.co_kernel import DisjointSet, PairTable, point_pairs, bound_get
+from ..co_base.co_logger import flow, xp, xps, _co, _ev, xp_on
+from ..co_base.co_span import span, timed
+from ..co_base.co_spatial import NeighborIndex
 from ..co_tabs.co_xy import GeoId
 
 
@@ -44,16 +47,23 @@ class GeoIdDist(NamedTuple):
         return self.__str__()
 
 
-class CoPoint:
-    def __init__(self, geo: GeoId, pt: App.Vector, construct: bool, extern=False) -> None:
+class CoPoint(Record):
+    __slots__ = ('geo_id', 'x', 'y', 'pt_distance_lst', 'construct', 'extern')
+
+    def __init__(self, geo: GeoId, x: float, y: float, construct: bool, extern=False) -> None:
         self.geo_id: GeoId = geo
-        self.point: App.Vector = pt
+        self.x: float = x
+        self.y: float = y
         self.pt_distance_lst: List[GeoIdDist] = list()
         self.construct: bool = construct
         self.extern: bool = extern
 
+    @property
+    def point(self) -> App.Vector:
+        return App.Vector(self.x, self.y, 0)
+
     def __str__(self) -> str:
-        return f'{self.geo_id} ({self.point.x:5.2f}, {self.point.y:5.2f}, {self.point.z:5.2f}) co {self.construct} ex {self.extern} {self.pt_distance_lst}'
+        return f'{self.geo_id} ({self.x:5.2f}, {self.y:5.2f}, {0:5.2f}) co {self.construct} ex {self.extern} {self.pt_distance_lst}'
 
     def __repr__(self) -> str:
         return self.__str__()
@@ -69,58 +79,9 @@ class CoPoint:
         return res
 
     @flow
-    def cons_filter(self, cs: Set[Tuple[GeoId, GeoId]]) -> List[GeoIdDist]:
-        # find transitive relations
-        cn: List[Set[GeoId]] = list()
-        for x, y in cs:
-            done = False
-            xp('in', x, y, **_co)
-            for j in cn:
-                if (x in j) and (y in j):
-                    xp('skip', **_co)
-                    done = True
-                    break
-                if (x in j) or (y in j):
-                    j.add(x)
-                    j.add(y)
-                    xp('j', j, **_co)
-                    done = True
-                    break
-            if not done:
-                xp('append', x, y, **_co)
-                cn.append({x, y})
-        self._merge_joint_sets(cn)
-        # do filter
-        res = list()
-        for x in self.pt_distance_lst:
-            done = False
-            for y in cn:
-                xp(f'{self.geo_id} {x} cn {y}', **_co)
-                if (self.geo_id in y) and (x.geo_id in y):
-                    xp('dismiss', **_co)
-                    done = True
-                    break  # dismiss
-            if not done:
-                xp('append', x, **_co)
-                res.append(x)
-        return res
-
-    @flow
-    def _merge_joint_sets(self, cn):
-        for x in range(len(cn) - 1):
-            xp(f'in -> x: {x}', **_co)
-            for y in range(x + 1, len(cn)):
-                xp(f'in -> x: {x} y: {y} cn: {cn}', **_co)
-                if y > len(cn) - 1:
-                    xp(f'break x: {x} y: {y}', **_co)
-                    break
-                if not cn[x].isdisjoint(cn[y]):
-                    xp(f'pop x: {x} {cn[x]} y: {y} {cn[y]}', **_co)
-                    cn[x].update(cn[y])
-                    cn.pop(y)
-                    self._merge_joint_sets(cn)
-                else:
-                    xp(f'disjoint x: {x} {cn[x]} y: {y} {cn[y]}', **_co)
+    def cons_filter(self, ds: DisjointSet) -> List[GeoIdDist]:
+        # dismiss candidates already joined, directly or transitive
+        return [x for x in self.pt_distance_lst if not ds.connected(self.geo_id, x.geo_id)]
 
 
 class CoPoints(QObject):
@@ -136,6 +97,14 @@ class CoPoints(QObject):
         self.base: co_impl.CoEd = base
         self.sketch: Sketcher.SketchObject = self.base.sketch
         self.tolerance: float = self.cfg.get(self.cfg.CO_TOLERANCE)
+        self._radius: float = 0.0
+        self._pairs: Optional[PairTable] = None
+        self._tol_sync: bool = False
+        self._tol_value: float = 0.0
+        # row of each point in the distance / tolerance lists, snapshot revision they reflect
+        self._rows: Dict[GeoId, int] = dict()
+        self._rev: int = -1
+        self._index: Optional[NeighborIndex] = None
         self.distances: List[CoPoint] = list()
         self.tolerances: List[CoPoint] = list()
         self.evo = observer_event_provider_get()
@@ -158,7 +127,7 @@ class CoPoints(QObject):
         if not self.__tol_init:
             self.__tol_init = True
             self.tolerances_create()
-        if self.base.flags.has(Dirty.EQ_EDGES):
+        if self.base.flags.has(Dirty.COIN_POINTS):
             self.tolerances_create()
         return self._tolerance_lst
 
@@ -171,8 +140,8 @@ class CoPoints(QObject):
         if not self.__dist_init:
             self.__dist_init = True
             self.distances_create()
-        if self.base.flags.has(Dirty.EQ_EDGES):
-            self.distances_create()
+        if self.base.flags.has(Dirty.COIN_POINTS):
+            self.distances_update()
         return self._distance_lst
 
     @distances.setter
@@ -190,70 +159,154 @@ class CoPoints(QObject):
     @flow
     def distances_create(self):
         self._distance_lst.clear()
-        geo_lst: List[Tuple[int, object]] = [(idx, geo) for idx, geo in enumerate(self.sketch.Geometry)
-                                             if geo.TypeId == GeoType.LINE_SEGMENT or
-                                             geo.TypeId == GeoType.ARC_OF_CIRCLE]
-        xp(geo_lst, **_co)
-        pt_lst = [CoPoint(GeoId(idx, 1), App.Vector(line.StartPoint), self.sketch.getConstruction(idx), idx <= -3)
-                  for idx, line in geo_lst]
-        pt_lst += [CoPoint(GeoId(idx, 2), App.Vector(line.EndPoint), self.sketch.getConstruction(idx), idx <= -3)
-                   for idx, line in geo_lst]
-        xp(pt_lst, **_co)
-        lo = Lookup(self.sketch)
-        try:
-            pt_lst += [CoPoint(geo_id, geo.StartPoint, True, True)
-                       for geo_id, geo in lo.extern_points('V')
-                       if geo_id.typ == 1 and geo.TypeId != GeoType.CIRCLE]
-            pt_lst += [CoPoint(geo_id, geo.EndPoint, True, True)
-                       for geo_id, geo in lo.extern_points('V')
-                       if geo_id.typ == 2 and geo.TypeId != GeoType.CIRCLE]
-        except AttributeError as err:
-            # circles don't have a StartPoint
-            xp(err)
-        # pt_lst += [CoPoint(geo_id, pt, True, True) for geo_id, pt in lo.extern_points()]
+        snap = self.base.snapshot
+        rows = snap.rows_of(GeoType.LINE_SEGMENT, GeoType.ARC_OF_CIRCLE, extern=False)
+        xp(rows, **_co)
+        pt_lst = [CoPoint(GeoId(snap.geo_idx[r], 1), snap.sx[r], snap.sy[r], bool(snap.construct[r]), False)
+                  for r in rows]
+        pt_lst += [CoPoint(GeoId(snap.geo_idx[r], 2), snap.ex[r], snap.ey[r], bool(snap.construct[r]), False)
+                   for r in rows]
+        pt_lst += [CoPoint(GeoId(idx, typ), x, y, True, True)
+                   for idx, typ, x, y in snap.ext_vertices if typ == 1]
+        pt_lst += [CoPoint(GeoId(idx, typ), x, y, True, True)
+                   for idx, typ, x, y in snap.ext_vertices if typ == 2]
         xp(pt_lst, **_co)
-
-        pt_len = len(pt_lst)
-        for y in range(pt_len):
-            pt_y: CoPoint = pt_lst[y]
-            for x in range(pt_len):
-                if x == y:
-                    continue
+        # only pairs within the search radius are kept
+        self._radius = bound_get(self.tolerance)
+        self._pairs = point_pairs(array('d', [pt.x for pt in pt_lst]),
+                                  array('d', [pt.y for pt in pt_lst]), self._radius)
+        for r, pt_y in enumerate(pt_lst):
+            for x, dist in self._pairs.row(r):
                 pt_x: CoPoint = pt_lst[x]
-                if x < y:
-                    dist = self._distance_lst[x].pt_distance_lst[y - 1].distance
-                    i = GeoId(pt_x.geo_id.idx, pt_x.geo_id.typ)
-                    n = GeoIdDist(i, dist, pt_x.construct, pt_x.extern)
-                    pt_y.pt_distance_lst.append(n)
-                else:
-                    pt_x: CoPoint = pt_lst[x]
-                    dist = pt_y.point.distanceToPoint(pt_x.point)
-                    g_dist = GeoIdDist(pt_x.geo_id, dist, pt_x.construct, pt_x.extern)
-                    pt_y.pt_distance_lst.append(g_dist)
+                pt_y.pt_distance_lst.append(GeoIdDist(pt_x.geo_id, dist, pt_x.construct, pt_x.extern))
             self._distance_lst.append(pt_y)
-        for pt in self._distance_lst:
-            pt.pt_distance_lst.sort(key=attrgetter('distance'))
+        self._rows = {pt.geo_id: r for r, pt in enumerate(pt_lst)}
+        self._rev = snap.rev
+        # neighbor index is loaded from the pairs on the first incremental update
+        self._index = None
+        self._tol_sync = False
+        self.base.flags.reset(Dirty.COIN_POINTS)
         self.log_diff()
 
     @flow
+    def distances_update(self):
+        # apply the geometry changed since the last build, rebuild when unknown or too large
+        snap = self.base.snapshot
+        changed = self.base.geo_changes(self._rev)
+        if (changed is None) or (self.tolerance > self._radius) or (len(changed) * 4 > len(snap)):
+            self.distances_create()
+            return
+        if self._index is None:
+            self.__index_load()
+        ext = dict()
+        if any(idx < 0 for idx in changed):
+            ext = {GeoId(idx, typ): (x, y) for idx, typ, x, y in snap.ext_vertices}
+        touched = set()
+        for idx in changed:
+            r = snap.rows.get(idx)
+            for typ in (1, 2):
+                key = GeoId(idx, typ)
+                if idx < 0:
+                    pos = ext.get(key)
+                    construct = True
+                elif (r is not None) and (snap.type_id[r] in (GeoType.LINE_SEGMENT, GeoType.ARC_OF_CIRCLE)):
+                    pos = (snap.sx[r], snap.sy[r]) if typ == 1 else (snap.ex[r], snap.ey[r])
+                    construct = bool(snap.construct[r])
+                else:
+                    pos = None
+                    construct = False
+                if pos is None:
+                    if key in self._rows:
+                        touched |= self._index.remove(key)
+                        self.__row_remove(key)
+                    continue
+                if key not in self._rows:
+                    self.__row_append(CoPoint(key, pos[0], pos[1], construct, idx < 0))
+                pt = self._distance_lst[self._rows[key]]
+                if (pt.construct != construct) or (pt.extern != (idx < 0)):
+                    # the neighbors carry the flags of the point in their distance lists
+                    touched.update(k for k, _ in self._index.neighbors(key))
+                pt.x, pt.y = pos
+                pt.construct = construct
+                pt.extern = idx < 0
+                touched |= self._index.insert(key, pos[0], pos[1])
+                touched.add(key)
+        # rows no longer match the pair table
+        self._pairs = None
+        for key in touched:
+            r = self._rows.get(key)
+            if r is None:
+                continue
+            pt = self._distance_lst[r]
+            pt.pt_distance_lst = [GeoIdDist(k, d, self._distance_lst[self._rows[k]].construct,
+                                            self._distance_lst[self._rows[k]].extern)
+                                  for k, d in self._index.neighbors(key)]
+            if self._tol_sync:
+                # a new view, a moved point carries a new position
+                self._tolerance_lst[r] = pt.view(pt_distance_lst=self.__tol_slice(r))
+        xp('distances_update', len(changed), 'changed', len(touched), 'touched', **_co)
+        self._rev = snap.rev
+        self.base.flags.reset(Dirty.COIN_POINTS)
+
+    def __index_load(self):
+        lst = self._distance_lst
+        self._index = NeighborIndex(self._radius)
+        self._index.load([pt.geo_id for pt in lst], [pt.x for pt in lst], [pt.y for pt in lst],
+                         ([(self._rows[x.geo_id], x.distance) for x in pt.pt_distance_lst] for pt in lst))
+
+    def __row_append(self, pt: CoPoint):
+        self._rows[pt.geo_id] = len(self._distance_lst)
+        self._distance_lst.append(pt)
+        if self._tol_sync:
+            self._tolerance_lst.append(pt.view(pt_distance_lst=[]))
+
+    def __row_remove(self, key: GeoId):
+        # the last row takes the place of the removed one
+        r = self._rows.pop(key)
+        for lst in (self._distance_lst, self._tolerance_lst) if self._tol_sync else (self._distance_lst,):
+            last = lst.pop()
+            if r < len(lst):
+                lst[r] = last
+        if r < len(self._distance_lst):
+            self._rows[self._distance_lst[r].geo_id] = r
+
+    @flow
+    @timed('co.tolerances')
     def tolerances_create(self) -> None:
-        self._tolerance_lst.clear()
-        for item in self.distances:
-            a = CoPoint(GeoId(item.geo_id.idx, item.geo_id.typ), item.point, item.construct, item.extern)
-            a.pt_distance_lst = item.distances_get(self.tolerance)
-            self._tolerance_lst.append(a)
+        dist_lst = self.distances
+        if self.tolerance > self._radius:
+            # candidates were collected for a smaller radius
+            self.distances_create()
+        if not self._tol_sync:
+            self._tolerance_lst.clear()
+            # views copy point, flags and id of the distance rows
+            for r, item in enumerate(dist_lst):
+                self._tolerance_lst.append(item.view(pt_distance_lst=self.__tol_slice(r)))
+        elif self._tol_value != self.tolerance:
+            if self._pairs is None:
+                rows = range(len(dist_lst))
+            else:
+                # same candidates, only rows with a distance between old and new tolerance change
+                lo, hi = sorted((self._tol_value, self.tolerance))
+                rows = self._pairs.rows_between(lo, hi)
+            for r in rows:
+                self._tolerance_lst[r].pt_distance_lst = self.__tol_slice(r)
+        self._tol_sync = True
+        self._tol_value = self.tolerance
         self.log_tol()
 
+    def __tol_slice(self, r: int) -> List[GeoIdDist]:
+        item = self._distance_lst[r]
+        if self._pairs is None:
+            return item.distances_get(self.tolerance)
+        return item.pt_distance_lst[:self._pairs.count(r, self.tolerance)]
+
     @flow
-    def cons_get(self) -> Set[Tuple[GeoId, GeoId]]:
-        co_list: List[co_cs.Constraint] = self.base.cs.constraints
-        col: Set[Tuple[GeoId, GeoId]] = {
-            (GeoId(x.first, x.first_pos), GeoId(x.second, x.second_pos))
-            for x in co_list
-            if ConType(x.type_id) == ConType.COINCIDENT}
-        return col
+    def cons_get(self) -> DisjointSet:
+        return self.base.cs.joints(ConType.COINCIDENT)
 
     @flow
+    @timed('co.create')
     def create(self, co_pt_list: List[CoPoint]):
         doc: App.Document = App.ActiveDocument
         xp('pt_idx_list', co_pt_list, **_co)
@@ -269,30 +322,36 @@ class CoPoints(QObject):
                     xp('skip redundant', dist.geo_id, pt.geo_id, **_co)
                     continue
                 s.add((pt.geo_id, dist.geo_id))
-                con_list.append(Sketcher.Constraint('Coincident', pt.geo_id.idx, pt.geo_id.typ, dist.geo_id.idx,
-                                                    dist.geo_id.typ))
+                con_list.append(ConSpec('Coincident', (pt.geo_id.idx, pt.geo_id.typ, dist.geo_id.idx,
+                                                       dist.geo_id.typ)))
                 xp('created.emit', pt.geo_id, dist.geo_id, **_ev)
                 self.created.emit((pt.geo_id.idx, pt.geo_id.typ), (dist.geo_id.idx, dist.geo_id.typ))
-        doc.openTransaction('coed: Coincident constraint')
-        self.sketch.addConstraint(con_list)
-        self.sketch.solve()
-        doc.commitTransaction()
-        self.base.flags.all()
+        with span('co.transaction'):
+            doc.openTransaction('coed: Coincident constraint')
+            self.sketch.addConstraint(to_sketcher(con_list))
+            self.sketch.solve()
+            doc.commitTransaction()
         sk: Sketcher.SketchObject = self.sketch
         sk.addProperty('App::PropertyString', 'coed')
         sk.coed = 'coin_recompute'
-        doc.openTransaction('coed: obj recompute')
-        sk.recompute()
-        doc.commitTransaction()
+        with span('co.recompute'):
+            doc.openTransaction('coed: obj recompute')
+            sk.recompute()
+            doc.commitTransaction()
+        self.base.changes_classify()
         xp('creation_done.emit', **_ev)
         self.creation_done.emit()
 
     def log_diff(self):
+        if not xp_on(_co):
+            return
         xps('difference_lst', **_co)
         for item in self._distance_lst:
             xp(item, **_co)
 
     def log_tol(self):
+        if not xp_on(_co):
+            return
         xps(f'tolerance {self._tolerance}', **_co)
         for item in self._tolerance_lst:
             xp(item, **_co)
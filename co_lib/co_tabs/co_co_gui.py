@@ -14,7 +14,7 @@
 # *                                                                         *
 # ***************************************************************************
 from threading import Lock
-from typing import List, Set, Tuple, Dict
+from typing import List, Tuple, Dict
 
 import FreeCAD as App
 import FreeCADGui as Gui
@@ -27,7 +27,9 @@ from .co_co import CoPoints, CoPoint, GeoId, GeoIdDist
 from .. import co_impl, co_gui
 from ..co_base.co_cmn import GeoPt, fmt_vec, pt_typ_str, wait_cursor, TableLabel, ColorTableItem, ObjType, block_signals
 from ..co_base.co_config import CfgTransient
-from ..co_base.co_logger import flow, xp, _co, _ev, xps, Profile
+from ..co_base.co_kernel import DisjointSet
+from ..co_base.co_logger import flow, xp, _co, _ev, xps, xp_on
+from ..co_base.co_span import span, timed
 from ..co_base.co_lookup import Lookup
 from ..co_base.co_observer import observer_block, observer_event_provider_get
 
@@ -125,7 +127,7 @@ class CoGui:
     @flow
     def on_co_tol_chg(self, val):
         self.co_dbl_sp_box.setEnabled(False)
-        with Profile(enable=False):
+        with span('co.tolerance_change'):
             self.co.tolerance = val
             self.update_table()
         self.co_dbl_sp_box.setEnabled(True)
@@ -143,10 +145,11 @@ class CoGui:
     @flow
     def task_up(self, co):
         pt_list: List[CoPoint] = co.tolerances
-        cs: Set[Tuple[GeoId, GeoId]] = co.cons_get()
+        cs: DisjointSet = co.cons_get()
         return pt_list, cs
 
     @flow(short=True)
+    @timed('co.table')
     def on_result_up(self, result, id_lst: List[GeoId]):
         self.co_btn_create.setDisabled(True)
         self.co_tbl_wid.setUpdatesEnabled(False)
@@ -157,11 +160,9 @@ class CoGui:
         res_lst: List[CoPoint] = list()
         for pt in pt_list:
             pt: CoPoint
-            p = CoPoint(pt.geo_id, pt.point, pt.construct, pt.extern)
-            p.pt_distance_lst = pt.cons_filter(cs)
-            res_lst.append(p)
+            res_lst.append(pt.view(pt_distance_lst=pt.cons_filter(cs)))
         self.log_filter(res_lst)
-        lo = Lookup(self.sketch)
+        lo = self.impl.lookup
         with block_signals(self.co_tbl_wid):
             for idx, pt in enumerate(res_lst):
                 if self.base.cfg_only_valid and (len(pt.pt_distance_lst) == 0):
@@ -308,6 +309,8 @@ class CoGui:
         return res
 
     def log_filter(self, obj):
+        if not xp_on(_co):
+            return
         xp(f'filter list', **_co)
         for item in obj:
             xp(item, **_co)
@@ -14,46 +14,60 @@
 # *                                                                         *
 # ***************************************************************************
 import pathlib
-from typing import List, Dict, Union
+from bisect import bisect_left
+from itertools import product
+from typing import List, Dict, Union, NamedTuple, Optional, Set, Iterable
 
 import FreeCAD as App
 import Sketcher
 from PySide2.QtCore import Signal, QObject, Slot
 
 from .. import co_impl
-from ..co_base.co_cmn import pt_typ_str, ConType, ObjType
+from ..co_base.co_cmn import pt_typ_str, ConType, ObjType, GeoId
 from ..co_base.co_config import CfgBase
 from ..co_base.co_flag import Cs, Dirty
+from ..co_base.co_kernel import DisjointSet
 from ..co_base.co_logger import xp, _cs, flow, _ev, xps
+from ..co_base.co_span import span, timed
 from ..co_base.co_observer import observer_block, observer_event_provider_get
 
 
 class Constraint:
+    __slots__ = ('cs_idx', 'type_id', 'sub_type', 'first', 'first_pos', 'second', 'second_pos', 'third',
+                 'third_pos', 'value', 'fmt', 'ico_no', 'ico_alt_no', 'driving', 'active', 'virtual',
+                 'pure_extern', 'name', 'expression', 'datum', 'sig')
 
-    def __init__(self, cs_idx: int, type_id: str, **kwargs):
+    FMT = "{0} : {1} : {2} : {3} : {4} : {5} : {6} : {7}"
+
+    def __init__(self, cs_idx: int, type_id: str, sub_type: Cs = Cs(0),
+                 first: int = -2000, first_pos: int = 0, second: int = -2000, second_pos: int = 0,
+                 third: int = -2000, third_pos: int = 0, value: float = -0, fmt: str = FMT,
+                 ico_no: str = '', ico_alt_no: str = ''):
         self.cs_idx: int = cs_idx
         self.type_id: str = type_id
-        self.sub_type: Cs = Cs(0)
-        self.first: int = kwargs.get('FIRST', -2000)
+        self.sub_type: Cs = sub_type
+        self.first: int = first
         tmp = self.first < 0
-        self.first_pos: int = kwargs.get('FIRST_POS', 0)
-        self.second: int = kwargs.get('SECOND', -2000)
+        self.first_pos: int = first_pos
+        self.second: int = second
         tmp = tmp if self.second == -2000 else tmp and self.second < 0
-        self.second_pos: int = kwargs.get('SECOND_POS', 0)
-        self.third: int = kwargs.get('THIRD', -2000)
+        self.second_pos: int = second_pos
+        self.third: int = third
         tmp = tmp if self.third == -2000 else tmp and self.third < 0
-        self.third_pos: int = kwargs.get('THIRD_POS', 0)
-        self.value: float = kwargs.get('VALUE', -0)
-        self.fmt = kwargs.get('FMT', "{0} : {1} : {2} : {3} : {4} : {5} : {6} : {7}")
+        self.third_pos: int = third_pos
+        self.value: float = value
+        self.fmt = fmt
         self.driving: bool = True
         self.active: bool = True
         self.virtual: bool = False
         self.pure_extern = tmp
-        self.ico_no = ''
-        self.ico_alt_no = ''
+        self.ico_no = ico_no
+        self.ico_alt_no = ico_alt_no
         self.name = ''
         self.expression = ''
         self.datum = ''
+        # what the record was decoded from
+        self.sig: tuple = ()
 
     def __str__(self):
         return self.fmt.format(self.first, pt_typ_str[self.first_pos],  # (0),(1)
@@ -68,10 +82,141 @@ class Constraint:
                                self.value, self.cs_idx)  # (6),(7)
 
 
+class ConsDecoder:
+    # sketcher constraint -> record, by a table compiled once from the rules below,
+    # keyed by type and the position pattern of the constraint
+
+    # pattern tests, in the order of the key
+    __TESTS = ('first_pos_none', 'second_none', 'second_pos_none', 'third_none', 'third_pos_none')
+
+    __FFSS = Cs.F | Cs.FP | Cs.S | Cs.SP
+    # per type the first rule whose test holds wins, None always holds, no rule holding is an error
+    __RULES = {
+        ConType.COINCIDENT: (('third_none', __FFSS, "{0}.{1} {2}.{3}"),),
+        ConType.HORIZONTAL: (('second_none', Cs.F, "{0}"),
+                             ('third_none', __FFSS, "{0}.{1} {2}.{3}")),
+        ConType.PARALLEL: (('third_none', Cs.F | Cs.S, "{0} {2}"),),
+        ConType.TANGENT: (('first_pos_none', Cs.F | Cs.S, "{0} {2}"),  # e.g. edge on edge
+                          ('second_pos_none', Cs.F | Cs.FP | Cs.S, "{0}.{1} {2}"),  # e.g. vertex on edge
+                          ('third_none', __FFSS, "{0}.{1} {2}.{3}")),  # e.g. vertex on vertex
+        ConType.DISTANCE: (('first_pos_none', Cs.F | Cs.V, "{0} v: {6:.2f}"),
+                           ('second_pos_none', Cs.F | Cs.FP | Cs.S | Cs.V, "{0}.{1} {2} v: {6:.2f}"),
+                           ('third_none', __FFSS | Cs.V, "{0}.{1} {2}.{3} v: {6:.2f}")),
+        ConType.DISTANCEX: (('first_pos_none', Cs.F | Cs.V, "{0} v: {6:.2f}"),
+                            ('second_none', Cs.F | Cs.FP | Cs.V, "{0}.{1} v: {6:.2f}"),
+                            ('third_none', __FFSS | Cs.V, "{0}.{1} {2}.{3} v: {6:.2f}")),
+        ConType.ANGLE: (('first_pos_none', Cs.F | Cs.V, "{0} v: {6:.2f}"),
+                        ('second_pos_none', Cs.F | Cs.S | Cs.V, "{0} {2} v: {6:.2f}"),
+                        ('third_none', __FFSS | Cs.V, "{0}.{1} {2}.{3} v: {6:.2f}")),
+        ConType.RADIUS: (('first_pos_none', Cs.F | Cs.V, "{0} v: {6:.2f}"),),
+        ConType.POINTONOBJECT: (('second_pos_none', Cs.F | Cs.FP | Cs.S, "{0}.{1} {2}"),),
+        ConType.SYMMETRIC: (('third_pos_none', __FFSS | Cs.T, "{0}.{1} {2}.{3} {4}"),
+                            (None, __FFSS | Cs.T | Cs.TP, "{0}.{1} {2}.{3} {4}.{5}")),
+        ConType.INTERNALALIGNMENT: (('first_pos_none', Cs.F | Cs.S, "{0}) {2}"),
+                                    ('second_pos_none', Cs.F | Cs.FP | Cs.S, "{0}.{1} {2}"),
+                                    ('third_none', __FFSS, "{0}.{1} {2}.{3}")),
+        ConType.SNELLSLAW: (('third_pos_none', __FFSS | Cs.T, "{0}.{1} {2}.{3} {4}"),
+                            (None, __FFSS | Cs.T | Cs.TP, "{0}.{1} {2}.{3} {4}.{5}")),
+        ConType.BLOCK: ((None, Cs.F, "{0}"),),
+    }
+    # types decoded like another one
+    __SAME = {
+        ConType.VERTICAL: ConType.HORIZONTAL,
+        ConType.EQUAL: ConType.PARALLEL,
+        ConType.PERPENDICULAR: ConType.TANGENT,
+        ConType.DISTANCEY: ConType.DISTANCEX,
+        ConType.DIAMETER: ConType.RADIUS,
+        ConType.WEIGHT: ConType.RADIUS,
+    }
+    __ICONS = {
+        ConType.COINCIDENT: ('PointOnPoint', None),
+        ConType.HORIZONTAL: ('Horizontal', None),
+        ConType.VERTICAL: ('Vertical', None),
+        ConType.PARALLEL: ('Parallel', None),
+        ConType.EQUAL: ('EqualLength', None),
+        ConType.TANGENT: ('Tangent', None),
+        ConType.PERPENDICULAR: ('Perpendicular', None),
+        ConType.DISTANCE: ('Length', 'Length_Driven'),
+        ConType.DISTANCEX: ('HorizontalDistance', 'HorizontalDistance_Driven'),
+        ConType.DISTANCEY: ('VerticalDistance', 'VerticalDistance_Driven'),
+        ConType.ANGLE: ('InternalAngle', 'InternalAngle_Driven'),
+        ConType.RADIUS: ('Radius', 'Radius_Driven'),
+        ConType.WEIGHT: ('Radius', 'Radius_Driven'),
+        ConType.DIAMETER: ('Diameter', 'Diameter_Driven'),
+        ConType.POINTONOBJECT: ('PointOnObject', None),
+        ConType.SYMMETRIC: ('Symmetric', None),
+        ConType.INTERNALALIGNMENT: ('InternalAlignment', None),
+        ConType.SNELLSLAW: ('SnellsLaw', 'SnellsLaw_Driven'),
+        ConType.BLOCK: ('Block', None),
+    }
+    __FIELDS = (Cs.F, Cs.FP, Cs.S, Cs.SP, Cs.T, Cs.TP, Cs.V)
+    __table: Dict[tuple, Optional[tuple]] = dict()
+
+    @staticmethod
+    def table() -> Dict[tuple, Optional[tuple]]:
+        # (type_id, pattern) -> (type_id, sub_type, kept fields, fmt, icon, driven icon), None if unexpected
+        if not ConsDecoder.__table:
+            for ct, ico in ConsDecoder.__ICONS.items():
+                rules = ConsDecoder.__RULES[ConsDecoder.__SAME.get(ct, ct)]
+                ico_no = Constraints.ico_path(ico[0])
+                ico_alt_no = Constraints.ico_path(ico[1]) if ico[1] else ''
+                for pattern in product((False, True), repeat=len(ConsDecoder.__TESTS)):
+                    tests = dict(zip(ConsDecoder.__TESTS, pattern))
+                    ent = None
+                    for test, cs, fmt in rules:
+                        if (test is None) or tests[test]:
+                            keep = tuple(x in cs for x in ConsDecoder.__FIELDS)
+                            ent = (ct.value, cs, keep, fmt, ico_no, ico_alt_no)
+                            break
+                    ConsDecoder.__table[(ct.value, pattern)] = ent
+        return ConsDecoder.__table
+
+    @staticmethod
+    def decode(idx: int, item: Sketcher.Constraint) -> Optional[Constraint]:
+        pattern = (item.FirstPos == 0, item.Second == -2000, item.SecondPos == 0, item.Third == -2000,
+                   item.ThirdPos == 0)
+        key = (item.Type, pattern)
+        table = ConsDecoder.table()
+        if key not in table:
+            # raises on unknown types, known ones are just not listed
+            ConType(item.Type)
+            return None
+        ent = table[key]
+        if ent is None:
+            xp('unexpected case:', item.Type, **_cs)
+            raise ValueError(item)
+        type_id, cs, keep, fmt, ico_no, ico_alt_no = ent
+        f, fp, s, sp, t, tp, v = keep
+        return Constraint(idx, type_id, cs,
+                          item.First if f else -2000, item.FirstPos if fp else 0,
+                          item.Second if s else -2000, item.SecondPos if sp else 0,
+                          item.Third if t else -2000, item.ThirdPos if tp else 0,
+                          item.Value if v else -0, fmt, ico_no, ico_alt_no)
+
+
+class CsChange(NamedTuple):
+    # one queued edit of a constraint, kind is one of the Constraints.BATCH_* names,
+    # sig is the signature of the constraint at queue time
+    cs_idx: int
+    kind: str
+    val: Union[str, bool]
+    sig: tuple = ()
+
+
 class Constraints(QObject):
-    deleted = Signal(int)
+    deleted = Signal(object)
     deletion_done = Signal()
     update_done = Signal()
+    batch_done = Signal(object)
+
+    BATCH_NAME = 'name'
+    BATCH_DRIVING = 'driving'
+    BATCH_ACTIVE = 'active'
+    BATCH_VIRTUAL = 'virtual'
+    BATCH_DATUM = 'datum'
+    BATCH_EXPRESSION = 'expression'
+    # names first as expressions address constraints by name, driving before values
+    __BATCH_ORDER = [BATCH_NAME, BATCH_DRIVING, BATCH_ACTIVE, BATCH_VIRTUAL, BATCH_DATUM, BATCH_EXPRESSION]
 
     def __init__(self, base):
         super(Constraints, self).__init__()
@@ -80,6 +225,10 @@ class Constraints(QObject):
         self.evo = observer_event_provider_get()
         self.evo.in_edit.connect(self.on_in_edit)
         self.__constraints: List[Constraint] = list()
+        self.__by_idx: Dict[int, Constraint] = dict()
+        self.__by_geo: Optional[Dict[int, Set[int]]] = None
+        self.__datums: Dict[tuple, Union[str, App.Units.Quantity]] = dict()
+        self.__joints: Dict[ConType, DisjointSet] = dict()
         self.tol = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['krankenwagen']))
 
     @property
@@ -88,6 +237,52 @@ class Constraints(QObject):
             self.constraints_update()
         return self.__constraints
 
+    def by_idx(self) -> Dict[int, Constraint]:
+        # records keyed by cs_idx, unsupported types are not listed
+        co_list = self.constraints
+        if len(self.__by_idx) != len(co_list):
+            self.__by_idx = {x.cs_idx: x for x in co_list}
+        return self.__by_idx
+
+    def by_geo(self) -> Dict[int, Set[int]]:
+        # cs_idx of the records referring to a geometry, keyed by geo_idx
+        co_list = self.constraints
+        if self.__by_geo is None:
+            res: Dict[int, Set[int]] = dict()
+            for x in co_list:
+                for geo in (x.first, x.second, x.third):
+                    if geo != -2000:
+                        res.setdefault(geo, set()).add(x.cs_idx)
+            self.__by_geo = res
+        return self.__by_geo
+
+    def geo_constraints(self, geo_lst: Iterable[int]) -> Set[int]:
+        by_geo = self.by_geo()
+        res: Set[int] = set()
+        for geo in geo_lst:
+            res.update(by_geo.get(geo, ()))
+        return res
+
+    # connected components per type, keys like the tabs use them
+    __JOINT_KEYS = {
+        ConType.COINCIDENT: lambda x: (GeoId(x.first, x.first_pos), GeoId(x.second, x.second_pos)),
+        ConType.EQUAL: lambda x: (x.first, x.second),
+        ConType.PARALLEL: lambda x: (x.first, x.second),
+    }
+
+    @flow
+    def joints(self, ct: ConType) -> DisjointSet:
+        co_list = self.constraints
+        if ct not in self.__joints:
+            key = self.__JOINT_KEYS[ct]
+            ds = DisjointSet()
+            for x in co_list:
+                if x.type_id == ct.value:
+                    ds.union(*key(x))
+            xp('joints', ct.name, ds, **_cs)
+            self.__joints[ct] = ds
+        return self.__joints[ct]
+
     @flow
     @Slot(object)
     def on_in_edit(self, obj):
@@ -151,315 +346,219 @@ class Constraints(QObject):
     }
 
     @flow
+    @timed('cs.decode')
     def constraints_update(self):
-        self.__constraints.clear()
+        self.__by_idx = dict()
+        self.__by_geo = None
+        self.__joints.clear()
         # noinspection PyUnresolvedReferences
         co_list: List[Sketcher.Constraint] = self.sketch.Constraints
         # [('Constraints[6]', '2 * 4'), ('.Constraints.test', '2 * 4.5')]
         # >> > txt = "h3110 23 cat 444.4 rabbit 11 2 dog"
         # >> > [int(s) for s in txt.split() if s.isdigit()]
         # [23, 11, 2]
-        exp_list = self.sketch.ExpressionEngine
-        d_exp: Dict[Union[str, int], str] = dict()
-        for idx_, exp in exp_list:
-            idx_: str
-            exp: str
-            if idx_.startswith('Constraints['):
-                i = int(''.join(filter(str.isdigit, idx_)))
-                d_exp[i] = exp
-            else:
-                i = idx_.rfind('.')
-                s = idx_[i + 1:]
-                d_exp[s] = exp
+        d_exp = self.__expressions()
 
         xp('App.ActiveDocument.ActiveObject', id(App.ActiveDocument.ActiveObject), 'self.sketch',  id(self.sketch), **_cs)
         xp('co_lst', co_list, **_cs)
+        # records of the last update by signature, records of equal signature are interchangeable
+        old: Dict[tuple, List[Constraint]] = dict()
+        for con in self.__constraints:
+            old.setdefault(con.sig, list()).append(con)
+        res: List[Constraint] = list()
+        datums: Dict[tuple, Union[str, App.Units.Quantity]] = dict()
+        made = 0
         for idx, item in enumerate(co_list):
-            ct: ConType = ConType(item.Type)
-            xp('ConType', ct.name, ct.value, **_cs)
-            if ct == ConType.COINCIDENT:
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2
-                if item.Third == -2000:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['PointOnPoint']))
-
-            elif ct == ConType.HORIZONTAL or ct == ConType.VERTICAL:
-                # ConstraintType, GeoIndex
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2
-                if item.Second == -2000:
-                    cs: Cs = Cs.F
-                    kwargs = self.__get_kwargs(cs, item, "{0}")
-                elif item.Third == -2000:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                no = 'Vertical' if ct == ConType.VERTICAL else 'Horizontal'
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico[no]))
-
-            elif ct == ConType.PARALLEL or ct == ConType.EQUAL:
-                # ConstraintType, GeoIndex1, GeoIndex2
-                if item.Third == -2000:
-                    cs: Cs = Cs.F | Cs.S
-                    kwargs = self.__get_kwargs(cs, item, "{0} {2}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                no = 'Parallel' if ct == ConType.PARALLEL else 'EqualLength'
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico[no]))
-
-            elif ct == ConType.TANGENT or ct == ConType.PERPENDICULAR:
-                # ConstraintType, GeoIndex1, GeoIndex2
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2
-                if item.FirstPos == 0:  # e.g. edge on edge
-                    cs: Cs = Cs.F | Cs.S
-                    kwargs = self.__get_kwargs(cs, item, "{0} {2}")
-                elif item.SecondPos == 0:  # e.g. vertex on edge
-                    cs: Cs = Cs.F | Cs.FP | Cs.S
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}")
-                elif item.Third == -2000:  # e.g. vertex on vertex
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                no = 'Tangent' if ct == ConType.TANGENT else 'Perpendicular'
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico[no]))
-
-            elif ct == ConType.DISTANCE:
-                # ConstraintType, GeoIndex, Value
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, Value
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2, Value
-                if item.FirstPos == 0:
-                    cs: Cs = Cs.F | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0} v: {6:.2f}")
-                elif item.SecondPos == 0:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2} v: {6:.2f}")
-                elif item.Third == -2000:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3} v: {6:.2f}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['Length']))
-                con.ico_alt_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['Length_Driven']))
-
-            elif ct == ConType.DISTANCEX or ct == ConType.DISTANCEY:
-                if item.FirstPos == 0:
-                    cs: Cs = Cs.F | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0} v: {6:.2f}")
-                elif item.Second == -2000:
-                    cs: Cs = Cs.F | Cs.FP | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} v: {6:.2f}")
-                elif item.Third == -2000:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3} v: {6:.2f}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                if ct == ConType.DISTANCEX:
-                    con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['HorizontalDistance']))
-                    con.ico_alt_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['HorizontalDistance_Driven']))
-                else:
-                    con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['VerticalDistance']))
-                    con.ico_alt_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['VerticalDistance_Driven']))
-
-            elif ct == ConType.ANGLE:
-                # ConstraintType, GeoIndex, Value
-                # ConstraintType, GeoIndex1, GeoIndex2, Value
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2, Value
-                if item.FirstPos == 0:
-                    cs: Cs = Cs.F | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0} v: {6:.2f}")
-                elif item.SecondPos == 0:
-                    cs: Cs = Cs.F | Cs.S | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0} {2} v: {6:.2f}")
-                elif item.Third == -2000:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3} v: {6:.2f}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['InternalAngle']))
-                con.ico_alt_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['InternalAngle_Driven']))
-
-            elif ct == ConType.RADIUS or ct == ConType.DIAMETER or ct == ConType.WEIGHT:
-                # ConstraintType, GeoIndex, Value
-                if item.FirstPos == 0:
-                    cs: Cs = Cs.F | Cs.V
-                    kwargs = self.__get_kwargs(cs, item, "{0} v: {6:.2f}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                if ct == ConType.RADIUS or ct == ConType.WEIGHT:
-                    con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['Radius']))
-                    con.ico_alt_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['Radius_Driven']))
-                if ct == ConType.DIAMETER:
-                    con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['Diameter']))
-                    con.ico_alt_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['Diameter_Driven']))
-
-            elif ct == ConType.POINTONOBJECT:
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2
-                if item.SecondPos == 0:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['PointOnObject']))
-
-            elif ct == ConType.SYMMETRIC:
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2, GeoIndex3
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2, GeoIndex3, PosIndex3
-                if item.ThirdPos == 0:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP | Cs.T
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3} {4}")
-                else:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP | Cs.T | Cs.ST
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3} {4}.{5}")
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['Symmetric']))
-
-            elif ct == ConType.INTERNALALIGNMENT:
-                # ConstraintType, GeoIndex1, GeoIndex2
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2
-                if item.FirstPos == 0:
-                    cs: Cs = Cs.F | Cs.S
-                    kwargs = self.__get_kwargs(cs, item, "{0}) {2}")
-                elif item.SecondPos == 0:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}")
-                elif item.Third == -2000:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3}")
-                else:
-                    xp('unexpected case:', ct, **_cs)
-                    raise ValueError(item)
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['InternalAlignment']))
-
-            elif ct == ConType.SNELLSLAW:
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2, GeoIndex3 ????
-                # ConstraintType, GeoIndex1, PosIndex1, GeoIndex2, PosIndex2, GeoIndex3, PosIndex3
-                if item.ThirdPos == 0:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP | Cs.T
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3} {4}")
-                else:
-                    cs: Cs = Cs.F | Cs.FP | Cs.S | Cs.SP | Cs.T | Cs.TP
-                    kwargs = self.__get_kwargs(cs, item, "{0}.{1} {2}.{3} {4}.{5}")
-
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['SnellsLaw']))
-                con.ico_alt_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['SnellsLaw_Driven']))
-
-            elif ct == ConType.BLOCK:
-                # ConstraintType, GeoIndex
-                cs: Cs = Cs.F
-                kwargs = self.__get_kwargs(cs, item, "{0}")
-                con = Constraint(idx, ct.value, **kwargs)
-                con.sub_type = cs
-                con.ico_no = str(pathlib.Path(CfgBase.BASE_DIR, self.ico['Block']))
+            sig = self.__sig(item)
+            lst = old.get(sig)
+            if lst and (sig in self.__datums):
+                con = lst.pop()
+                con.cs_idx = idx
+                datum = self.__datums[sig]
             else:
-                continue
+                con = ConsDecoder.decode(idx, item)
+                if con is None:
+                    continue
+                made += 1
+                con.sig = sig
+                datum = self.sketch.getDatum(idx) if Cs.V in con.sub_type else ''
+            datums[sig] = datum
+            # flags and names are no part of the signature, always taken over
             con.driving = item.Driving
             con.active = item.IsActive
             con.virtual = item.InVirtualSpace
             con.name = item.Name
-            con.datum = self.sketch.getDatum(con.cs_idx) if Cs.V in con.sub_type else ''
+            con.datum = datum
             lo: Union[str, int] = con.name if con.name else con.cs_idx
-            if lo in d_exp.keys():
-                con.expression = d_exp[lo]
-            self.__constraints.append(con)
+            con.expression = d_exp.get(lo, '')
+            res.append(con)
+        xp('constraints', len(res), 'rebuilt', made, **_cs)
+        self.__constraints[:] = res
+        self.__datums = datums
 
         self.base.flags.reset(Dirty.CONSTRAINTS)
         xp('update_done.emit', **_ev)
         self.update_done.emit()
 
     @staticmethod
-    def __get_kwargs(cont: Cs, item: Sketcher.Constraint, fmt: str) -> dict:
-        d: Dict = dict()
-        if Cs.F in cont:
-            d['FIRST'] = item.First
-        if Cs.FP in cont:
-            d['FIRST_POS'] = item.FirstPos
-        if Cs.S in cont:
-            d['SECOND'] = item.Second
-        if Cs.SP in cont:
-            d['SECOND_POS'] = item.SecondPos
-        if Cs.T in cont:
-            d['THIRD'] = item.Third
-        if Cs.TP in cont:
-            d['THIRD_POS'] = item.ThirdPos
-        if Cs.V in cont:
-            d['VALUE'] = item.Value
-        d['FMT'] = fmt
-        return d
+    def __sig(item: Sketcher.Constraint) -> tuple:
+        # all a record is decoded from, flags and names are copied on every update
+        return (item.Type, item.First, item.FirstPos, item.Second, item.SecondPos, item.Third, item.ThirdPos,
+                item.Value)
+
+    __ico_paths: Dict[str, str] = dict()
+
+    @staticmethod
+    def ico_path(name: str) -> str:
+        # resolved once per icon
+        res = Constraints.__ico_paths.get(name)
+        if res is None:
+            res = Constraints.__ico_paths[name] = str(pathlib.Path(CfgBase.BASE_DIR, Constraints.ico[name]))
+        return res
+
+    def __expressions(self) -> Dict[Union[str, int], str]:
+        # [('Constraints[6]', '2 * 4'), ('.Constraints.test', '2 * 4.5')]
+        exp_list = self.sketch.ExpressionEngine
+        d_exp: Dict[Union[str, int], str] = dict()
+        for idx_, exp in exp_list:
+            idx_: str
+            exp: str
+            if idx_.startswith('Constraints['):
+                i = int(''.join(filter(str.isdigit, idx_)))
+                d_exp[i] = exp
+            else:
+                i = idx_.rfind('.')
+                s = idx_[i + 1:]
+                d_exp[s] = exp
+        return d_exp
 
     @flow
+    def constraints_compact(self, del_list: List[int]):
+        # drop deleted records and shift the indices of the rest instead of reading all again,
+        # del_list sorted ascending
+        d_exp = self.__expressions()
+        res: List[Constraint] = list()
+        for con in self.__constraints:
+            i = bisect_left(del_list, con.cs_idx)
+            if (i < len(del_list)) and (del_list[i] == con.cs_idx):
+                continue
+            con.cs_idx -= i
+            lo: Union[str, int] = con.name if con.name else con.cs_idx
+            con.expression = d_exp.get(lo, '')
+            if (Cs.V in con.sub_type) and not con.driving:
+                # reference values follow the solved geometry
+                con.datum = self.sketch.getDatum(con.cs_idx)
+            res.append(con)
+        xp('compact', len(self.__constraints), '->', len(res), **_cs)
+        self.__constraints[:] = res
+        self.__by_idx = dict()
+        self.__by_geo = None
+        self.__joints.clear()
+
+    @flow
+    @timed('cs.delete')
     def constraints_delete(self, idx_list: List[int]):
         doc: App.Document = App.ActiveDocument
         if len(idx_list):
-            del_list: [int] = idx_list
-            del_list.sort(reverse=True)
-            doc.openTransaction('coed: delete constraint')
-            # todo block signal reminder
-            with observer_block():
-                for i in del_list:
-                    xp('del: ' + str(i), **_cs)
-                    self.sketch.delConstraint(i)
+            del_list: List[int] = sorted(set(idx_list))
+            # records are only kept if they were current before
+            compact = not self.base.flags.has(Dirty.CONSTRAINTS)
+            with span('cs.delete.transaction'):
+                doc.openTransaction('coed: delete constraint')
+                # todo block signal reminder
+                with observer_block():
+                    xp('del:', del_list, **_cs)
+                    if hasattr(self.sketch, 'delConstraints'):
+                        self.sketch.delConstraints(del_list)
+                    else:
+                        for i in reversed(del_list):
+                            self.sketch.delConstraint(i)
                     self.sketch.solve()
-                    xp('deleted.emit', i, **_ev)
-                    self.deleted.emit(i)
-            doc.commitTransaction()
-            self.base.flags.set(Dirty.CONSTRAINTS)
-            doc.openTransaction('coed: obj recompute')
+                    xp('deleted.emit', len(del_list), **_ev)
+                    self.deleted.emit(del_list)
+                doc.commitTransaction()
+            with span('cs.delete.recompute'):
+                doc.openTransaction('coed: obj recompute')
+                sk: Sketcher.SketchObject = self.sketch
+                sk.addProperty('App::PropertyString', 'coed')
+                sk.coed = 'cons_recompute'
+                sk.recompute()
+                doc.commitTransaction()
+            delta = self.base.changes_classify()
+            if compact and not delta.count and all(x >= 0 for x in delta.geo):
+                self.constraints_compact(del_list)
+                self.base.flags.reset(Dirty.CONSTRAINTS)
+            else:
+                self.base.flags.set(Dirty.CONSTRAINTS)
+            xp('deletion_done.emit', **_ev)
+            self.deletion_done.emit()
+
+    @flow
+    @timed('cs.batch_apply')
+    def batch_apply(self, changes: List[CsChange]) -> Dict[int, str]:
+        # all changes in one transaction with one recompute, returns error messages by cs_idx
+        errors: Dict[int, str] = dict()
+        if not changes:
+            return errors
+        doc: App.Document = App.ActiveDocument
+        co_list: List[Sketcher.Constraint] = self.sketch.Constraints
+        for ch in changes:
+            if (ch.cs_idx >= len(co_list)) or (self.__sig(co_list[ch.cs_idx]) != ch.sig):
+                # the constraint was changed or moved since the edit was queued
+                errors[ch.cs_idx] = 'constraint changed since the edit was queued'
+                xp('batch', ch, 'stale', **_cs)
+        names = {idx: item.Name for idx, item in enumerate(co_list)}
+        order = {k: i for i, k in enumerate(self.__BATCH_ORDER)}
+        with span('cs.batch.transaction'):
+            doc.openTransaction('coed: batch edit constraints')
+            with observer_block():
+                for ch in sorted(changes, key=lambda x: order[x.kind]):
+                    if ch.cs_idx in errors:
+                        continue
+                    try:
+                        self.__batch_one(ch, names)
+                    except Exception as err:
+                        errors[ch.cs_idx] = self.__err_msg(err)
+                        xp('batch', ch, 'failed:', errors[ch.cs_idx], **_cs)
+        with span('cs.batch.recompute'):
             sk: Sketcher.SketchObject = self.sketch
             sk.addProperty('App::PropertyString', 'coed')
             sk.coed = 'cons_recompute'
             sk.recompute()
             doc.commitTransaction()
-            xp('deletion_done.emit', **_ev)
-            self.base.flags.all()
-            self.deletion_done.emit()
+        self.base.changes_classify()
+        xp('batch_done.emit', len(changes), 'changes', len(errors), 'failed', **_ev)
+        self.batch_done.emit(errors)
+        return errors
+
+    def __batch_one(self, ch: CsChange, names: Dict[int, str]):
+        sk: Sketcher.SketchObject = self.sketch
+        if ch.kind == self.BATCH_NAME:
+            sk.renameConstraint(ch.cs_idx, ch.val)
+            names[ch.cs_idx] = ch.val
+        elif ch.kind == self.BATCH_DRIVING:
+            sk.setDriving(ch.cs_idx, ch.val)
+        elif ch.kind == self.BATCH_ACTIVE:
+            sk.setActive(ch.cs_idx, ch.val)
+        elif ch.kind == self.BATCH_VIRTUAL:
+            sk.setVirtualSpace(ch.cs_idx, ch.val)
+        elif ch.kind == self.BATCH_DATUM:
+            sk.setDatum(ch.cs_idx, App.Units.Quantity(ch.val))
+        elif ch.kind == self.BATCH_EXPRESSION:
+            name = names.get(ch.cs_idx)
+            path = f'.Constraints.{name}' if name else f'Constraints[{ch.cs_idx}]'
+            if ch.val:
+                sk.evalExpression(ch.val)
+            sk.setExpression(path, ch.val if ch.val else None)
+        else:
+            raise ValueError(ch.kind)
+
+    @staticmethod
+    def __err_msg(err: Exception) -> str:
+        # sketcher errors carry a dict with the message
+        if err.args and isinstance(err.args[0], dict):
+            return str(err.args[0].get('sErrMsg', err))
+        return str(err)
 
 
 xps(__name__)
@@ -15,45 +15,320 @@
 # ***************************************************************************
 from operator import attrgetter
 from threading import Lock
-from typing import List, Set, Callable, Tuple, Dict
+from typing import List, Set, Callable, Tuple, Dict, Optional
 
 import FreeCAD as App
 import FreeCADGui as Gui
 import Sketcher
-from PySide2.QtCore import Slot, QItemSelectionModel, QModelIndex, Qt, QSize, Signal, QPoint
-from PySide2.QtGui import QIcon, QCursor, QClipboard
-from PySide2.QtWidgets import QBoxLayout, QWidget, QGroupBox, QLabel, QTableWidget, QComboBox, QPushButton, \
-    QVBoxLayout, QHBoxLayout, QTableWidgetItem, QHeaderView, QAbstractItemView, QCheckBox, QMenu, QAction, QFrame
-
-from .co_cs import Constraints, Constraint
+from PySide2.QtCore import Slot, QItemSelectionModel, QModelIndex, Qt, QSize, Signal, QPoint, QAbstractTableModel, \
+    QAbstractItemModel, QEvent, QRect, QItemSelection, QPersistentModelIndex
+from PySide2.QtGui import QIcon, QCursor, QClipboard, QColor, QPainter, QPalette, QFontMetrics, QFont
+from PySide2.QtWidgets import QBoxLayout, QWidget, QGroupBox, QLabel, QTableView, QComboBox, QPushButton, \
+    QVBoxLayout, QHBoxLayout, QHeaderView, QAbstractItemView, QCheckBox, QMenu, QAction, QFrame, \
+    QStyledItemDelegate, QStyleOptionViewItem, QStyleOptionButton, QStyle, QApplication
+
+from .co_cs import Constraints, Constraint, CsChange
 from .. import co_impl, co_gui
-from ..co_base.co_cmn import ConType, wait_cursor, TableLabel, pt_typ_str, ObjType, block_signals, DIM_CS, NO_DIM_CS
-from ..co_base.co_completer import Root, TableLineEdit, DocTreeModel
-from ..co_base.co_flag import ConsTrans, Cs
-from ..co_base.co_logger import xp, _cs, flow, _ev, Profile, seq_gen, _cp
+from ..co_base.co_cmn import ConType, wait_cursor, pt_typ_str, ObjType, block_signals, DIM_CS, NO_DIM_CS, LruCache
+from ..co_base.co_config import CfgColors
+from ..co_base.co_completer import TableLineEdit
+from ..co_base.co_flag import ConsTrans, Cs, Dirty
+from ..co_base.co_logger import xp, _cs, flow, _ev, seq_gen, _cp
+from ..co_base.co_span import timed
 from ..co_base.co_lookup import Lookup
-from ..co_base.co_observer import observer_block, observer_event_provider_get
+from ..co_base.co_observer import observer_block, observer_event_provider_get, app_revision
 
 _QL = QBoxLayout
 
 
-class TableCheckBox(QCheckBox):
+class CsModel(QAbstractTableModel):
+    # constraint records of the cs table, the cells are painted by delegates
+    # so a row costs no widgets and only the visible rows get rendered
+    check_chg = Signal(object, int, bool)
+    name_chg = Signal(object, str)
 
-    state_chg = Signal(object, object, int)
+    InfoRole = Qt.UserRole + 1
 
-    def __init__(self, item: Constraint, state: bool, enable: bool, func: Callable, parent=None, *args, **kwargs):
-        super().__init__(parent, *args, **kwargs)
-        self.cs_item = item
-        self.stateChanged.connect(self.re_emit)
-        self.setStyleSheet("QCheckBox::indicator {width: 20px; height: 20px;}")
-        self.setEnabled(enable)
-        self.setChecked(state)
-        self.state_chg.connect(func)
+    COL_CNT = 7
+    DATA_COL = 0
+    TYPE_COL = 1
+    INFO_COL = 2
+    ACT_COL = 3
+    DRV_COL = 4
+    VIRT_COL = 5
+    EXP_COL = 6
 
-    @Slot(int)
-    def re_emit(self, state: int):
-        pt = self.pos()
-        self.state_chg.emit(pt, self.cs_item, state)
+    __HEADER = {TYPE_COL: 'Type', INFO_COL: 'Info', ACT_COL: 'A', DRV_COL: 'D', VIRT_COL: 'V', EXP_COL: 'Exp'}
+    __CHECK = {ACT_COL: 'active', DRV_COL: 'driving', VIRT_COL: 'virtual'}
+
+    def __init__(self, split: Callable, parent=None):
+        super(CsModel, self).__init__(parent)
+        self.split = split
+        self.__rows: List[Constraint] = list()
+        self.__info: Dict[int, Tuple[str, str, str]] = dict()
+        self.__icons: Dict[str, QIcon] = dict()
+        self.__sort: Tuple[int, Qt.SortOrder] = (CsModel.TYPE_COL, Qt.AscendingOrder)
+        # batch state by cs_idx, None while pending else the error of the last apply
+        self.marks: Dict[int, Optional[str]] = dict()
+        self.pending_font: QFont = QFont()
+        self.pending_font.setItalic(True)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.__rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else CsModel.COL_CNT
+
+    def item(self, row: int) -> Constraint:
+        return self.__rows[row]
+
+    @flow
+    def rows_set(self, rows: List[Constraint]):
+        self.beginResetModel()
+        self.__rows = list(rows)
+        self.__info.clear()
+        self.__sort_rows()
+        self.endResetModel()
+
+    def row_changed(self, row: int):
+        self.__info.pop(self.__rows[row].cs_idx, None)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, CsModel.COL_CNT - 1))
+
+    def marks_set(self, marks: Dict[int, Optional[str]]):
+        self.marks = marks
+        if self.__rows:
+            self.dataChanged.emit(self.index(0, CsModel.TYPE_COL), self.index(len(self.__rows) - 1, CsModel.TYPE_COL))
+
+    @staticmethod
+    def type_text(item: Constraint) -> str:
+        return f'{item.type_id} {item.cs_idx + 1}' if item.name == '' else item.name
+
+    @staticmethod
+    def exp_text(item: Constraint) -> str:
+        if item.type_id in NO_DIM_CS:
+            return ''
+        if (Cs.V in item.sub_type) and not item.expression:
+            return str(item.datum)
+        return item.expression
+
+    def check_enabled(self, item: Constraint, col: int) -> bool:
+        # can't enable driving on pure extern constraints
+        if item.pure_extern:
+            return False
+        return (col != CsModel.DRV_COL) or (item.type_id in DIM_CS)
+
+    def __info_get(self, item: Constraint) -> Tuple[str, str, str]:
+        # split on first paint, rows never shown are never split
+        res = self.__info.get(item.cs_idx)
+        if res is None:
+            res = self.__info[item.cs_idx] = self.split(item)
+        return res
+
+    def __icon(self, path: str) -> QIcon:
+        ico = self.__icons.get(path)
+        if ico is None:
+            ico = self.__icons[path] = QIcon(path)
+        return ico
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if (orientation == Qt.Horizontal) and (role == Qt.DisplayRole):
+            return CsModel.__HEADER.get(section, '')
+        return None
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self.__rows[index.row()]
+        col = index.column()
+        if role == Qt.UserRole:
+            return item
+        if col == CsModel.TYPE_COL:
+            if role in (Qt.DisplayRole, Qt.EditRole):
+                return self.type_text(item)
+            if role == Qt.DecorationRole:
+                return self.__icon(item.ico_no if item.driving else item.ico_alt_no)
+            if item.cs_idx in self.marks:
+                err = self.marks[item.cs_idx]
+                if (role == Qt.FontRole) and (err is None):
+                    return self.pending_font
+                if (role == Qt.ForegroundRole) and err:
+                    return QColor(Qt.red)
+                if role == Qt.ToolTipRole:
+                    return 'pending' if err is None else err
+        elif col == CsModel.INFO_COL:
+            if role == CsModel.InfoRole:
+                return self.__info_get(item)
+            if role == Qt.DisplayRole:
+                return ' '.join(x for x in self.__info_get(item) if x)
+        elif col in CsModel.__CHECK:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if getattr(item, CsModel.__CHECK[col]) else Qt.Unchecked
+        elif col == CsModel.EXP_COL:
+            if role in (Qt.DisplayRole, Qt.EditRole):
+                return self.exp_text(item)
+        return None
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        item = self.__rows[index.row()]
+        col = index.column()
+        res = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if col == CsModel.TYPE_COL:
+            res |= Qt.ItemIsEditable
+        elif col in CsModel.__CHECK:
+            if self.check_enabled(item, col):
+                res |= Qt.ItemIsUserCheckable
+        elif col == CsModel.EXP_COL:
+            if (item.type_id not in NO_DIM_CS) and item.driving:
+                res |= Qt.ItemIsEditable
+        return res
+
+    def setData(self, index: QModelIndex, value, role=Qt.EditRole) -> bool:
+        if not index.isValid():
+            return False
+        item = self.__rows[index.row()]
+        col = index.column()
+        if (role == Qt.CheckStateRole) and (col in CsModel.__CHECK):
+            xp('check_chg.emit', item.cs_idx, col, value, **_ev)
+            self.check_chg.emit(item, col, int(value) == int(Qt.Checked))
+        elif (role == Qt.EditRole) and (col == CsModel.TYPE_COL):
+            xp('name_chg.emit', item.cs_idx, value, **_ev)
+            self.name_chg.emit(item, value)
+        else:
+            return False
+        self.row_changed(index.row())
+        return True
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        items = [self.__rows[x.row()] for x in old]
+        self.__sort = (column, order)
+        self.__sort_rows()
+        row_of = {id(x): r for r, x in enumerate(self.__rows)}
+        self.changePersistentIndexList(old, [self.index(row_of[id(x)], i.column()) for x, i in zip(items, old)])
+        self.layoutChanged.emit()
+
+    def __sort_rows(self):
+        column, order = self.__sort
+        if column == CsModel.TYPE_COL:
+            key = self.type_text
+        elif column == CsModel.INFO_COL:
+            key = lambda x: ' '.join(self.__info_get(x))
+        elif column in CsModel.__CHECK:
+            key = attrgetter(CsModel.__CHECK[column])
+        elif column == CsModel.EXP_COL:
+            key = self.exp_text
+        else:
+            key = attrgetter('cs_idx')
+        self.__rows.sort(key=key, reverse=(order == Qt.DescendingOrder))
+
+
+class InfoDelegate(QStyledItemDelegate):
+    # geometry references in normal, construction and extern colors
+
+    def __init__(self, parent=None):
+        super(InfoDelegate, self).__init__(parent)
+        self.colors: Tuple[Optional[QColor], QColor, QColor] = (None, QColor(), QColor())
+        self.colors_update()
+
+    def colors_update(self):
+        cfg_c = CfgColors()
+        self.colors = (None, cfg_c.color_get(CfgColors.COLOR_CONSTRUCT), cfg_c.color_get(CfgColors.COLOR_EXTERN))
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        opt.text = ''
+        style: QStyle = opt.widget.style() if opt.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, opt, painter, opt.widget)
+        rect: QRect = style.subElementRect(QStyle.SE_ItemViewItemText, opt, opt.widget)
+        selected = bool(opt.state & QStyle.State_Selected)
+        normal = opt.palette.color(QPalette.HighlightedText if selected else QPalette.Text)
+        painter.save()
+        painter.setFont(opt.font)
+        x = rect.left()
+        for txt, color in zip(index.data(CsModel.InfoRole), self.colors):
+            if not txt:
+                continue
+            painter.setPen(normal if color is None else color)
+            painter.drawText(QRect(x, rect.top(), max(rect.right() - x, 0), rect.height()),
+                             Qt.AlignVCenter | Qt.AlignLeft, txt)
+            x += opt.fontMetrics.horizontalAdvance(f'{txt} ')
+        painter.restore()
+
+
+class CheckDelegate(QStyledItemDelegate):
+    # centered check box from Qt.CheckStateRole, toggled by click or space
+
+    @staticmethod
+    def __indicator(option: QStyleOptionViewItem) -> QRect:
+        style: QStyle = option.widget.style() if option.widget else QApplication.style()
+        rect: QRect = style.subElementRect(QStyle.SE_CheckBoxIndicator, QStyleOptionButton(), option.widget)
+        rect.moveCenter(option.rect.center())
+        return rect
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        opt.features = opt.features & ~QStyleOptionViewItem.HasCheckIndicator
+        style: QStyle = opt.widget.style() if opt.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, opt, painter, opt.widget)
+        chk = QStyleOptionButton()
+        chk.rect = self.__indicator(option)
+        checked = index.data(Qt.CheckStateRole) == Qt.Checked
+        chk.state = QStyle.State_On if checked else QStyle.State_Off
+        if index.flags() & Qt.ItemIsUserCheckable:
+            chk.state |= QStyle.State_Enabled
+        style.drawPrimitive(QStyle.PE_IndicatorCheckBox, chk, painter, opt.widget)
+
+    def editorEvent(self, event: QEvent, model: QAbstractItemModel, option: QStyleOptionViewItem,
+                    index: QModelIndex) -> bool:
+        if not (index.flags() & Qt.ItemIsUserCheckable):
+            return False
+        if event.type() == QEvent.MouseButtonRelease:
+            if (event.button() != Qt.LeftButton) or not self.__indicator(option).contains(event.pos()):
+                return False
+        elif event.type() == QEvent.MouseButtonDblClick:
+            return True
+        elif event.type() == QEvent.KeyPress:
+            if event.key() not in (Qt.Key_Space, Qt.Key_Select):
+                return False
+        else:
+            return False
+        checked = index.data(Qt.CheckStateRole) == Qt.Checked
+        return model.setData(index, Qt.Unchecked if checked else Qt.Checked, Qt.CheckStateRole)
+
+
+class ExpDelegate(QStyledItemDelegate):
+    # expression line edit with path completion, only created while a cell is edited
+
+    def __init__(self, gui, parent=None):
+        super(ExpDelegate, self).__init__(parent)
+        self.gui: CsGui = gui
+
+    def createEditor(self, parent: QWidget, option: QStyleOptionViewItem, index: QModelIndex) -> QWidget:
+        item: Constraint = index.data(Qt.UserRole)
+        le = TableLineEdit(item, None, item.driving, parent)
+        le.setParent(parent)
+        le.set_exp_eval(self.gui.eval_expressions)
+        le.set_exp_save(self.gui.set_expression)
+        le.txt_edited.connect(self.gui.on_li_edt_changed)
+        le.edt_finished.connect(self.gui.on_li_edt_finished)
+        le.setReadOnly(False)
+        return le
+
+    def setEditorData(self, editor: QWidget, index: QModelIndex):
+        # the editor fills itself from the record
+        pass
+
+    def setModelData(self, editor: QWidget, model: QAbstractItemModel, index: QModelIndex):
+        # saved by the editor on return, only the row needs a repaint
+        model.row_changed(index.row())
+
+    def updateEditorGeometry(self, editor: QWidget, option: QStyleOptionViewItem, index: QModelIndex):
+        editor.setGeometry(option.rect)
 
 
 class PopCheckBox(QCheckBox):
@@ -168,12 +443,25 @@ class CsGui:
         self.cs.update_done.connect(self.on_cs_up_done)
         self.cons_grp_box: QGroupBox = QGroupBox(None)
         self.cons_lbl_con: QLabel = QLabel()
-        self.cons_tbl_wid: QTableWidget = QTableWidget()
+        self.cons_model: CsModel = CsModel(self.split)
+        self.cons_model.check_chg.connect(self.on_tbl_chk)
+        self.cons_model.name_chg.connect(self.on_tbl_name_chg)
+        self.info_dlg = InfoDelegate()
+        self.cons_tbl_wid: QTableView = QTableView()
         self.cons_cmb_box: QComboBox = QComboBox()
         self.cons_btn_del: QPushButton = QPushButton()
+        self.cons_btn_bat: QPushButton = QPushButton()
+        self.cons_btn_apl: QPushButton = QPushButton()
         self.cons_btn_ext: QPushButton = QPushButton()
         self.cons_btn_tol: QPushButton = QPushButton()
         self.ext_toggle = True
+        # expression text -> validation result, only valid for an unchanged document state
+        self.exp_cache = LruCache(64)
+        # queued edits while in batch mode, a later edit of the same kind replaces the earlier
+        self.batch: Dict[Tuple[int, str], CsChange] = dict()
+        # types the table was built for, cs_idx of the rows left visible by a 3d view selection
+        self.tbl_typ: Set[ConType] = {ConType.ALL}
+        self.sel_filter: Optional[Set[int]] = None
         self.tab_cs.setLayout(self.lay_get())
         self.ctrl_up = None
         self.ctrl_lock = Lock()
@@ -186,8 +474,7 @@ class CsGui:
         self.cons_grp_box.setTitle(u"Constraints")
         self.cons_lbl_con.setText(u"Type")
         self.cons_tbl_wid = self.prep_table(self.cons_grp_box)
-        self.cons_tbl_wid.itemSelectionChanged.connect(self.on_cons_tbl_sel_chg)
-        self.cons_tbl_wid.itemChanged.connect(self.on_tbl_itm_chg)
+        self.cons_tbl_wid.selectionModel().selectionChanged.connect(self.on_cons_tbl_sel_chg)
         self.cons_tbl_wid.setEditTriggers(QAbstractItemView.EditKeyPressed | QAbstractItemView.DoubleClicked)
 
         self.cons_cmb_box = self.prep_combo()
@@ -195,6 +482,12 @@ class CsGui:
         self.cons_btn_del.clicked.connect(self.on_cons_delete_btn_clk)
         self.cons_btn_del.setText(u"Delete")
         self.cons_btn_del.setDisabled(True)
+        self.cons_btn_bat.setText(u"Batch")
+        self.cons_btn_bat.setCheckable(True)
+        self.cons_btn_bat.toggled.connect(self.on_cons_bat_btn_tgl)
+        self.cons_btn_apl.setText(u"Apply")
+        self.cons_btn_apl.setDisabled(True)
+        self.cons_btn_apl.clicked.connect(self.on_cons_apl_btn_clk)
         self.cons_btn_ext.clicked.connect(self.on_cons_ext_btn_clk)
         self.cons_btn_ext.setText(u">")
         self.cons_btn_ext.setContentsMargins(0, 0, 0, 0)
@@ -207,7 +500,8 @@ class CsGui:
         # noinspection PyArgumentList
         li = [QVBoxLayout(), self.cons_grp_box,
               [QVBoxLayout(self.cons_grp_box),
-               [QHBoxLayout(), self.cons_btn_tol, self.cons_cmb_box, _QL.addStretch, self.cons_btn_del,
+               [QHBoxLayout(), self.cons_btn_tol, self.cons_cmb_box, _QL.addStretch, self.cons_btn_bat,
+                self.cons_btn_apl, self.cons_btn_del,
                # [QHBoxLayout(), self.cons_lbl_con, self.cons_cmb_box, _QL.addStretch, self.cons_btn_del,
                 self.cons_btn_ext],
                self.cons_tbl_wid]]
@@ -220,36 +514,31 @@ class CsGui:
         combo_box.addItem(ConType.ALL.value)
         return combo_box
 
-    __COL_CNT = 7
-    __DATA_COL = 0
-    __TYPE_COL = 1
-    __INFO_COL = 2
-    __ACT_COL = 3
-    __DRV_COL = 4
-    __VIRT_COL = 5
-    __EXP_COL = 6
-
-    @flow
-    def prep_table(self, obj: QGroupBox) -> QTableWidget:
-        table_widget = QTableWidget(obj)
-        table_widget.setColumnCount(self.__COL_CNT)
-        w_item = QTableWidgetItem(u"Type")
-        table_widget.setHorizontalHeaderItem(self.__TYPE_COL, w_item)
-        w_item = QTableWidgetItem(u"Info")
-        table_widget.setHorizontalHeaderItem(self.__INFO_COL, w_item)
-        w_item = QTableWidgetItem(u"A")
-        table_widget.setHorizontalHeaderItem(self.__ACT_COL, w_item)
-        w_item = QTableWidgetItem(u"D")
-        table_widget.setHorizontalHeaderItem(self.__DRV_COL, w_item)
-        w_item = QTableWidgetItem(u"V")
-        table_widget.setHorizontalHeaderItem(self.__VIRT_COL, w_item)
-        w_item = QTableWidgetItem(u"Exp")
-        table_widget.setHorizontalHeaderItem(self.__EXP_COL, w_item)
-        self.prep_table2(table_widget)
-        return table_widget
-
-    @flow
-    def prep_table2(self, tbl: QTableWidget):
+    __COL_CNT = CsModel.COL_CNT
+    __DATA_COL = CsModel.DATA_COL
+    __TYPE_COL = CsModel.TYPE_COL
+    __INFO_COL = CsModel.INFO_COL
+    __ACT_COL = CsModel.ACT_COL
+    __DRV_COL = CsModel.DRV_COL
+    __VIRT_COL = CsModel.VIRT_COL
+    __EXP_COL = CsModel.EXP_COL
+
+    @flow
+    def prep_table(self, obj: QGroupBox) -> QTableView:
+        table_view = QTableView(obj)
+        table_view.setModel(self.cons_model)
+        self.cons_model.pending_font = QFont(self.base.tbl_font)
+        self.cons_model.pending_font.setItalic(True)
+        table_view.setItemDelegateForColumn(self.__INFO_COL, self.info_dlg)
+        chk_dlg = CheckDelegate(table_view)
+        for col in (self.__ACT_COL, self.__DRV_COL, self.__VIRT_COL):
+            table_view.setItemDelegateForColumn(col, chk_dlg)
+        table_view.setItemDelegateForColumn(self.__EXP_COL, ExpDelegate(self, table_view))
+        self.prep_table2(table_view)
+        return table_view
+
+    @flow
+    def prep_table2(self, tbl: QTableView):
         tbl.setContextMenuPolicy(Qt.CustomContextMenu)
         tbl.customContextMenuRequested.connect(self.on_tbl_ctx_menu)
         tbl.horizontalHeader().setVisible(True)
@@ -260,7 +549,7 @@ class CsGui:
         tbl.setColumnHidden(self.__DRV_COL, True)
         tbl.setColumnHidden(self.__VIRT_COL, True)
         tbl.setColumnHidden(self.__EXP_COL, True)
-        tbl.sortItems(self.__TYPE_COL, Qt.AscendingOrder)
+        tbl.sortByColumn(self.__TYPE_COL, Qt.AscendingOrder)
         tbl.setSortingEnabled(True)
         hh: QHeaderView = tbl.horizontalHeader()
         hh.setDefaultSectionSize(10)
@@ -272,9 +561,10 @@ class CsGui:
         hh.setSectionResizeMode(self.__VIRT_COL, QHeaderView.Fixed)
         hh.setSectionResizeMode(self.__EXP_COL, QHeaderView.Interactive)
         vh: QHeaderView = tbl.verticalHeader()
+        # uniform rows, no per row size hint needed
         # noinspection PyArgumentList
-        vh.setSectionResizeMode(QHeaderView.Interactive)
-        vh.setMaximumSectionSize(80)
+        vh.setSectionResizeMode(QHeaderView.Fixed)
+        vh.setDefaultSectionSize(QFontMetrics(self.base.tbl_font).height() + 10)
         tbl_style = "QTableView::item {" \
                     "padding-left: 5px; " \
                     "padding-right: 5px; " \
@@ -296,7 +586,6 @@ class CsGui:
             self.cons_tbl_wid.setColumnHidden(self.__VIRT_COL, False)
             self.cons_tbl_wid.setColumnHidden(self.__EXP_COL, False)
             self.cons_tbl_wid.resizeColumnsToContents()
-            self.cons_tbl_wid.resizeRowsToContents()
             i = 0
             i += self.cons_tbl_wid.columnWidth(self.__ACT_COL)
             i += self.cons_tbl_wid.columnWidth(self.__DRV_COL)
@@ -322,7 +611,6 @@ class CsGui:
             self.cons_tbl_wid.setColumnHidden(self.__VIRT_COL, True)
             self.cons_tbl_wid.setColumnHidden(self.__EXP_COL, True)
             self.cons_tbl_wid.resizeColumnsToContents()
-            self.cons_tbl_wid.resizeRowsToContents()
             si.setWidth(si.width() - i)
             self.cons_tbl_wid.resize(si)
             sii.setWidth(sii.width() - i)
@@ -360,34 +648,37 @@ class CsGui:
     @Slot(object)
     def on_tbl_ctx_menu(self, pos):
         xp('pos {} column {}'.format(pos, self.cons_tbl_wid.horizontalHeader().logicalIndexAt(pos)))
-        xp(self.cons_tbl_wid.indexAt(pos))
-        xp(self.cons_tbl_wid.itemAt(pos))
-        wi: QTableWidgetItem = self.cons_tbl_wid.itemAt(pos)
-        self.context_menu(pos, wi)
+        idx: QModelIndex = self.cons_tbl_wid.indexAt(pos)
+        xp(idx)
+        self.context_menu(pos, idx)
 
     @flow
     @Slot(object)
     def on_ctx_action(self, act):
         act: QAction
         xp('action', act.text(), act.data(), act.objectName())
-        w_item: QTableWidgetItem = act.data()
-        self.context_action(act, w_item)
+        idx: QPersistentModelIndex = act.data()
+        self.context_action(act, QModelIndex(idx))
 
     @flow
-    @Slot(object)
-    def on_tbl_itm_chg(self, w_item):
-        w_item: QTableWidgetItem
-        xp(w_item.row(), w_item.column(), w_item.text())
-        if w_item.column() == CsGui.__TYPE_COL:
-            item0: QTableWidgetItem = self.cons_tbl_wid.item(w_item.row(), CsGui.__DATA_COL)
-            cs_item: Constraint = item0.data(Qt.UserRole)
-            cs_item.name = w_item.text()
-            self.sketch.renameConstraint(cs_item.cs_idx, w_item.text())
-            self.sketch.recompute()
-        elif w_item.column() == CsGui.__EXP_COL:
-            pass
-        else:
-            xp('not expected column with changed item')
+    @Slot(object, str)
+    def on_tbl_name_chg(self, cs_item: Constraint, txt: str):
+        xp('rename', cs_item.cs_idx, txt, **_cs)
+        cs_item.name = txt
+        if self.batch_queue(cs_item, Constraints.BATCH_NAME, txt):
+            return
+        self.sketch.renameConstraint(cs_item.cs_idx, txt)
+        self.sketch.recompute()
+
+    @flow
+    @Slot(object, int, bool)
+    def on_tbl_chk(self, item: Constraint, col: int, state: bool):
+        if col == CsGui.__ACT_COL:
+            self.on_tbl_chk_active(item, state)
+        elif col == CsGui.__DRV_COL:
+            self.on_tbl_chk_driving(item, state)
+        elif col == CsGui.__VIRT_COL:
+            self.on_tbl_chk_virtual(item, state)
 
     @flow
     @Slot(object)
@@ -401,7 +692,10 @@ class CsGui:
     @Slot(object)
     def on_clear_selection(self, doc):
         xp(f'on_clear_selection: doc:', str(doc), **_cs)
-        self.update_table()
+        if (self.sel_filter is not None) and (ConType.ALL in self.tbl_typ):
+            self.rows_filter(None)
+        else:
+            self.update_table()
 
     @flow
     @Slot(object, object)
@@ -410,47 +704,41 @@ class CsGui:
         self.select_constraints(obj, pnt)
 
     @flow
-    @Slot(object, object, int)
-    def on_tbl_chk_driving(self, pt, item: Constraint, state):
+    def on_tbl_chk_driving(self, item: Constraint, state):
         xp(f'on_tbl_chk_drv idx {item.cs_idx} state {state}', **_ev)
-        model_idx: QModelIndex = self.cons_tbl_wid.indexAt(pt)
-        xp(pt, model_idx)
-        row = model_idx.row()
         b = True if state else False
-        self.sketch.setDriving(item.cs_idx, b)
         item.driving = b
-        self.chg_icon(item)
-        if item.type_id in DIM_CS:
-            xp('toggle item edit', item.type_id, 'row', row, **_cs)
-            le: TableLineEdit = self.cons_tbl_wid.cellWidget(row, CsGui.__EXP_COL)
-            if item.driving:
-                le.setEnabled(True)
-            else:
-                le.setEnabled(False)
-                item.expression = ''
-                le.setText('')
+        # icon and expression cell follow the record when the model repaints the row
+        if (item.type_id in DIM_CS) and not item.driving:
+            xp('clear expression', item.type_id, **_cs)
+            item.expression = ''
+        if self.batch_queue(item, Constraints.BATCH_DRIVING, b):
+            return
+        self.sketch.setDriving(item.cs_idx, b)
         self.sketch.recompute()
 
     @flow
-    @Slot(object, object, int)
-    def on_tbl_chk_active(self, pt, item: Constraint, state):
+    def on_tbl_chk_active(self, item: Constraint, state):
         xp(f'on_tbl_chk_act idx {item.cs_idx} sate {state}', **_ev)
         b = True if state else False
+        item.active = b
+        if self.batch_queue(item, Constraints.BATCH_ACTIVE, b):
+            return
         self.sketch.setActive(item.cs_idx, b)
-        item.driving = b
 
     @flow
-    @Slot(object, object, int)
-    def on_tbl_chk_virtual(self, pt, item: Constraint, state):
+    def on_tbl_chk_virtual(self, item: Constraint, state):
         xp(f'on_tbl_chk_vrt idx {item.cs_idx} sate {state}', **_ev)
         b = True if state else False
-        self.sketch.setVirtualSpace(item.cs_idx, b)
         item.virtual = b
+        if self.batch_queue(item, Constraints.BATCH_VIRTUAL, b):
+            return
+        self.sketch.setVirtualSpace(item.cs_idx, b)
 
     @flow
-    @Slot(int)
-    def on_cs_del(self, i: int):
-        xp('NOP Constraints deleted', i, **_ev)
+    @Slot(object)
+    def on_cs_del(self, del_list: List[int]):
+        xp('NOP Constraints deleted', del_list, **_ev)
 
     @flow
     @Slot()
@@ -478,12 +766,15 @@ class CsGui:
     def on_cons_type_cmb_chg(self, txt):
         ct: ConType = ConType(txt)
         s = {ct}
-        with Profile(enable=False):
-            self.update_table(typ=s)
+        self.update_table(typ=s)
 
     @flow
-    def on_cons_tbl_sel_chg(self):
+    @Slot(QItemSelection, QItemSelection)
+    def on_cons_tbl_sel_chg(self, sel=None, desel=None):
         xp('on_cons_tbl_sel_chg')
+        if self.cons_tbl_wid.signalsBlocked():
+            # selection cleared by the tab switch
+            return
         self.selected()
 
     @flow
@@ -503,16 +794,16 @@ class CsGui:
     # ------------------------------------------------------------------------------
 
     @flow
-    def context_menu(self, pos, wi):
-        if wi and (wi.column() == CsGui.__TYPE_COL):
+    def context_menu(self, pos, idx: QModelIndex):
+        if idx.isValid() and (idx.column() == CsGui.__TYPE_COL):
             act_edt = QAction('Edit')
-            act_edt.setData(self.cons_tbl_wid.itemAt(pos))
+            act_edt.setData(QPersistentModelIndex(idx))
             act_edt.setObjectName('EDIT')
             act_cpy = QAction('Copy')
-            act_cpy.setData(self.cons_tbl_wid.itemAt(pos))
+            act_cpy.setData(QPersistentModelIndex(idx))
             act_cpy.setObjectName('COPY')
             act_pst = QAction('Paste')
-            act_pst.setData(self.cons_tbl_wid.itemAt(pos))
+            act_pst.setData(QPersistentModelIndex(idx))
             act_pst.setObjectName('PASTE')
             menu = QMenu()
             menu.addAction(act_edt)
@@ -527,21 +818,28 @@ class CsGui:
     __seq = seq_gen()
 
     @flow
-    def context_action(self, act, w_item):
-        if w_item:
+    def context_action(self, act, idx: QModelIndex):
+        if idx.isValid():
             clip = QClipboard()
             if act.objectName() == 'EDIT':
-                xp('row', w_item.row(), 'column', w_item.column())
-                self.cons_tbl_wid.editItem(w_item)
+                xp('row', idx.row(), 'column', idx.column())
+                self.cons_tbl_wid.edit(idx)
             elif act.objectName() == 'COPY':
-                xp('row', w_item.row(), 'column', w_item.column())
-                clip.setText(w_item.text())
+                xp('row', idx.row(), 'column', idx.column())
+                clip.setText(idx.data())
             elif act.objectName() == 'PASTE':
-                xp('row', w_item.row(), 'column', w_item.column())
-                if w_item.column() == CsGui.__TYPE_COL:
-                    w_item.setText(f'{clip.text()}_{next(CsGui.__seq)}')
+                xp('row', idx.row(), 'column', idx.column())
+                if idx.column() == CsGui.__TYPE_COL:
+                    self.cons_model.setData(idx, f'{clip.text()}_{next(CsGui.__seq)}', Qt.EditRole)
 
     def set_expression(self, item, txt):
+        if self.cons_btn_bat.isChecked():
+            # a plain number on a constraint without expression is a new value
+            if txt and not item.expression and CsGui.__is_number(txt):
+                item.datum = txt
+                return self.batch_queue(item, Constraints.BATCH_DATUM, txt)
+            item.expression = txt
+            return self.batch_queue(item, Constraints.BATCH_EXPRESSION, txt)
         e = None
         try:
             if item.name:
@@ -562,18 +860,78 @@ class CsGui:
             b: Dict[str, str] = err.args[0]
             xp('eval/set expressions result:', e, 'RuntimeError:', b.get('sErrMsg'), **_cp)
             return False
-        except BaseException as err:
+        except Exception as err:
             xp('eval/set expressions result', e, 'Exception', err, **_cp)
             return False
         return True
 
+    @staticmethod
+    def __is_number(txt: str) -> bool:
+        try:
+            float(txt)
+        except ValueError:
+            return False
+        return True
+
+    @flow
+    def batch_queue(self, item: Constraint, kind: str, val) -> bool:
+        # False if not in batch mode, the caller applies the change right away
+        if not self.cons_btn_bat.isChecked():
+            return False
+        xp('batch queue', item.cs_idx, kind, val, **_cs)
+        self.batch[(item.cs_idx, kind)] = CsChange(item.cs_idx, kind, val, item.sig)
+        self.cons_model.marks[item.cs_idx] = None
+        self.cons_btn_apl.setText(f'Apply ({len(self.batch)})')
+        self.cons_btn_apl.setDisabled(False)
+        return True
+
+    @flow
+    def on_cons_bat_btn_tgl(self, checked: bool):
+        xp('batch mode', checked, **_cs)
+        self.cons_model.marks_set(dict())
+        if not checked and self.batch:
+            # drop the queue, the records were already changed
+            xp('discard', len(self.batch), 'queued changes', **_cs)
+            self.batch.clear()
+            self.impl.flags.set(Dirty.CONSTRAINTS)
+            self.update_table()
+        self.cons_btn_apl.setText(u"Apply")
+        self.cons_btn_apl.setDisabled(True)
+
+    @flow
+    def on_cons_apl_btn_clk(self):
+        changes = list(self.batch.values())
+        self.batch.clear()
+        self.cons_btn_apl.setText(u"Apply")
+        self.cons_btn_apl.setDisabled(True)
+        with wait_cursor():
+            errors = self.cs.batch_apply(changes)
+        for idx, msg in errors.items():
+            App.Console.PrintWarning(f'coed: constraint {idx + 1} not changed: {msg}\n')
+        self.cons_model.marks_set(dict(errors))
+        self.update_table()
+
     @flow
     def eval_expressions(self, txt) -> bool:
+        xp('expression:', txt, **_cp)
+        if not txt:
+            return True
+        rev = app_revision()
+        key = (self.sketch.FullName, rev, txt)
+        if rev is not None:
+            res = self.exp_cache.get(key)
+            if res is not None:
+                xp('eval_expressions cached:', res, **_cp)
+                return res[0]
+        res = self.eval_expression(txt)
+        if rev is not None:
+            self.exp_cache.put(key, res)
+        return res[0]
+
+    @flow
+    def eval_expression(self, txt) -> Tuple[bool, str]:
         e = None
         try:
-            xp('expression:', txt, **_cp)
-            if not txt:
-                return True
             e = self.sketch.evalExpression(txt)
             s = f'eval_expressions: {e}\n'
             App.Console.PrintMessage(s)
@@ -582,11 +940,11 @@ class CsGui:
             b: Dict[str, str] = err.args[0]
             xp('eval_expressions:', e, 'RuntimeError:', b.get('sErrMsg'), **_cp)
             # xp('result', e, 'RuntimeError', err)
-            return False
-        except BaseException as err:
+            return False, str(b.get('sErrMsg'))
+        except Exception as err:
             xp('eval_expressions', e, 'Exception', err, **_cp)
-            return False
-        return True
+            return False, str(err)
+        return True, str(e)
 
     @flow
     def task_up(self, cs):
@@ -594,107 +952,61 @@ class CsGui:
         return cs_list
 
     @flow(short=True)
-    def on_result_up(self, result, typ, id_lst):
-        xp('on_result_up', result, typ, id_lst, **_cs)
-        id_lst: List[int]
+    @timed('cs.table')
+    def on_result_up(self, result, typ):
+        xp('on_result_up', result, typ, **_cs)
         self.cons_btn_del.setDisabled(True)
-        self.cons_tbl_wid.setUpdatesEnabled(False)
-        self.cons_tbl_wid.setRowCount(0)
-        __sorting_enabled = self.cons_tbl_wid.isSortingEnabled()
-        self.cons_tbl_wid.setSortingEnabled(False)
         cs_list: List[Constraint] = result
-        root = self.exp_tree()
-        with block_signals(self.cons_tbl_wid):
-            for idx, item in enumerate(cs_list):
-                xp('idx, item', idx, item, **_cs)
-                if (id_lst is None and (ConType.ALL in typ or ConType(item.type_id) in typ)) or (id_lst is not None and idx in id_lst):
-                # if (id_lst is None and (typ == ConType.ALL or typ == ConType(item.type_id))) or (id_lst is not None and idx in id_lst):
-                    self.cons_tbl_wid.insertRow(0)
-                    w_item = QTableWidgetItem()
-                    w_item.setData(Qt.UserRole, item)
-                    self.cons_tbl_wid.setItem(0, self.__DATA_COL, w_item)
-
-                    w_item = QTableWidgetItem()
-                    # w_item.setFlags(w_item.flags() & ~Qt.ItemIsEditable)
-                    w_item.setIcon(QIcon(item.ico_no if item.driving else item.ico_alt_no))
-                    s = f'{item.type_id} {item.cs_idx + 1}' if item.name == '' else item.name
-                    w_item.setText(s)
-                    self.cons_tbl_wid.setItem(0, self.__TYPE_COL, w_item)
-
-                    sn, sc, se = self.split(item.cs_idx, item.sub_type)
-                    xp('sn, sc, se', sn, sc, se, **_cs)
-                    wid = TableLabel(sn, sc, se)
-                    self.cons_tbl_wid.setCellWidget(0, self.__INFO_COL, wid)
-
-                    chk_box = self.create_chk_box(item, (Qt.Checked if item.active else Qt.Unchecked), True,
-                                                  self.on_tbl_chk_active)
-                    self.cons_tbl_wid.setCellWidget(0, self.__ACT_COL, chk_box)
-
-                    chk_box = self.create_chk_box(item, (Qt.Checked if item.driving else Qt.Unchecked),
-                                                  item.type_id in DIM_CS, self.on_tbl_chk_driving)
-                    self.cons_tbl_wid.setCellWidget(0, self.__DRV_COL, chk_box)
-
-                    chk_box = self.create_chk_box(item, (Qt.Checked if item.virtual else Qt.Unchecked), True,
-                                                  self.on_tbl_chk_virtual)
-                    self.cons_tbl_wid.setCellWidget(0, self.__VIRT_COL, chk_box)
-
-                    if item.type_id in NO_DIM_CS:
-                        w_item = QTableWidgetItem()
-                        w_item.setFlags(w_item.flags() & ~Qt.ItemIsEditable)
-                        self.cons_tbl_wid.setItem(0, self.__EXP_COL, w_item)
-                    else:
-                        le = TableLineEdit(item, root.root_node, item.driving, self.cons_tbl_wid)
-                        le.set_exp_eval(self.eval_expressions)
-                        le.set_exp_save(self.set_expression)
-                        le.txt_edited.connect(self.on_li_edt_changed)
-                        le.edt_finished.connect(self.on_li_edt_finished)
-                        self.cons_tbl_wid.setCellWidget(0, self.__EXP_COL, le)
-
-        self.cons_tbl_wid.setSortingEnabled(__sorting_enabled)
+        rows = [item for item in cs_list if ConType.ALL in typ or ConType(item.type_id) in typ]
+        xp('rows', len(rows), 'of', len(cs_list), **_cs)
+        self.info_dlg.colors_update()
+        # a reset drops the hidden rows
+        self.tbl_typ = typ
+        self.sel_filter = None
+        self.cons_model.rows_set(rows)
+        # views size columns by the visible rows only
         self.cons_tbl_wid.resizeColumnsToContents()
-        self.cons_tbl_wid.resizeRowsToContents()
-        self.cons_tbl_wid.setUpdatesEnabled(True)
-
-    def exp_tree(self) -> Root:
-        t = DocTreeModel()
-        return t.root
-
-    @flow
-    def chg_icon(self, item):
-        row_cnt = self.cons_tbl_wid.rowCount()
-        for x in range(row_cnt):
-            item0: QTableWidgetItem = self.cons_tbl_wid.item(x, CsGui.__DATA_COL)
-            da = item0.data(Qt.UserRole)
-            if item and da is item:
-                xp('if it.data(Qt.UserRole) is item', item.cs_idx, da.cs_idx)
-                item1: QTableWidgetItem = self.cons_tbl_wid.item(x, CsGui.__TYPE_COL)
-                with block_signals(self.cons_tbl_wid):
-                    item1.setIcon(QIcon(item.ico_no if item.driving else item.ico_alt_no))
-
-    @flow
-    def split(self, idx, sub_type, gui=True) -> Tuple[str, str, str]:
-        sk = self.sketch
-        cs: Sketcher.Constraint = sk.Constraints[idx]
-        t = (
-        (Cs.F, 'First', Cs.FP, 'FirstPos'), (Cs.S, 'Second', Cs.SP, 'SecondPos'), (Cs.T, 'Third', Cs.TP, 'ThirdPos'))
+
+    @flow
+    def split(self, item: Constraint, gui=True) -> Tuple[str, str, str]:
+        # from the record and the snapshot, no sketch access per row
+        snap = self.impl.snapshot
+        t = ((Cs.F, item.first, Cs.FP, item.first_pos), (Cs.S, item.second, Cs.SP, item.second_pos),
+             (Cs.T, item.third, Cs.TP, item.third_pos))
         res_n, res_c, res_e = list(), list(), list()
-        for geo, g_name, typ, t_name in t:
-            if geo in sub_type:
-                r = Lookup.translate_geo_idx(getattr(cs, g_name), gui)
-                s = f'{r}.{pt_typ_str[getattr(cs, t_name)]}' if typ in sub_type else f'{r}'
-                if getattr(cs, g_name) < 0:
+        for geo, g_idx, typ, pos in t:
+            if geo in item.sub_type:
+                r = Lookup.translate_geo_idx(g_idx, gui)
+                s = f'{r}.{pt_typ_str[pos]}' if typ in item.sub_type else f'{r}'
+                if g_idx < 0:
                     res_e.append(s)
                 else:
-                    res_c.append(s) if sk.getConstruction(getattr(cs, g_name)) else res_n.append(s)
+                    res_c.append(s) if snap.construct[snap.row(g_idx)] else res_n.append(s)
         return ' '.join(res_n), ' '.join(res_c), ' '.join(res_e)
 
     @flow
-    def update_table(self, typ=None, id_lst=None):
+    def update_table(self, typ=None):
         if typ is None:
             typ = {ConType.ALL}
         ret = self.task_up(self.cs)
-        self.on_result_up(ret, typ, id_lst)
-        # self.ctrl_up = Controller(Worker(self.task_up, self.cs), self.on_result_up, 'Constraint', typ, id_lst)
+        self.on_result_up(ret, typ)
+        # self.ctrl_up = Controller(Worker(self.task_up, self.cs), self.on_result_up, 'Constraint', typ)
+
+    @flow
+    def rows_filter(self, ids: Optional[Set[int]]):
+        # hide the rows not in ids instead of rebuilding the table, None shows all rows again
+        if (ids is not None) and (ConType.ALL not in self.tbl_typ):
+            # a selection matches constraints of any type
+            self.update_table()
+        self.sel_filter = ids
+        tbl, mod = self.cons_tbl_wid, self.cons_model
+        tbl.setUpdatesEnabled(False)
+        for row in range(mod.rowCount()):
+            hide = (ids is not None) and (mod.item(row).cs_idx not in ids)
+            if tbl.isRowHidden(row) != hide:
+                tbl.setRowHidden(row, hide)
+        tbl.setUpdatesEnabled(True)
+        xp('rows_filter', None if ids is None else len(ids), 'of', mod.rowCount(), **_cs)
 
     # ------------------------------------------------------------------------------
 
@@ -712,21 +1024,6 @@ class CsGui:
             self.cs.constraints_delete(del_list)
         self.update_table()
 
-    @flow
-    def create_chk_box(self, item: Constraint, state, enable, func):
-        # wid.setStyleSheet("QCheckBox {text-align: center; spacing: 0px; margin-left:50%; margin-right:50%;}"
-        #                       "QCheckBox::indicator {width: 20px; height: 20px;}")
-        wid = QWidget()
-        lay = QHBoxLayout(wid)
-        # can't enable driving on pure extern constraints
-        if item.pure_extern:
-            enable = False
-        chk = TableCheckBox(item, state, enable, func)
-        lay.addWidget(chk)
-        lay.setAlignment(Qt.AlignCenter)
-        lay.setContentsMargins(10, 0, 0, 0)
-        return wid
-
     @flow
     def selected(self):
         indexes: List[QModelIndex] = self.cons_tbl_wid.selectionModel().selectedRows(0)
@@ -736,7 +1033,7 @@ class CsGui:
             self.cons_btn_del.setDisabled(True)
         else:
             self.cons_btn_del.setDisabled(False)
-        lo = Lookup(self.sketch)
+        lo = self.impl.lookup
         doc_name = App.activeDocument().Name
         with observer_block():
             Gui.Selection.clearSelection(doc_name, True)
@@ -784,9 +1081,7 @@ class CsGui:
                 if not from_gui:
                     xp('ignore if not from gui', **_cs)
                     return
-                sk: Sketcher.Sketch = sel_ex.Object
-                lst: List[int] = Lookup.matching_constraints(res, sk.Constraints)
-                self.update_table(id_lst=lst)
+                self.rows_filter(self.cs.geo_constraints(res))
 
     @flow
     def select(self, doc_name, sk_name, sel_set):
@@ -13,20 +13,23 @@
 # *   GNU Library General Public License for more details.                  *
 # *                                                                         *
 # ***************************************************************************
-from operator import attrgetter
-from typing import List, NamedTuple, Tuple, Set
+from array import array
+from math import isnan
+from typing import List, NamedTuple, Optional, Tuple, Set
 
 import FreeCAD as App
 import Sketcher
 from PySide2.QtCore import Signal, QObject
 
 from co_lib.co_base.co_config import CfgTransient
-from co_lib.co_base.co_lookup import Lookup
-from . import co_cs
 from .. import co_impl
-from ..co_base.co_cmn import ConType, GeoType
+from ..co_base.co_adapter import to_sketcher
+from ..co_base.co_cmn import ConType, GeoType, Record
+from ..co_base.co_geo import ConSpec
 from ..co_base.co_flag import Dirty
-from ..co_base.co_logger import xp, xps, flow, _eq, _ev
+from ..co_base.co_kernel import DisjointSet, PairTable, scalar_pairs, bound_get
+from ..co_base.co_logger import xp, xps, flow, _eq, _ev, xp_on
+from ..co_base.co_span import span, timed
 
 
 class GeoDiff(NamedTuple):
@@ -42,7 +45,9 @@ class GeoDiff(NamedTuple):
         return self.__str__()
 
 
-class EqEdge:
+class EqEdge(Record):
+    __slots__ = ('geo_idx', 'length', 'edg_differences', 'construct', 'extern')
+
     def __init__(self, geo_idx: int, length: float, construct: bool, extern: bool) -> None:
         self.geo_idx: int = geo_idx
         self.length: float = length
@@ -67,55 +72,9 @@ class EqEdge:
         return res
 
     @flow
-    def cons_filter(self, cs: Set[Tuple[int, int]]) -> List[GeoDiff]:
-        # find transitive relations
-        cn: List[Set[int]] = list()
-        for x, y in cs:
-            done = False
-            xp('in', x, y, **_eq)
-            for j in cn:
-                if (x in j) and (y in j):
-                    xp('skip', **_eq)
-                    done = True
-                    break
-                if (x in j) or (y in j):
-                    j.add(x)
-                    j.add(y)
-                    xp('j', j, **_eq)
-                    done = True
-                    break
-            if not done:
-                xp('append', x, y, **_eq)
-                cn.append({x, y})
-        self._merge_joint_sets(cn)
-        # do filter
-        res = list()
-        for x in self.edg_differences:
-            done = False
-            for y in cn:
-                if (self.geo_idx in y) and (x.geo_idx in y):
-                    done = True
-                    break  # dismiss
-            if not done:
-                res.append(x)
-        return res
-
-    @flow
-    def _merge_joint_sets(self, cn):
-        for x in range(len(cn)-1):
-            xp(f'in -> x: {x}', **_eq)
-            for y in range(x+1, len(cn)):
-                xp(f'in -> x: {x} y: {y} cn: {cn}', **_eq)
-                if y > len(cn)-1:
-                    xp(f'break x: {x} y: {y}', **_eq)
-                    break
-                if not cn[x].isdisjoint(cn[y]):
-                    xp(f'pop x: {x} {cn[x]} y: {y} {cn[y]}', **_eq)
-                    cn[x].update(cn[y])
-                    cn.pop(y)
-                    self._merge_joint_sets(cn)
-                else:
-                    xp(f'disjoint x: {x} {cn[x]} y: {y} {cn[y]}', **_eq)
+    def cons_filter(self, ds: DisjointSet) -> List[GeoDiff]:
+        # dismiss candidates already joined, directly or transitive
+        return [x for x in self.edg_differences if not ds.connected(self.geo_idx, x.geo_idx)]
 
 
 class EqEdges(QObject):
@@ -132,6 +91,10 @@ class EqEdges(QObject):
         self.__tol_init = False
         self.cfg = CfgTransient()
         self.tolerance: float = self.cfg.get(self.cfg.EQ_TOLERANCE)
+        self._bound: float = 0.0
+        self._pairs: Optional[PairTable] = None
+        self._tol_pairs: Optional[PairTable] = None
+        self._tol_value: float = 0.0
         self.differences: List[EqEdge] = list()
         self.tolerances: List[EqEdge] = list()
         self.__init = True
@@ -176,46 +139,47 @@ class EqEdges(QObject):
     @flow
     def differences_create(self) -> None:
         self._differences.clear()
-        geo_lst = [(idx, geo.length(), self.base.sketch.getConstruction(idx), idx <= -3)
-                   for idx, geo
-                   in enumerate(self.base.sketch.Geometry)
-                   if geo.TypeId == GeoType.LINE_SEGMENT]
-
-        lo = Lookup(self.base.sketch)
-        geo_lst += [(geo_id.idx, geo.length(), True, True) for geo_id, geo in lo.extern_points('E')]
-        # geo_lst += [(idx, len_, True, True) for idx, len_ in lo.extern_points(2)]
+        snap = self.base.snapshot
+        rows = snap.rows_of(GeoType.LINE_SEGMENT, extern=False)
+        rows += [r for r in snap.rows_of(internal=False) if not isnan(snap.length[r])]
+        geo_lst = [(snap.geo_idx[r], snap.length[r], bool(snap.construct[r]), bool(snap.extern[r])) for r in rows]
         xp(geo_lst, **_eq)
-        len_geo = len(geo_lst)
-        for y in range(len_geo):
-            id_y, le_y, c, e = geo_lst[y]
+        # only differences within the bound are kept
+        self._bound = bound_get(self.tolerance)
+        self._pairs = scalar_pairs(array('d', [le for _, le, _, _ in geo_lst]), self._bound)
+        for y, (id_y, le_y, c, e) in enumerate(geo_lst):
             a = EqEdge(id_y, le_y, c, e)
-            for x in range(len_geo):
-                if x == y:
-                    continue
-                id_x, le_x, c, e = geo_lst[x]
-                if x < y:
-                    # diffs are symetric, no need to recompute
-                    diff = self._differences[x].edg_differences[y - 1].difference
-                    n = GeoDiff(id_x, diff, c, e)
-                    a.edg_differences.append(n)
-                else:
-                    a.edg_differences.append(GeoDiff(id_x, abs(le_y - le_x), c, e))
+            for x, diff in self._pairs.row(y):
+                id_x, _, c, e = geo_lst[x]
+                a.edg_differences.append(GeoDiff(id_x, diff, c, e))
             self._differences.append(a)
-        for edg in self._differences:
-            edg.edg_differences.sort(key=attrgetter('difference'))
         self.base.flags.reset(Dirty.EQ_EDGES)
         self.log_diff()
 
     @flow
+    @timed('eq.tolerances')
     def tolerances_create(self) -> None:
-        self._tolerance_lst.clear()
-        for item in self.differences:
-            a = EqEdge(item.geo_idx, item.length, item.construct, item.extern)
-            a.edg_differences = item.edg_tolerances_get(self.tolerance)
-            self._tolerance_lst.append(a)
+        diff_lst = self.differences
+        if self.tolerance > self._bound:
+            # differences were collected for a smaller bound
+            self.differences_create()
+        if self._tol_pairs is self._pairs:
+            # same candidates, only rows with a difference between old and new tolerance change
+            lo, hi = sorted((self._tol_value, self.tolerance))
+            for r in self._pairs.rows_between(lo, hi):
+                n = self._pairs.count(r, self.tolerance)
+                self._tolerance_lst[r].edg_differences = diff_lst[r].edg_differences[:n]
+        else:
+            self._tolerance_lst.clear()
+            for r, item in enumerate(diff_lst):
+                n = self._pairs.count(r, self.tolerance)
+                self._tolerance_lst.append(item.view(edg_differences=item.edg_differences[:n]))
+        self._tol_pairs = self._pairs
+        self._tol_value = self.tolerance
         self.log_tol()
 
     @flow
+    @timed('eq.create')
     def create(self, edge_lst: List[EqEdge]) -> None:
         doc: App.Document = App.ActiveDocument
         if not len(edge_lst):
@@ -228,40 +192,39 @@ class EqEdges(QObject):
                     xp('skip redundant', diff.geo_idx, edge.geo_idx, **_eq)
                     continue
                 s.add((edge.geo_idx, diff.geo_idx))
-                con_list.append(Sketcher.Constraint('Equal', edge.geo_idx, diff.geo_idx))
+                con_list.append(ConSpec('Equal', (edge.geo_idx, diff.geo_idx)))
                 xp('created.emit', **_ev)
                 self.created.emit(edge.geo_idx, diff.geo_idx)
-        doc.openTransaction('coed: Equal constraint')
-        self.base.sketch.addConstraint(con_list)
-        doc.commitTransaction()
+        with span('eq.transaction'):
+            doc.openTransaction('coed: Equal constraint')
+            self.base.sketch.addConstraint(to_sketcher(con_list))
+            doc.commitTransaction()
 
         sk: Sketcher.SketchObject = self.base.sketch
         sk.addProperty('App::PropertyString', 'coed')
         sk.coed = 'eq_recompute'
-        doc.openTransaction('coed: obj recompute')
-        sk.recompute()
-        doc.commitTransaction()
-        self.base.flags.set(Dirty.CONSTRAINTS)
-        self.base.flags.set(Dirty.EQ_EDGES)
-        self.base.flags.set(Dirty.XY_EDGES)
-        self.base.flags.set(Dirty.COIN_POINTS)
+        with span('eq.recompute'):
+            doc.openTransaction('coed: obj recompute')
+            sk.recompute()
+            doc.commitTransaction()
+        self.base.changes_classify()
         xp('creation_done.emit', **_ev)
         self.creation_done.emit()
 
     @flow
-    def cons_get(self) -> Set[Tuple[int, int]]:
-        co_list: List[co_cs.Constraint] = self.base.cs.constraints
-        col: Set[Tuple[int, int]] = {(x.first, x.second)
-                                     for x in co_list
-                                     if ConType(x.type_id) == ConType.EQUAL}
-        return col
+    def cons_get(self) -> DisjointSet:
+        return self.base.cs.joints(ConType.EQUAL)
 
     def log_diff(self):
+        if not xp_on(_eq):
+            return
         xps('difference_lst', **_eq)
         for item in self.differences:
             xp(item, **_eq)
 
     def log_tol(self):
+        if not xp_on(_eq):
+            return
         xps(f'tolerance {self.tolerance}', **_eq)
         for item in self.tolerances:
             xp(item, **_eq)
@@ -14,7 +14,7 @@
 # *                                                                         *
 # ***************************************************************************
 from threading import Lock
-from typing import List, Tuple, Set
+from typing import List
 
 import FreeCAD as App
 import FreeCADGui as Gui
@@ -26,7 +26,9 @@ from .co_eq import EqEdges, EqEdge, GeoDiff
 from .. import co_impl, co_gui
 from ..co_base.co_cmn import wait_cursor, TableLabel, ColorTableItem, ObjType
 from ..co_base.co_config import CfgTransient
+from ..co_base.co_kernel import DisjointSet
 from ..co_base.co_logger import xp, flow, _eq, _ev, xps
+from ..co_base.co_span import timed
 from ..co_base.co_lookup import Lookup
 from ..co_base.co_observer import observer_block, observer_event_provider_get
 
@@ -126,10 +128,11 @@ class EqGui:
     @flow
     def task_up(self, eq):
         edge_list: List[EqEdge] = self.eq.tolerances
-        cs: Set[Tuple[int, int]] = self.eq.cons_get()
+        cs: DisjointSet = self.eq.cons_get()
         return edge_list, cs
 
     @flow(short=True)
+    @timed('eq.table')
     def on_result_up(self, result, id_lst: List[int]):
         self.eq_btn_create.setDisabled(True)
         self.eq_tbl_wid.setUpdatesEnabled(False)
@@ -139,9 +142,7 @@ class EqGui:
         edge_list, cs = result
         res_lst: List[EqEdge] = list()
         for edge in edge_list:
-            ed = EqEdge(edge.geo_idx, edge.length, edge.construct, edge.extern)
-            ed.edg_differences = edge.cons_filter(cs)
-            res_lst.append(ed)
+            res_lst.append(edge.view(edg_differences=edge.cons_filter(cs)))
         for idx, item in enumerate(res_lst):
             if self.base.cfg_only_valid and (len(item.edg_differences) == 0):
                 continue
@@ -22,7 +22,6 @@ from PySide2.QtCore import QObject, Slot
 from PySide2.QtWidgets import QBoxLayout, QWidget, QPlainTextEdit, QPushButton, QVBoxLayout, QHBoxLayout
 
 from co_lib.co_base.co_cmn import Controller, Worker, ObjType
-from co_lib.co_base.co_lookup import Lookup
 from co_lib.co_base.co_observer import observer_block, observer_event_provider_get
 from .. import co_impl, co_gui
 from ..co_base.co_logger import flow, xp, _tr
@@ -106,7 +105,7 @@ class GeoGui(QObject):
 
     @flow
     def on_geo_btn_clk_vert(self):
-        lo = Lookup(self.sketch)
+        lo = self.impl.lookup
         ls = lo.open_vertices()
         doc_name = App.activeDocument().Name
         with observer_block():
@@ -13,35 +13,51 @@
 # *   GNU Library General Public License for more details.                  *
 # *                                                                         *
 # ***************************************************************************
+from array import array
+from bisect import bisect_left, bisect_right
 from math import dist, asin, degrees
 from operator import attrgetter
 from typing import List, Set
 
 import FreeCAD as App
-import Part
 import Sketcher
 from PySide2.QtCore import Signal, QObject, Slot
 
 from . import co_cs
 from .. import co_impl
-from ..co_base.co_cmn import fmt_vec, GeoType, ObjType
+from ..co_base.co_adapter import to_sketcher
+from ..co_base.co_cmn import fmt_vec, GeoType, ObjType, Record
+from ..co_base.co_geo import ConSpec
 from ..co_base.co_config import CfgTransient
 from ..co_base.co_flag import Dirty
-from ..co_base.co_logger import flow, xp, _hv, xps, _ev, Profile
-from ..co_base.co_lookup import Lookup
+from ..co_base.co_logger import flow, xp, _hv, xps, _ev, xp_on
+from ..co_base.co_span import span, timed
 from ..co_base.co_observer import observer_event_provider_get
 
 
-class HvEdge:
-    def __init__(self, geo_idx: int, y_angel: float, start: App.Vector, end: App.Vector, construct: bool, extern: bool):
+class HvEdge(Record):
+    __slots__ = ('geo_idx', 'sx', 'sy', 'ex', 'ey', 'y_angel', 'construct', 'extern')
+
+    def __init__(self, geo_idx: int, y_angel: float, sx: float, sy: float, ex: float, ey: float, construct: bool,
+                 extern: bool):
         self.geo_idx = geo_idx
-        self.pt_start: App.Vector = start
-        self.pt_end: App.Vector = end
-        self.x_angel: float = 90 - y_angel
+        self.sx, self.sy, self.ex, self.ey = sx, sy, ex, ey
         self.y_angel: float = y_angel
         self.construct: bool = construct
         self.extern: bool = extern
 
+    @property
+    def x_angel(self) -> float:
+        return 90 - self.y_angel
+
+    @property
+    def pt_start(self) -> App.Vector:
+        return App.Vector(self.sx, self.sy, 0)
+
+    @property
+    def pt_end(self) -> App.Vector:
+        return App.Vector(self.ex, self.ey, 0)
+
     def __str__(self):
         return f"GeoIdx {self.geo_idx}, Start ({fmt_vec(self.pt_start)} End ({fmt_vec(self.pt_end)} " \
                f"xa {self.x_angel:.2f} ya {self.y_angel:.2f}"
@@ -71,6 +87,7 @@ class HvEdges(QObject):
         self.evo.in_edit.connect(self.on_in_edit)
         self.cfg = CfgTransient()
         self.tolerance: float = self.cfg.get(self.cfg.HV_TOLERANCE)
+        self._y_keys: array = array('d')
         self.angles: List[HvEdge] = list()
         self.tolerances: List[HvEdge] = list()
         self.__init = True
@@ -101,12 +118,11 @@ class HvEdges(QObject):
 
     @property
     def angles(self) -> List[HvEdge]:
-        with Profile(enable=False):
-            if not self.__angle_init:
-                self.__angle_init = True
-                self.angles_create()
-            if self.base.flags.has(Dirty.HV_EDGES):
-                self.angles_create()
+        if not self.__angle_init:
+            self.__angle_init = True
+            self.angles_create()
+        if self.base.flags.has(Dirty.HV_EDGES):
+            self.angles_create()
         return self._angles
 
     @angles.setter
@@ -122,19 +138,15 @@ class HvEdges(QObject):
                 self.sketch = ed_info[0]
 
     @staticmethod
-    def __ge(start: App.Vector, end: App.Vector) -> float:
-        pt: List[float] = [start.x, end.y, 0.0]
-        en: List[float] = [end.x, end.y, 0.0]
-        return dist(en, pt)
+    def __ge(sx: float, ex: float, ey: float) -> float:
+        return dist((ex, ey), (sx, ey))
 
     @staticmethod
-    def __hy(start: App.Vector, end: App.Vector) -> float:
-        st: List[float] = [start.x, start.y, 0.0]
-        en: List[float] = [end.x, end.y, 0.0]
-        return dist(st, en)
+    def __hy(sx: float, sy: float, ex: float, ey: float) -> float:
+        return dist((sx, sy), (ex, ey))
 
-    def __alpha(self, start: App.Vector, end: App.Vector) -> float:
-        return degrees(asin(self.__ge(start, end) / self.__hy(start, end)))
+    def __alpha(self, sx: float, sy: float, ex: float, ey: float) -> float:
+        return degrees(asin(self.__ge(sx, ex, ey) / self.__hy(sx, sy, ex, ey)))
 
     @flow
     def cons_get(self) -> (Set[int], Set[int]):
@@ -151,82 +163,76 @@ class HvEdges(QObject):
     @flow
     def angles_create(self) -> None:
         self._angles.clear()
-        geo_lst = [(idx, geo, self.sketch.getConstruction(idx), idx <= -3)
-                   for idx, geo
-                   in enumerate(self.sketch.Geometry)
-                   if geo.TypeId == GeoType.LINE_SEGMENT]
-        lo = Lookup(self.sketch)
-        geo_lst += [(id_.idx, geo, True, True)
-                    for id_, geo
-                    in lo.extern_points('E')
-                    if geo.TypeId == GeoType.LINE_SEGMENT]
-        # geo_lst += [(idx, len_, True, True) for idx, len_ in lo.extern_points()]
-        xp(geo_lst, **_hv)
-        len_geo = len(geo_lst)
-        for x in range(len_geo):
-            idx, line, c, e = geo_lst[x]
-            line: Part.LineSegment
-            y_angle: float = self.__alpha(App.Vector(line.StartPoint), App.Vector(line.EndPoint))
-            edg = HvEdge(idx, y_angle, App.Vector(line.StartPoint), App.Vector(line.EndPoint), c, e)
-            xp(f'HvEdge: {idx} {y_angle:.2f} {fmt_vec(App.Vector(line.StartPoint))} {fmt_vec(App.Vector(line.EndPoint))} c {c} e {e}', **_hv)
+        snap = self.base.snapshot
+        rows = snap.rows_of(GeoType.LINE_SEGMENT)
+        xp(rows, **_hv)
+        for r in rows:
+            idx, c, e = snap.geo_idx[r], bool(snap.construct[r]), bool(snap.extern[r])
+            sx, sy, ex, ey = snap.sx[r], snap.sy[r], snap.ex[r], snap.ey[r]
+            y_angle: float = self.__alpha(sx, sy, ex, ey)
+            edg = HvEdge(idx, y_angle, sx, sy, ex, ey, c, e)
+            if xp_on(_hv):
+                xp(f'HvEdge: {idx} {y_angle:.2f} ({sx:.1f}, {sy:.1f}) ({ex:.1f}, {ey:.1f}) c {c} e {e}', **_hv)
             self._angles.append(edg)
         self._angles.sort(key=attrgetter('y_angel'))
+        self._y_keys = array('d', [edg.y_angel for edg in self._angles])
         self.base.flags.reset(Dirty.HV_EDGES)
         self.log_angle()
 
     @flow
+    @timed('hv.tolerances')
     def tolerances_create(self):
-        self._tolerance_lst.clear()
-        # sorted by y
-        for edg in self.angles:
-            if edg.y_angel < self._tolerance:
-                self._tolerance_lst.append(edg)
-            else:
-                break
-        for edg in reversed(self.angles):
-            if edg.x_angel < self._tolerance:
-                self._tolerance_lst.append(edg)
-            else:
-                break
+        angles = self.angles
+        # sorted by y, vertical candidates lead and horizontal ones trail
+        v = bisect_left(self._y_keys, self._tolerance)
+        h = max(bisect_right(self._y_keys, 90 - self._tolerance), v)
+        self._tolerance_lst[:] = angles[:v]
+        self._tolerance_lst.extend(reversed(angles[h:]))
         self.log_tol()
 
     @flow
+    @timed('hv.create')
     def create(self, edge_lst: List[HvEdge]):
         doc: App.Document = App.ActiveDocument
         con_list = []
         for edge in edge_lst:
             if edge.x_angel <= self.tolerance:
-                con = Sketcher.Constraint('Horizontal', edge.geo_idx)
+                con = ConSpec('Horizontal', (edge.geo_idx,))
                 con_list.append(con)
                 xp('created.emit: Horizontal', edge.geo_idx, **_ev)
                 self.created.emit('Horizontal', edge.geo_idx)
                 continue
             if edge.y_angel <= self.tolerance:
-                con = Sketcher.Constraint('Vertical', edge.geo_idx)
+                con = ConSpec('Vertical', (edge.geo_idx,))
                 con_list.append(con)
                 xp('created.emit: Vertical', edge.geo_idx, **_ev)
                 self.created.emit('Vertical', edge.geo_idx)
-        doc.openTransaction('coed: Horizontal/Vertical constraint')
-        self.sketch.addConstraint(con_list)
-        doc.commitTransaction()
+        with span('hv.transaction'):
+            doc.openTransaction('coed: Horizontal/Vertical constraint')
+            self.sketch.addConstraint(to_sketcher(con_list))
+            doc.commitTransaction()
 
         sk: Sketcher.SketchObject = self.sketch
         sk.addProperty('App::PropertyString', 'coed')
         sk.coed = 'hv_recompute'
-        doc.openTransaction('coed: obj recompute')
-        sk.recompute()
-        doc.commitTransaction()
-        self.base.flags.set(Dirty.HV_EDGES)
-        self.base.flags.set(Dirty.CONSTRAINTS)
+        with span('hv.recompute'):
+            doc.openTransaction('coed: obj recompute')
+            sk.recompute()
+            doc.commitTransaction()
+        self.base.changes_classify()
         xp('creation_done.emit', **_ev)
         self.creation_done.emit()
 
     def log_angle(self):
+        if not xp_on(_hv):
+            return
         xps('difference_lst', **_hv)
         for item in self.angles:
             xp(item, **_hv)
 
     def log_tol(self):
+        if not xp_on(_hv):
+            return
         xps(f'tolerance {self.tolerance}', **_hv)
         for item in self.tolerances:
             xp(item, **_hv)
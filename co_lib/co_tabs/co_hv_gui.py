@@ -27,6 +27,7 @@ from .co_hv import HvEdges, HvEdge
 from .. import co_impl, co_gui
 from ..co_base.co_cmn import wait_cursor, ColorTableItem, ObjType
 from ..co_base.co_logger import flow, xp, _hv, _ev, xps
+from ..co_base.co_span import timed
 from ..co_base.co_lookup import Lookup
 from ..co_base.co_observer import observer_block, observer_event_provider_get
 
@@ -139,6 +140,7 @@ class HvGui:
         return edge_list, cs_v, cs_h
 
     @flow(short=True)
+    @timed('hv.table')
     def on_result_up(self, result):
         self.hv_btn_create.setDisabled(False)
         self.hv_tbl_wid.setUpdatesEnabled(False)
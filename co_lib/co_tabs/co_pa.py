@@ -13,22 +13,24 @@
 # *   GNU Library General Public License for more details.                  *
 # *                                                                         *
 # ***************************************************************************
-from math import dist, asin, degrees, atan2
+from array import array
+from math import dist, asin, degrees
 from operator import attrgetter
-from typing import List, Set, Tuple, NamedTuple
+from typing import List, Optional, Set, Tuple, NamedTuple
 
 import FreeCAD as App
-import Part
 import Sketcher
 from PySide2.QtCore import Signal, QObject, Slot
 
-from . import co_cs
 from .. import co_impl
-from ..co_base.co_cmn import fmt_vec, ConType, GeoType, ObjType
+from ..co_base.co_adapter import to_sketcher
+from ..co_base.co_cmn import fmt_vec, ConType, GeoType, ObjType, Record
+from ..co_base.co_geo import ConSpec
 from ..co_base.co_config import CfgTransient
 from ..co_base.co_flag import Dirty
-from ..co_base.co_logger import flow, xp, _pa, xps, _ev
-from ..co_base.co_lookup import Lookup
+from ..co_base.co_kernel import DisjointSet, PairTable, scalar_pairs, bound_get
+from ..co_base.co_logger import flow, xp, _pa, xps, _ev, xp_on
+from ..co_base.co_span import span, timed
 from ..co_base.co_observer import observer_event_provider_get
 
 
@@ -45,16 +47,26 @@ class GeoDiff(NamedTuple):
         return self.__str__()
 
 
-class PaEdge:
-    def __init__(self, geo_idx: int, y_angel: float, start: App.Vector, end: App.Vector, construct: bool, extern: bool):
+class PaEdge(Record):
+    __slots__ = ('geo_idx', 'sx', 'sy', 'ex', 'ey', 'y_angel', 'edg_differences', 'construct', 'extern')
+
+    def __init__(self, geo_idx: int, y_angel: float, sx: float, sy: float, ex: float, ey: float, construct: bool,
+                 extern: bool):
         self.geo_idx = geo_idx
-        self.pt_start: App.Vector = start
-        self.pt_end: App.Vector = end
+        self.sx, self.sy, self.ex, self.ey = sx, sy, ex, ey
         self.y_angel: float = y_angel
         self.edg_differences: List[GeoDiff] = list()
         self.construct: bool = construct
         self.extern: bool = extern
 
+    @property
+    def pt_start(self) -> App.Vector:
+        return App.Vector(self.sx, self.sy, 0)
+
+    @property
+    def pt_end(self) -> App.Vector:
+        return App.Vector(self.ex, self.ey, 0)
+
     def __str__(self):
         return f"GeoIdx {self.geo_idx}, Start ({fmt_vec(self.pt_start)} End ({fmt_vec(self.pt_end)} " \
                f"ya {self.y_angel:.2f}, diff {self.edg_differences} c {self.construct} e {self.extern}"
@@ -73,55 +85,9 @@ class PaEdge:
         return res
 
     @flow
-    def cons_filter(self, cs: Set[Tuple[int, int]]) -> List[GeoDiff]:
-        # find transitive relations
-        cn: List[Set[int]] = list()
-        for x, y in cs:
-            done = False
-            xp('in', x, y, **_pa)
-            for j in cn:
-                if (x in j) and (y in j):
-                    xp('skip', **_pa)
-                    done = True
-                    break
-                if (x in j) or (y in j):
-                    j.add(x)
-                    j.add(y)
-                    xp('j', j, **_pa)
-                    done = True
-                    break
-            if not done:
-                xp('append', x, y, **_pa)
-                cn.append({x, y})
-        self._merge_joint_sets(cn)
-        # do filter
-        res = list()
-        for x in self.edg_differences:
-            done = False
-            for y in cn:
-                if (self.geo_idx in y) and (x.geo_idx in y):
-                    done = True
-                    break  # dismiss
-            if not done:
-                res.append(x)
-        return res
-
-    @flow
-    def _merge_joint_sets(self, cn):
-        for x in range(len(cn)-1):
-            xp(f'in -> x: {x}', **_pa)
-            for y in range(x+1, len(cn)):
-                xp(f'in -> x: {x} y: {y} cn: {cn}', **_pa)
-                if y > len(cn)-1:
-                    xp(f'break x: {x} y: {y}', **_pa)
-                    break
-                if not cn[x].isdisjoint(cn[y]):
-                    xp(f'pop x: {x} {cn[x]} y: {y} {cn[y]}', **_pa)
-                    cn[x].update(cn[y])
-                    cn.pop(y)
-                    self._merge_joint_sets(cn)
-                else:
-                    xp(f'disjoint x: {x} {cn[x]} y: {y} {cn[y]}', **_pa)
+    def cons_filter(self, ds: DisjointSet) -> List[GeoDiff]:
+        # dismiss candidates already joined, directly or transitive
+        return [x for x in self.edg_differences if not ds.connected(self.geo_idx, x.geo_idx)]
 
 
 class PaEdges(QObject):
@@ -135,6 +101,10 @@ class PaEdges(QObject):
         self.sketch: Sketcher.SketchObject = self.base.sketch
         self.cfg = CfgTransient()
         self.tolerance: float = self.cfg.get(self.cfg.PA_TOLERANCE)
+        self._bound: float = 0.0
+        self._pairs: Optional[PairTable] = None
+        self._tol_pairs: Optional[PairTable] = None
+        self._tol_value: float = 0.0
         self.differences: List[PaEdge] = list()
         self.tolerances: List[PaEdge] = list()
         self.evo = observer_event_provider_get()
@@ -196,41 +166,17 @@ class PaEdges(QObject):
         return degrees(asin(self.__ge(start, end) / self.__hy(start, end)))
 
     @flow
-    def cons_get(self) -> (Set[int], Set[int]):
-        co_list: List[co_cs.Constraint] = self.base.cs.constraints
-        exist_p: Set[Tuple[int, int]] = {(x.first, x.second)
-                                         for x in co_list
-                                         if ConType(x.type_id) == ConType.PARALLEL}
-        xp('exist v/h cons GeoId:', ' '.join(map(str, exist_p)), **_pa)
-        return exist_p
+    def cons_get(self) -> DisjointSet:
+        return self.base.cs.joints(ConType.PARALLEL)
 
     @flow
     def __angles_create(self) -> None:
-        geo_lst = [(idx, geo, self.sketch.getConstruction(idx), idx <= -3)
-                   for idx, geo
-                   in enumerate(self.sketch.Geometry)
-                   if geo.TypeId == GeoType.LINE_SEGMENT]
-        xp(geo_lst, **_pa)
-        lo = Lookup(self.sketch)
-        geo_lst += [(geo_id.idx, geo, True, True)
-                    for geo_id, geo
-                    in lo.extern_points('E')
-                    if geo.TypeId == GeoType.LINE_SEGMENT]
-        xp(lo.extern_points('E'), **_pa)
-        for geo in geo_lst:
-            idx, line, c, e = geo
-            line: Part.LineSegment
-            vs = App.Vector(line.StartPoint)
-            ve = App.Vector(line.EndPoint)
-            delta_x = ve.x - vs.x
-            delta_y = ve.y - vs.y
-            angle = degrees(atan2(float(delta_y), float(delta_x)))
-            if angle < 0:
-                a = 180 + angle
-            else:
-                a = angle
-            # y_angle: float = self.__alpha(App.Vector(line.StartPoint), App.Vector(line.EndPoint))
-            edg = PaEdge(idx, a, App.Vector(line.StartPoint), App.Vector(line.EndPoint), c, e)
+        snap = self.base.snapshot
+        rows = snap.rows_of(GeoType.LINE_SEGMENT)
+        xp(rows, **_pa)
+        for r in rows:
+            edg = PaEdge(snap.geo_idx[r], snap.angle[r], snap.sx[r], snap.sy[r], snap.ex[r], snap.ey[r],
+                         bool(snap.construct[r]), bool(snap.extern[r]))
             self._differences.append(edg)
         self._differences.sort(key=attrgetter('y_angel'))
 
@@ -238,34 +184,40 @@ class PaEdges(QObject):
     def differences_create(self):
         self._differences.clear()
         self.__angles_create()
-        len_a = len(self._differences)
-        for y in range(len_a):
-            edg_y: PaEdge = self._differences[y]
-            for x in range(len_a):
-                if x == y:
-                    continue
-                edg_x = self._differences[x]
-                if x < y:
-                    diff = self._differences[x].edg_differences[y - 1].difference
-                    n = GeoDiff(edg_x.geo_idx, diff, edg_x.construct, edg_x.extern)
-                    edg_y.edg_differences.append(n)
-                else:
-                    edg_y.edg_differences.append(GeoDiff(edg_x.geo_idx, abs(edg_y.y_angel - edg_x.y_angel), edg_x.construct, edg_x.extern))
-        for edg in self._differences:
-            edg.edg_differences.sort(key=attrgetter('difference'))
+        # only differences within the bound are kept
+        self._bound = bound_get(self.tolerance)
+        self._pairs = scalar_pairs(array('d', [edg.y_angel for edg in self._differences]), self._bound, 180.0)
+        for y, edg_y in enumerate(self._differences):
+            for x, diff in self._pairs.row(y):
+                edg_x: PaEdge = self._differences[x]
+                edg_y.edg_differences.append(GeoDiff(edg_x.geo_idx, diff, edg_x.construct, edg_x.extern))
         self.base.flags.reset(Dirty.PA_EDGES)
         self.log_diff()
 
     @flow
+    @timed('pa.tolerances')
     def tolerances_create(self) -> None:
-        self._tolerances.clear()
-        for item in self.differences:
-            a = PaEdge(item.geo_idx, item.y_angel, item.pt_start, item.pt_end, item.construct, item.extern)
-            a.edg_differences = item.edg_tolerances_get(self.tolerance)
-            self._tolerances.append(a)
+        diff_lst = self.differences
+        if self.tolerance > self._bound:
+            # differences were collected for a smaller bound
+            self.differences_create()
+        if self._tol_pairs is self._pairs:
+            # same candidates, only rows with a difference between old and new tolerance change
+            lo, hi = sorted((self._tol_value, self.tolerance))
+            for r in self._pairs.rows_between(lo, hi):
+                n = self._pairs.count(r, self.tolerance)
+                self._tolerances[r].edg_differences = diff_lst[r].edg_differences[:n]
+        else:
+            self._tolerances.clear()
+            for r, item in enumerate(diff_lst):
+                n = self._pairs.count(r, self.tolerance)
+                self._tolerances.append(item.view(edg_differences=item.edg_differences[:n]))
+        self._tol_pairs = self._pairs
+        self._tol_value = self.tolerance
         self.log_tol()
 
     @flow
+    @timed('pa.create')
     def create(self, edge_lst: List[PaEdge]) -> None:
         doc: App.Document = App.ActiveDocument
         if not len(edge_lst):
@@ -278,29 +230,35 @@ class PaEdges(QObject):
                     xp('skip redundant', diff.geo_idx, edge.geo_idx, **_pa)
                     continue
                 s.add((edge.geo_idx, diff.geo_idx))
-                con_list.append(Sketcher.Constraint('Parallel', edge.geo_idx, diff.geo_idx))
+                con_list.append(ConSpec('Parallel', (edge.geo_idx, diff.geo_idx)))
                 xp('created.emit', **_ev)
                 self.created.emit(edge.geo_idx, diff.geo_idx)
-        doc.openTransaction('coed: Parallel constraint')
-        self.sketch.addConstraint(con_list)
-        doc.commitTransaction()
+        with span('pa.transaction'):
+            doc.openTransaction('coed: Parallel constraint')
+            self.sketch.addConstraint(to_sketcher(con_list))
+            doc.commitTransaction()
 
         sk: Sketcher.SketchObject = self.sketch
         sk.addProperty('App::PropertyString', 'coed')
         sk.coed = 'eq_recompute'
-        doc.openTransaction('coed: obj recompute')
-        sk.recompute()
-        doc.commitTransaction()
-        self.base.flags.all()
+        with span('pa.recompute'):
+            doc.openTransaction('coed: obj recompute')
+            sk.recompute()
+            doc.commitTransaction()
+        self.base.changes_classify()
         xp('creation_done.emit', **_ev)
         self.creation_done.emit()
 
     def log_diff(self):
+        if not xp_on(_pa):
+            return
         xps('differences', **_pa)
         for item in self.differences:
             xp(item, **_pa)
 
     def log_tol(self):
+        if not xp_on(_pa):
+            return
         xps(f'tolerances {self.tolerance}', **_pa)
         for item in self.tolerances:
             xp(item, **_pa)
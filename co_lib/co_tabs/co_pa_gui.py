@@ -14,7 +14,7 @@
 # *                                                                         *
 # ***************************************************************************
 from threading import Lock
-from typing import List, Tuple, Set
+from typing import List
 
 import FreeCAD as App
 import FreeCADGui as Gui
@@ -25,7 +25,9 @@ from PySide2.QtWidgets import QWidget, QGroupBox, QPushButton, QTableWidget, QBo
 from .co_pa import PaEdges, PaEdge, GeoDiff
 from .. import co_impl, co_gui
 from ..co_base.co_cmn import wait_cursor, TableLabel, ColorTableItem
+from ..co_base.co_kernel import DisjointSet
 from ..co_base.co_logger import xp, flow, _pa, _ev, xps
+from ..co_base.co_span import timed
 from ..co_base.co_lookup import Lookup
 from ..co_base.co_observer import observer_block
 
@@ -119,10 +121,11 @@ class PaGui:
     @flow
     def task_up(self, pa):
         edge_list: List[PaEdge] = self.pa.tolerances
-        cs: Set[Tuple[int, int]] = self.pa.cons_get()
+        cs: DisjointSet = self.pa.cons_get()
         return edge_list, cs
 
     @flow(short=True)
+    @timed('pa.table')
     def on_result_up(self, result):
         self.pa_btn_create.setDisabled(True)
         self.pa_tbl_wid.setUpdatesEnabled(False)
@@ -132,9 +135,7 @@ class PaGui:
         edge_list, cs = result
         res_lst: List[PaEdge] = list()
         for edge in edge_list:
-            ed = PaEdge(edge.geo_idx, edge.y_angel, edge.pt_start, edge.pt_end, edge.construct, edge.extern)
-            ed.edg_differences = edge.cons_filter(cs)
-            res_lst.append(ed)
+            res_lst.append(edge.view(edg_differences=edge.cons_filter(cs)))
         for idx, item in enumerate(res_lst):
             if self.base.cfg_only_valid and (len(item.edg_differences) == 0):
                 continue
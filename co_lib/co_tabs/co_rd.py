@@ -16,27 +16,35 @@
 from typing import List, Set
 
 import FreeCAD as App
-import Part
 import Sketcher
 from PySide2.QtCore import Signal, QObject, Slot
 
 from . import co_cs
 from .. import co_impl
-from ..co_base.co_cmn import fmt_vec, GeoType, ObjType
+from ..co_base.co_adapter import to_sketcher
+from ..co_base.co_cmn import fmt_vec, GeoType, ObjType, Record
+from ..co_base.co_geo import ConSpec
 from ..co_base.co_flag import Dirty
 from ..co_base.co_logger import flow, xp, _rd, _ev, xps
 from ..co_base.co_observer import observer_event_provider_get
+from ..co_base.co_span import span, timed
 
 
-class RdCircle:
-    def __init__(self, idx: int, center: App.Vector, xu: float, rd: float, typ: str, construct: bool):
+class RdCircle(Record):
+    __slots__ = ('geo_idx', 'cx', 'cy', 'angle_xu', 'radius', 'type_id', 'construct')
+
+    def __init__(self, idx: int, cx: float, cy: float, xu: float, rd: float, typ: str, construct: bool):
         self.geo_idx: int = idx
-        self.center: App.Vector = center
+        self.cx, self.cy = cx, cy
         self.angle_xu: float = xu
         self.radius: float = rd
         self.type_id: str = typ
         self.construct: bool = construct
 
+    @property
+    def center(self) -> App.Vector:
+        return App.Vector(self.cx, self.cy, 0)
+
     def __str__(self):
         s = f"GeoIdx {self.geo_idx}, Center {fmt_vec(self.center)}, xu {self.angle_xu}, rad {self.radius}"
         return s
@@ -92,39 +100,41 @@ class RdCircles(QObject):
     @flow
     def circles_update(self):
         self._circles.clear()
-        geo_list = self.sketch.Geometry
-        x: Part.Circle
-        c_list: List[RdCircle] = [RdCircle(idx, App.Vector(x.Center), x.AngleXU, x.Radius, x.TypeId, self.sketch.getConstruction(idx))
-                                  for idx, x in enumerate(geo_list)
-                                  if (x.TypeId == GeoType.CIRCLE) or (x.TypeId == GeoType.ARC_OF_CIRCLE)]
+        snap = self.base.snapshot
+        c_list: List[RdCircle] = [RdCircle(snap.geo_idx[r], snap.cx[r], snap.cy[r], snap.angle_xu[r],
+                                           snap.radius[r], snap.type_id[r], bool(snap.construct[r]))
+                                  for r in snap.rows_of(GeoType.CIRCLE, GeoType.ARC_OF_CIRCLE, extern=False)]
         xp(c_list, **_rd)
         self._circles = c_list
+        self.base.flags.reset(Dirty.RD_CIRCLES)
 
     @flow
+    @timed('rd.create')
     def dia_create(self, cir_list: List[RdCircle], radius: float):
         doc: App.Document = App.ActiveDocument
         con_list = []
         if len(cir_list):
             for cir in cir_list:
                 if radius is not None:
-                    con_list.append(Sketcher.Constraint('Diameter', cir.geo_idx, radius * 2))
+                    con_list.append(ConSpec('Diameter', (cir.geo_idx, radius * 2)))
                     xp('created.emit', cir.type_id, cir.geo_idx, radius, **_ev)
                     self.created.emit(cir.geo_idx, radius)
                 else:
-                    con_list.append(Sketcher.Constraint('Diameter', cir.geo_idx, cir.radius * 2))
+                    con_list.append(ConSpec('Diameter', (cir.geo_idx, cir.radius * 2)))
                     xp('created.emit', cir.type_id, cir.geo_idx, cir.radius, **_ev)
                     self.created.emit(cir.geo_idx, cir.radius)
-            doc.openTransaction('coed: Diameter constraint')
-            self.sketch.addConstraint(con_list)
-            doc.commitTransaction()
+            with span('rd.transaction'):
+                doc.openTransaction('coed: Diameter constraint')
+                self.sketch.addConstraint(to_sketcher(con_list))
+                doc.commitTransaction()
             sk: Sketcher.SketchObject = self.sketch
             sk.addProperty('App::PropertyString', 'coed')
             sk.coed = 'rad_recompute'
-            doc.openTransaction('coed: obj recompute')
-            sk.recompute()
-            doc.commitTransaction()
-            self.base.flags.set(Dirty.CONSTRAINTS)
-            self.base.flags.set(Dirty.RD_CIRCLES)
+            with span('rd.recompute'):
+                doc.openTransaction('coed: obj recompute')
+                sk.recompute()
+                doc.commitTransaction()
+            self.base.changes_classify()
             xp('creation_done.emit', **_ev)
             self.creation_done.emit()
 
@@ -27,6 +27,7 @@ from .co_rd import RdCircles, RdCircle
 from .. import co_impl, co_gui
 from ..co_base.co_cmn import wait_cursor, ColorTableItem, ObjType
 from ..co_base.co_logger import flow, xp, _rd, _ev, xps
+from ..co_base.co_span import timed
 from ..co_base.co_lookup import Lookup
 from ..co_base.co_observer import observer_block, observer_event_provider_get
 
@@ -145,6 +146,7 @@ class RdGui:
         return cir_list, rad_lst, dia_lst
 
     @flow(short=True)
+    @timed('rd.table')
     def on_result_up(self, result):
         self.rad_btn_create.setDisabled(True)
         self.rad_tbl_wid.setUpdatesEnabled(False)
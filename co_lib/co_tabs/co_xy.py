@@ -16,16 +16,17 @@
 from typing import Set, NamedTuple, List, Tuple
 
 import FreeCAD as App
-import Part
 import Sketcher
 from PySide2.QtCore import Signal, QObject, Slot
 
 from . import co_cs
 from .. import co_impl
-from ..co_base.co_cmn import fmt_vec, pt_typ_str, GeoType, ConType, ObjType
+from ..co_base.co_adapter import to_sketcher
+from ..co_base.co_cmn import fmt_vec, pt_typ_str, GeoType, ConType, ObjType, Record
+from ..co_base.co_geo import ConSpec
 from ..co_base.co_flag import Dirty
-from ..co_base.co_logger import flow, xp, _xy, _ev, xps
-from ..co_base.co_lookup import Lookup
+from ..co_base.co_logger import flow, xp, _xy, _ev, xps, xp_on
+from ..co_base.co_span import span, timed
 from ..co_base.co_observer import observer_event_provider_get
 
 
@@ -40,16 +41,26 @@ class GeoId(NamedTuple):
         return f'({self.idx}.{self.typ})'
 
 
-class XyEdge:
-    def __init__(self, geo_idx: int, start: App.Vector, end: App.Vector, x: bool, y: bool, construct: bool, extern: bool):
+class XyEdge(Record):
+    __slots__ = ('geo_idx', 'sx', 'sy', 'ex', 'ey', 'has_x', 'has_y', 'construct', 'extern')
+
+    def __init__(self, geo_idx: int, sx: float, sy: float, ex: float, ey: float, x: bool, y: bool, construct: bool,
+                 extern: bool):
         self.geo_idx = geo_idx
-        self.start: App.Vector = start
-        self.end: App.Vector = end
+        self.sx, self.sy, self.ex, self.ey = sx, sy, ex, ey
         self.has_x: bool = x
         self.has_y: bool = y
         self.construct: bool = construct
         self.extern: bool = extern
 
+    @property
+    def start(self) -> App.Vector:
+        return App.Vector(self.sx, self.sy, 0)
+
+    @property
+    def end(self) -> App.Vector:
+        return App.Vector(self.ex, self.ey, 0)
+
     def __str__(self):
         return f"GeoIdx {self.geo_idx}, Start ({fmt_vec(self.start)} End ({fmt_vec(self.end)} x {self.has_x} " \
                f"y {self.has_y} co {self.construct} ex {self.extern}"
@@ -114,29 +125,25 @@ class XyEdges(QObject):
     @flow
     def edges_create(self):
         self._edges.clear()
-        geo_lst = [(idx, geo)
-                   for idx, geo
-                   in enumerate(self.sketch.Geometry)
-                   if geo.TypeId == GeoType.LINE_SEGMENT]
-        lo = Lookup(self.sketch)
-        geo_lst += [(id_.idx, geo)
-                    for id_, geo
-                    in lo.extern_points('E')
-                    if geo.TypeId == GeoType.LINE_SEGMENT]
+        snap = self.base.snapshot
+        rows = snap.rows_of(GeoType.LINE_SEGMENT)
         exist_x, exist_y = self.cons_get()
         exist_x: Set[Tuple[GeoId, GeoId]]
         exist_y: Set[Tuple[GeoId, GeoId]]
         ex_x = {(x[0].idx, x[1].idx) for x in exist_x}
         ex_y = {(x[0].idx, x[1].idx) for x in exist_y}
-        for idx, line in geo_lst:
-            line: Part.LineSegment
-            ed: XyEdge = XyEdge(idx, App.Vector(line.StartPoint), App.Vector(line.EndPoint),
-                                ((idx, idx) in ex_x), ((idx, idx) in ex_y), self.sketch.getConstruction(idx), idx <= -3)
+        for r in rows:
+            idx = snap.geo_idx[r]
+            ed: XyEdge = XyEdge(idx, snap.sx[r], snap.sy[r], snap.ex[r], snap.ey[r], ((idx, idx) in ex_x),
+                                ((idx, idx) in ex_y), bool(snap.construct[r]), bool(snap.extern[r]))
             self._edges.append(ed)
-        [xp(xy_edge, **_xy) for xy_edge in self._edges]
+        if xp_on(_xy):
+            for xy_edge in self._edges:
+                xp(xy_edge, **_xy)
         self.base.flags.reset(Dirty.XY_EDGES)
 
     @flow
+    @timed('xy.create')
     def dist_create(self, edg_list: List[XyEdge], x: bool, y: bool):
         doc: App.Document = App.ActiveDocument
         xp('geo_list', edg_list, **_xy)
@@ -144,32 +151,33 @@ class XyEdges(QObject):
         for edg in edg_list:
             idx = edg.geo_idx
             if (not edg.has_x) and x:
-                x1 = edg.start.x
-                x2 = edg.end.x
-                con_list.append(Sketcher.Constraint(ConType.DISTANCEX.value, idx, 1, idx, 2, (x2 - x1)))
-                xp(f'DistanceX created, geo_start ({idx}.1) geo_end ({idx}.2), {(x2 - x1)}', **_xy)
+                x1 = edg.sx
+                x2 = edg.ex
+                con_list.append(ConSpec(ConType.DISTANCEX.value, (idx, 1, idx, 2, (x2 - x1))))
+                xp(lambda: f'DistanceX created, geo_start ({idx}.1) geo_end ({idx}.2), {(x2 - x1)}', **_xy)
                 xp('created.emit: DistanceX', idx, (x2 - x1), **_ev)
                 self.created.emit('DistanceX', idx, (x2 - x1))
             if (not edg.has_y) and y:
-                y1 = edg.start.y
-                y2 = edg.end.y
-                con_list.append(Sketcher.Constraint(ConType.DISTANCEY.value, idx, 1, idx, 2, (y2 - y1)))
-                xp(f'DistanceY created, geo_start ({idx}.1) geo_end ({idx}.2), {(y2 - y1)}', **_xy)
+                y1 = edg.sy
+                y2 = edg.ey
+                con_list.append(ConSpec(ConType.DISTANCEY.value, (idx, 1, idx, 2, (y2 - y1))))
+                xp(lambda: f'DistanceY created, geo_start ({idx}.1) geo_end ({idx}.2), {(y2 - y1)}', **_xy)
                 xp('created.emit: DistanceY', idx, (y2 - y1), **_ev)
                 self.created.emit('DistanceY', idx, (y2 - y1))
-        doc.openTransaction('coed: DistanceX/DistanceX constraint')
-        self.sketch.addConstraint(con_list)
-        doc.commitTransaction()
+        with span('xy.transaction'):
+            doc.openTransaction('coed: DistanceX/DistanceX constraint')
+            self.sketch.addConstraint(to_sketcher(con_list))
+            doc.commitTransaction()
 
         if len(edg_list) > 0:
             sk: Sketcher.SketchObject = self.sketch
             sk.addProperty('App::PropertyString', 'coed')
             sk.coed = 'xy_recompute'
-            doc.openTransaction('coed: obj recompute')
-            sk.recompute()
-            doc.commitTransaction()
-            self.base.flags.set(Dirty.CONSTRAINTS)
-            self.base.flags.set(Dirty.XY_EDGES)
+            with span('xy.recompute'):
+                doc.openTransaction('coed: obj recompute')
+                sk.recompute()
+                doc.commitTransaction()
+            self.base.changes_classify()
             xp('creation_done.emit', **_ev)
             self.creation_done.emit()
 
@@ -26,6 +26,7 @@ from .co_xy import XyEdges, XyEdge
 from .. import co_impl, co_gui
 from ..co_base.co_cmn import wait_cursor, ColorTableItem
 from ..co_base.co_logger import flow, xp, _xy, _ev, xps
+from ..co_base.co_span import timed
 from ..co_base.co_lookup import Lookup
 from ..co_base.co_observer import observer_block
 
@@ -138,6 +139,7 @@ class XyGui:
         return edg_list
 
     @flow(short=True)
+    @timed('xy.table')
     def on_result_up(self, result):
         self.xy_btn_create.setDisabled(True)
         self.xy_tbl_wid.setUpdatesEnabled(False)
@@ -0,0 +1,73 @@
+import unittest
+
+from PySide2.QtWidgets import QApplication
+
+from co_lib.co_base.co_flag import Dirty, Flags
+from co_lib.co_base.co_geo import Segment
+from co_lib.co_base.co_snapshot import GeoSnapshot
+from co_lib.co_tabs.co_co import CoPoints
+from co_lib.co_tabs.co_xy import GeoId
+
+
+class FakeBase:
+    # the parts of CoEd the coincident engine reads, snapshots from plain records
+    def __init__(self, records: list) -> None:
+        self.sketch = None
+        self.flags = Flags(Dirty)
+        self.rev = 1
+        self.log = dict()
+        self.snapshot = GeoSnapshot.from_records(records, [], self.rev)
+
+    def update(self, records: list, changed: set) -> None:
+        self.rev += 1
+        self.log[self.rev] = set(changed)
+        self.snapshot = GeoSnapshot.from_records(records, [], self.rev)
+        self.flags.set(Dirty.COIN_POINTS)
+
+    def geo_changes(self, rev: int):
+        if rev == self.rev:
+            return set()
+        if (rev + 1) not in self.log:
+            return None
+        res = set()
+        for r in range(rev + 1, self.rev + 1):
+            res |= self.log[r]
+        return res
+
+
+def records(construct: dict) -> list:
+    # a chain of touching lines plus a few far away ones, so a single change stays incremental
+    res = [(i, Segment(i * 10.0, 0.0, (i + 1) * 10.0, 0.0), construct.get(i, False), False) for i in range(3)]
+    res += [(i, Segment(i * 100.0, 500.0, i * 100.0 + 5, 505.0), False, False) for i in range(3, 12)]
+    return res
+
+
+class CoPointsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = QApplication.instance() or QApplication()
+
+    def flags_of(self, co: CoPoints, key: GeoId) -> dict:
+        # construct flag of key as seen from each neighbor
+        return {pt.geo_id: x.construct for pt in co.distances for x in pt.pt_distance_lst if x.geo_id == key}
+
+    def testConstructToggle(self):
+        base = FakeBase(records({}))
+        co = CoPoints(base)
+        co.tolerance = 0.1
+        self.assertTrue(co.distances)
+        key = GeoId(1, 1)
+        self.assertEqual(self.flags_of(co, key), {GeoId(0, 2): False})
+        # only the construction flag changes, nothing moves
+        base.update(records({1: True}), {1})
+        self.assertEqual(self.flags_of(co, key), {GeoId(0, 2): True})
+        self.assertEqual(self.flags_of(co, GeoId(1, 2)), {GeoId(2, 1): True})
+        self.assertTrue(all(x.construct for t in co.tolerances if t.geo_id == GeoId(0, 2)
+                            for x in t.pt_distance_lst))
+        base.update(records({}), {1})
+        self.assertEqual(self.flags_of(co, key), {GeoId(0, 2): False})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import math
+import random
+import unittest
+
+from co_lib.co_base import co_kernel
+from co_lib.co_base.co_kernel import DisjointSet, PairTable, point_pairs, scalar_pairs, use_numpy
+
+SEED = 4711
+PERIOD = 180.0
+EPS = 1e-9
+
+
+def brute_point_pairs(xs: list, ys: list, bound: float) -> dict:
+    res = dict()
+    for i in range(len(xs)):
+        for j in range(i + 1, len(xs)):
+            d = math.hypot(xs[j] - xs[i], ys[j] - ys[i])
+            if d <= bound:
+                res[(i, j)] = d
+    return res
+
+
+def brute_scalar_pairs(vals: list, bound: float, period: float = None) -> dict:
+    res = dict()
+    for i in range(len(vals)):
+        for j in range(i + 1, len(vals)):
+            d = abs(vals[j] - vals[i])
+            if period is not None:
+                d = min(d, period - d)
+            if d <= bound:
+                res[(i, j)] = d
+    return res
+
+
+def table_pairs(tbl: PairTable) -> dict:
+    res = dict()
+    for i in range(len(tbl)):
+        for j, d in tbl.row(i):
+            res.setdefault((min(i, j), max(i, j)), list()).append(d)
+    return res
+
+
+class KernelTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.np_prev = use_numpy(co_kernel.np is not None)
+
+    def tearDown(self) -> None:
+        use_numpy(self.np_prev)
+
+    def modes(self):
+        # the numpy kernel if present and the pure python fallback
+        res = [False]
+        if co_kernel.np is not None:
+            res.append(True)
+        for m in res:
+            use_numpy(m)
+            yield m
+
+    def check_table(self, tbl: PairTable, want: dict):
+        got = table_pairs(tbl)
+        self.assertEqual(set(got), set(want))
+        for key, ds in got.items():
+            # every pair shows up in both rows with the same value
+            self.assertEqual(len(ds), 2)
+            for d in ds:
+                self.assertAlmostEqual(d, want[key], delta=EPS)
+        for r in range(len(tbl)):
+            vals = [d for _, d in tbl.row(r)]
+            self.assertEqual(vals, sorted(vals))
+
+    def testPointPairs(self):
+        rnd = random.Random(SEED)
+        for m in self.modes():
+            for _ in range(10):
+                n = rnd.randrange(0, 150)
+                xs = [rnd.uniform(-10, 10) for _ in range(n)]
+                ys = [rnd.uniform(-10, 10) for _ in range(n)]
+                # some duplicates
+                for k in range(0, n, 7):
+                    xs[k], ys[k] = xs[0], ys[0]
+                bound = rnd.uniform(0.1, 3.0)
+                with self.subTest(numpy=m, n=n):
+                    self.check_table(point_pairs(xs, ys, bound), brute_point_pairs(xs, ys, bound))
+
+    def testScalarPairs(self):
+        rnd = random.Random(SEED)
+        for m in self.modes():
+            for _ in range(10):
+                vals = [rnd.uniform(0, 50) for _ in range(rnd.randrange(0, 150))]
+                bound = rnd.uniform(0.01, 2.0)
+                with self.subTest(numpy=m):
+                    self.check_table(scalar_pairs(vals, bound), brute_scalar_pairs(vals, bound))
+
+    def testScalarPairsWrap(self):
+        rnd = random.Random(SEED)
+        for m in self.modes():
+            # angles close to 0 and 180 are parallel
+            tbl = scalar_pairs([1.0, 179.0, 90.0, 0.0], 3.0, PERIOD)
+            with self.subTest(numpy=m, case='fixed'):
+                self.check_table(tbl, {(0, 1): 2.0, (1, 3): 1.0, (0, 3): 1.0})
+            for _ in range(10):
+                vals = [rnd.uniform(0, PERIOD) for _ in range(rnd.randrange(0, 150))]
+                vals += [0.0, PERIOD / 2, PERIOD - EPS]
+                bound = rnd.uniform(0.1, 5.0)
+                with self.subTest(numpy=m, bound=bound):
+                    self.check_table(scalar_pairs(vals, bound, PERIOD),
+                                     brute_scalar_pairs(vals, bound, PERIOD))
+            # a bound beyond half the period must not count a pair twice
+            vals = [rnd.uniform(0, PERIOD) for _ in range(40)]
+            with self.subTest(numpy=m, case='wide'):
+                self.check_table(scalar_pairs(vals, PERIOD, PERIOD),
+                                 brute_scalar_pairs(vals, PERIOD, PERIOD))
+
+    def testRowsBetween(self):
+        rnd = random.Random(SEED)
+        for m in self.modes():
+            xs = [rnd.uniform(-5, 5) for _ in range(100)]
+            ys = [rnd.uniform(-5, 5) for _ in range(100)]
+            tbl = point_pairs(xs, ys, 2.0)
+            for _ in range(20):
+                lo, hi = sorted((rnd.uniform(0, 2.0), rnd.uniform(0, 2.0)))
+                want = {r for r in range(len(tbl)) if any(lo < d <= hi for _, d in tbl.row(r))}
+                with self.subTest(numpy=m, lo=lo, hi=hi):
+                    self.assertEqual(tbl.rows_between(lo, hi), want)
+                    for r in range(len(tbl)):
+                        self.assertEqual(tbl.count(r, hi), len(list(tbl.row(r, hi))))
+
+    def testDisjointSet(self):
+        rnd = random.Random(SEED)
+        ds = DisjointSet()
+        # reference: label every key with its component
+        comp = {k: k for k in range(200)}
+        for _ in range(150):
+            a = rnd.randrange(200)
+            b = rnd.randrange(200)
+            ds.union(a, b)
+            ca, cb = comp[a], comp[b]
+            if ca != cb:
+                for k, c in comp.items():
+                    if c == cb:
+                        comp[k] = ca
+        for _ in range(2000):
+            a = rnd.randrange(200)
+            b = rnd.randrange(200)
+            if a not in ds or b not in ds:
+                self.assertFalse(ds.connected(a, b))
+            else:
+                self.assertEqual(ds.connected(a, b), comp[a] == comp[b])
+        self.assertEqual(ds.find(-1), -1)
+        self.assertFalse(ds.connected(-1, -1))
+
+
+if __name__ == '__main__':
+    unittest.main()
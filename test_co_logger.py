@@ -0,0 +1,60 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stderr
+from io import StringIO
+
+from co_lib.co_base.co_logger import XpWorker
+
+
+class XpWorkerTest(unittest.TestCase):
+
+    def tearDown(self):
+        self.worker.shutdown(1.0)
+
+    def worker_get(self, path: str) -> XpWorker:
+        self.worker = XpWorker(size=4)
+        self.worker.conf_set(policy=XpWorker.BLOCK)
+        err = StringIO()
+        with redirect_stderr(err):
+            self.worker.log_path_set(path)
+            self.worker.thread.join(1.0)
+        self.assertFalse(self.worker.thread.is_alive())
+        return self.worker
+
+    def put_many(self, worker: XpWorker, n: int) -> bool:
+        # a blocked put would keep the thread alive
+        th = threading.Thread(target=lambda: [worker.put((('x',), {'glb_ind': 0})) for _ in range(n)], daemon=True)
+        th.start()
+        th.join(1.0)
+        return not th.is_alive()
+
+    def testBadPath(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            worker = self.worker_get(os.path.join(tmp, 'missing', 'coed.log'))
+            self.assertTrue(self.put_many(worker, 20))
+            self.assertEqual(len(worker.buf), 4)
+            start = time.perf_counter()
+            self.assertFalse(worker.flush(5.0))
+            self.assertLess(time.perf_counter() - start, 1.0)
+
+    def testEmptyPath(self):
+        worker = self.worker_get('')
+        self.assertTrue(self.put_many(worker, 20))
+        self.assertFalse(worker.flush(5.0))
+
+    def testRecover(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            worker = self.worker_get(os.path.join(tmp, 'missing', 'coed.log'))
+            self.assertTrue(self.put_many(worker, 20))
+            path = os.path.join(tmp, 'coed.log')
+            worker.log_path_set(path)
+            self.assertTrue(worker.flush(5.0))
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), 4 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import math
+import random
+import unittest
+
+from co_lib.co_base.co_spatial import NeighborIndex, PointGrid
+
+RADIUS = 0.5
+SEED = 4711
+
+
+def brute_pairs(pts: dict, radius: float) -> set:
+    keys = sorted(pts)
+    res = set()
+    for n, a in enumerate(keys):
+        for b in keys[n + 1:]:
+            if math.hypot(pts[a][0] - pts[b][0], pts[a][1] - pts[b][1]) <= radius:
+                res.add((a, b))
+    return res
+
+
+def brute_neighbors(pts: dict, key, radius: float) -> set:
+    x, y = pts[key]
+    return {k for k, (ox, oy) in pts.items()
+            if k != key and math.hypot(ox - x, oy - y) <= radius}
+
+
+def boundary_points() -> dict:
+    # points right on and next to the cell borders, including negative cells
+    pts = dict()
+    n = 0
+    for i in range(-3, 4):
+        for j in range(-3, 4):
+            for dx, dy in ((0, 0), (1e-9, 0), (-1e-9, 0), (0, -1e-9), (RADIUS / 2, 0), (0, RADIUS)):
+                pts[n] = (i * RADIUS + dx, j * RADIUS + dy)
+                n += 1
+    return pts
+
+
+def random_points(rnd: random.Random, count: int, span: float) -> dict:
+    return {n: (rnd.uniform(-span, span), rnd.uniform(-span, span)) for n in range(count)}
+
+
+class SpatialTest(unittest.TestCase):
+
+    def check_grid(self, pts: dict, radius: float):
+        grid = PointGrid(radius)
+        for k, (x, y) in pts.items():
+            grid.insert(k, x, y)
+        self.assertEqual(len(grid), len(pts))
+        got = {(min(a, b), max(a, b)) for a, b, _ in grid.pairs(radius)}
+        self.assertEqual(got, brute_pairs(pts, radius))
+        for k in pts:
+            self.assertEqual({o for o, _ in grid.neighbors(k, radius)}, brute_neighbors(pts, k, radius))
+
+    def check_index(self, idx: NeighborIndex, pts: dict):
+        self.assertEqual(len(idx), len(pts))
+        for k in pts:
+            nbs = list(idx.neighbors(k))
+            self.assertEqual({o for o, _ in nbs}, brute_neighbors(pts, k, idx.radius))
+            dist = [d for _, d in nbs]
+            self.assertEqual(dist, sorted(dist))
+
+    def testGridBoundary(self):
+        self.check_grid(boundary_points(), RADIUS)
+
+    def testGridRandom(self):
+        rnd = random.Random(SEED)
+        for _ in range(20):
+            self.check_grid(random_points(rnd, 200, 3.0), RADIUS)
+
+    def testGridRemove(self):
+        pts = boundary_points()
+        grid = PointGrid(RADIUS)
+        for k, (x, y) in pts.items():
+            grid.insert(k, x, y)
+        for k in list(pts)[::3]:
+            grid.remove(k)
+            del pts[k]
+        got = {(min(a, b), max(a, b)) for a, b, _ in grid.pairs(RADIUS)}
+        self.assertEqual(got, brute_pairs(pts, RADIUS))
+
+    def testGridRadius(self):
+        grid = PointGrid(RADIUS)
+        grid.insert(0, 0.0, 0.0)
+        with self.assertRaises(ValueError):
+            list(grid.neighbors(0, RADIUS * 2))
+
+    def testIndexEdit(self):
+        rnd = random.Random(SEED)
+        pts = boundary_points()
+        idx = NeighborIndex(RADIUS)
+        for k, (x, y) in pts.items():
+            idx.insert(k, x, y)
+        self.check_index(idx, pts)
+        for _ in range(200):
+            op = rnd.random()
+            if op < 0.4 and pts:
+                k = rnd.choice(list(pts))
+                before = brute_neighbors(pts, k, RADIUS)
+                x, y = pts[k] = (rnd.choice((-1, 1)) * rnd.randrange(4) * RADIUS, rnd.uniform(-1.5, 1.5))
+                touched = idx.move(k, x, y)
+                self.assertTrue(before | brute_neighbors(pts, k, RADIUS) <= touched)
+            elif op < 0.7 and pts:
+                k = rnd.choice(list(pts))
+                del pts[k]
+                idx.remove(k)
+            else:
+                k = max(pts, default=0) + 1
+                x, y = pts[k] = (rnd.randrange(-3, 4) * RADIUS, rnd.uniform(-1.5, 1.5))
+                idx.insert(k, x, y)
+            self.check_index(idx, pts)
+
+    def testIndexLoad(self):
+        pts = boundary_points()
+        keys = sorted(pts)
+        xs = [pts[k][0] for k in keys]
+        ys = [pts[k][1] for k in keys]
+        rows = list()
+        for k in keys:
+            nbs = [(keys.index(o), math.hypot(pts[o][0] - pts[k][0], pts[o][1] - pts[k][1]))
+                   for o in brute_neighbors(pts, k, RADIUS)]
+            rows.append(sorted(nbs, key=lambda t: t[1]))
+        idx = NeighborIndex(RADIUS)
+        idx.load(keys, xs, ys, rows)
+        self.check_index(idx, pts)
+        k = keys[len(keys) // 2]
+        x, y = pts[k] = (pts[k][0] + RADIUS * 0.75, pts[k][1])
+        idx.move(k, x, y)
+        self.check_index(idx, pts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+
+from co_lib.co_base.co_trie import PathIndex, PrefixTrie
+
+PATHS = [
+    'Doc#Sketch.Constraints.width',
+    'Doc#Sketch.Placement',
+    'Doc#Pad.Length',
+    'Doc#Pad.Placement.Base.x',
+    '<<Sketch>>.Constraints.height',
+    '<<Pad>>.Length2',
+    'Sketch.Constraints.Width',
+    'Spreadsheet.A1',
+    'Spreadsheet.Length',
+]
+
+BOX = ['Doc#Box.Length', 'Doc#Box.Width', 'Doc#Box.Placement.Base.x', 'Doc#Box.Shape', 'Doc#Box.Height']
+
+
+def brute_prefix(paths: list, q: str) -> list:
+    return sorted({p for p in paths if p.lower().startswith(q.lower())}, key=str.lower)
+
+
+def brute_segment(paths: list, q: str) -> list:
+    # paths with a later segment starting with q, without the prefix hits
+    res = set()
+    for p in paths:
+        if p.lower().startswith(q.lower()):
+            continue
+        if any(p[i:].lower().startswith(q.lower()) for i in PathIndex.starts(p)):
+            res.add(p)
+    return sorted(res, key=str.lower)
+
+
+class TrieTest(unittest.TestCase):
+
+    def testRemoveDuplicate(self):
+        t = PrefixTrie()
+        t.add('Length', 'a')
+        t.add('length', 'a')
+        t.add('Length', 'b')
+        self.assertEqual(len(t), 3)
+        self.assertTrue(t.remove('LENGTH', 'a'))
+        self.assertEqual(sorted(t.find('len')), ['a', 'b'])
+        self.assertTrue(t.remove('Length', 'a'))
+        self.assertEqual(t.find('len'), ['b'])
+        self.assertFalse(t.remove('Length', 'a'))
+        self.assertFalse(t.remove('Lengthy', 'b'))
+        self.assertFalse(t.remove('Len', 'b'))
+        self.assertEqual(len(t), 1)
+
+    def testRemovePrune(self):
+        t = PrefixTrie()
+        t.add('abc', 'x')
+        t.add('abcdef', 'y')
+        t.add('abd', 'z')
+        self.assertTrue(t.remove('abcdef', 'y'))
+        # the tail below abc is gone, its siblings and parents stay
+        self.assertEqual(t.find('abcd'), [])
+        self.assertEqual(t.find('abc'), ['x'])
+        self.assertEqual(sorted(t.find('ab')), ['x', 'z'])
+        self.assertTrue(t.remove('abc', 'x'))
+        self.assertTrue(t.remove('abd', 'z'))
+        self.assertEqual(len(t), 0)
+        self.assertEqual(t.find(''), [])
+        # a pruned key can be added again
+        t.add('abcdef', 'y')
+        self.assertEqual(t.find('abc'), ['y'])
+
+    def testFindLimit(self):
+        t = PrefixTrie()
+        for n in range(20):
+            t.add(f'key{n}', f'v{n}')
+        t.add('key1', 'v1')
+        self.assertEqual(len(t.find('key')), 20)
+        res = t.find('key', 5)
+        self.assertEqual(len(res), 5)
+        self.assertEqual(len(set(res)), 5)
+
+    def testPathIndexRemove(self):
+        idx = PathIndex()
+        for p in PATHS:
+            idx.add(p)
+        idx.add(PATHS[0])
+        idx.remove(PATHS[0])
+        self.assertIn(PATHS[0], idx.substring('width'))
+        idx.remove(PATHS[0])
+        self.assertNotIn(PATHS[0], idx.substring('width'))
+        self.assertEqual(len(idx), len(PATHS) - 1)
+        # removing an unknown path leaves the segments alone
+        idx.remove('Unknown.width')
+        self.assertEqual(idx.substring('width'), ['Sketch.Constraints.Width'])
+
+    def testSubstringOrder(self):
+        idx = PathIndex()
+        for p in PATHS:
+            idx.add(p)
+        for q in ('', 'doc', 'Length', 'const', 'sketch', 'pla', 'x', 'nothing'):
+            with self.subTest(q=q):
+                self.assertEqual(idx.prefix(q), brute_prefix(PATHS, q))
+                self.assertEqual(idx.substring(q), brute_prefix(PATHS, q) + brute_segment(PATHS, q))
+
+    def testSubstringLimit(self):
+        idx = PathIndex()
+        for p in PATHS + BOX:
+            idx.add(p)
+        for q in ('doc', 'doc#box.', 'length', 'sketch', 'pla', 's', ''):
+            head = brute_prefix(PATHS + BOX, q)
+            tail = brute_segment(PATHS + BOX, q)
+            for limit in range(1, len(PATHS + BOX) + 2):
+                with self.subTest(q=q, limit=limit):
+                    # a limit keeps the first matches, not just any of them
+                    self.assertEqual(idx.prefix(q, limit), head[:limit])
+                    self.assertEqual(idx.substring(q, limit), (head + tail)[:limit])
+
+    def testPrefixLimitShort(self):
+        idx = PathIndex()
+        for p in BOX:
+            idx.add(p)
+        self.assertEqual(idx.prefix('doc#box.', 2), ['Doc#Box.Height', 'Doc#Box.Length'])
+
+
+if __name__ == '__main__':
+    unittest.main()